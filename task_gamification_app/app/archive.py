@@ -0,0 +1,114 @@
+"""
+Hot/cold partitioning of tasks.
+
+Completed tasks older than a configurable age are moved from `tasks` into
+`tasks_archive`, which keeps the hot table (and its indexes) proportional to the
+active working set. Each batch copies and deletes a chunk of rows in a single
+transaction, so the job can be interrupted at any point and simply run again:
+rows that were already moved are no longer in `tasks` and are not seen twice.
+
+Readers that need the full history union the archive back in (see
+get_tasks_for_user and the leaderboard); `archive_horizon` tells them whether the
+archive can contain rows for a given completion date at all.
+"""
+import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from .models import JobWatermark, Task, TaskArchive, TaskStatus
+
+ARCHIVE_JOB_NAME = "task_archive"
+DEFAULT_ARCHIVE_AFTER = datetime.timedelta(days=90)
+DEFAULT_BATCH_SIZE = 1000
+
+_ARCHIVED_COLUMNS = ["id", "description", "status", "creation_date", "due_date", "completion_date", "user_id"]
+
+
+def archive_horizon(db_session: Session) -> Optional[datetime.datetime]:
+    """
+    Returns the newest completion cutoff any archive run has used, or None if nothing was ever archived.
+    Tasks completed on or after this instant are guaranteed to still be in `tasks`.
+    """
+    watermark = db_session.query(JobWatermark.value).filter(JobWatermark.name == ARCHIVE_JOB_NAME).first()
+    return watermark[0] if watermark else None
+
+
+def reserve_archived_ids(connection, at_least: int = 0):
+    """
+    Moves the `tasks` id sequence past every id in tasks and tasks_archive (and `at_least`), so
+    that SQLite never hands an archived task's id to a new task. Needed after `tasks` is rebuilt;
+    requires `tasks` to be an AUTOINCREMENT table.
+    """
+    highest = max(
+        at_least,
+        connection.execute(select(func.max(Task.id))).scalar() or 0,
+        connection.execute(select(func.max(TaskArchive.id))).scalar() or 0,
+    )
+    seeded = connection.exec_driver_sql(
+        "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'tasks'", (highest,)).rowcount
+    if not seeded:
+        connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", (highest,))
+
+
+def _advance_horizon(db_session: Session, cutoff: datetime.datetime):
+    watermark = db_session.query(JobWatermark).filter(JobWatermark.name == ARCHIVE_JOB_NAME).first()
+    if watermark is None:
+        db_session.add(JobWatermark(name=ARCHIVE_JOB_NAME, value=cutoff))
+    elif watermark.value < cutoff:
+        watermark.value = cutoff
+
+
+def archive_completed_tasks(
+    db_session: Session,
+    older_than: datetime.timedelta = DEFAULT_ARCHIVE_AFTER,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    now: Optional[datetime.datetime] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """
+    Moves completed tasks whose completion date is older than `older_than` into tasks_archive.
+    Works in keyset-ordered batches of `batch_size` rows, committing after each one.
+    `progress(batch_rows, total_rows)` is called after every batch.
+    Returns the number of tasks archived by this call.
+    """
+    now = now or datetime.datetime.utcnow()
+    cutoff = now - older_than
+    archived_at = now
+    last_id = 0
+    total = 0
+    batches = 0
+
+    # Record the horizon before moving anything: readers then start consulting the archive,
+    # which is harmless while it is still empty, and never miss rows once they are moved.
+    _advance_horizon(db_session, cutoff)
+    db_session.commit()
+
+    while max_batches is None or batches < max_batches:
+        ids = [
+            row[0] for row in db_session.query(Task.id)
+            .filter(
+                Task.id > last_id,
+                Task.status == TaskStatus.COMPLETED,
+                Task.completion_date < cutoff,
+            )
+            .order_by(Task.id.asc())
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+
+        source = select(*[getattr(Task, name) for name in _ARCHIVED_COLUMNS], literal(archived_at, TaskArchive.archived_at.type)).where(Task.id.in_(ids))
+        db_session.execute(insert(TaskArchive).from_select(_ARCHIVED_COLUMNS + ["archived_at"], source))
+        db_session.execute(delete(Task).where(Task.id.in_(ids)))
+        db_session.commit()
+
+        last_id = ids[-1]
+        total += len(ids)
+        batches += 1
+        if progress:
+            progress(len(ids), total)
+
+    return total
@@ -0,0 +1,192 @@
+"""
+Online backups of the SQLite database through the sqlite3 backup API.
+
+The copy is made in steps of `pages_per_step` pages with a short sleep after each
+step, so the read lock is only held briefly and live traffic keeps writing. If the
+source is written to during the copy, SQLite restarts the backup; after
+`max_restarts` restarts the remaining copy is done in one step so a busy database
+cannot starve the backup. The copy is written to a temporary file and renamed into
+place only once it is complete.
+"""
+import datetime
+import glob
+import os
+import sqlite3
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy.engine import Engine
+
+DEFAULT_PAGES_PER_STEP = 1024
+DEFAULT_SLEEP_SECONDS = 0.01
+DEFAULT_MAX_RESTARTS = 3
+BACKUP_FILE_PREFIX = "task_gamification-"
+
+
+class BackupError(Exception):
+    """Raised when a backup, restore or verification cannot be completed."""
+    pass
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def database_path(engine: Engine) -> str:
+    """Returns the file path of a SQLite engine's database."""
+    if engine.url.get_backend_name() != "sqlite" or not engine.url.database or engine.url.database == ":memory:":
+        raise BackupError(f"Online backup needs a file-based SQLite database, not {engine.url}.")
+    return os.path.abspath(engine.url.database)
+
+
+def default_backup_path(directory: str, now: Optional[datetime.datetime] = None) -> str:
+    now = now or datetime.datetime.utcnow()
+    return os.path.join(directory, f"{BACKUP_FILE_PREFIX}{now:%Y%m%d-%H%M%S}.db")
+
+
+def _copy(source: str, destination: str, pages_per_step: int, sleep: float, max_restarts: int,
+          progress: Optional[Callable[[int, int], None]]) -> dict:
+    started = time.perf_counter()
+    restarts = 0
+    steps = 0
+    last_remaining = None
+
+    def on_step(status, remaining, total):
+        nonlocal restarts, steps, last_remaining
+        steps += 1
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _BackupRestarted()
+        last_remaining = remaining
+        if progress:
+            progress(total - remaining, total)
+        if remaining and sleep:
+            time.sleep(sleep) # Let writers in between steps
+
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(destination)
+    try:
+        try:
+            src.backup(dst, pages=pages_per_step, progress=on_step)
+        except _BackupRestarted:
+            # The source is too busy for a chunked copy to converge; finish in a single step.
+            src.backup(dst, pages=-1)
+        page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+
+    elapsed = time.perf_counter() - started
+    size = page_count * page_size
+    return {
+        "bytes": size,
+        "pages": page_count,
+        "steps": steps,
+        "restarts": restarts,
+        "seconds": elapsed,
+        "bytes_per_second": size / elapsed if elapsed else float("inf"),
+    }
+
+
+def backup_database(
+    source_path: str,
+    destination_path: str,
+    pages_per_step: int = DEFAULT_PAGES_PER_STEP,
+    sleep: float = DEFAULT_SLEEP_SECONDS,
+    max_restarts: int = DEFAULT_MAX_RESTARTS,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    Copies the live database at `source_path` to `destination_path`.
+    `progress(pages_done, pages_total)` is called after every step.
+    Returns a summary dict (bytes, pages, steps, restarts, seconds, bytes_per_second, path).
+    """
+    if not os.path.exists(source_path):
+        raise BackupError(f"Database file {source_path} does not exist.")
+    directory = os.path.dirname(os.path.abspath(destination_path))
+    os.makedirs(directory, exist_ok=True)
+    partial_path = destination_path + ".partial"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    try:
+        summary = _copy(source_path, partial_path, pages_per_step, sleep, max_restarts, progress)
+        os.replace(partial_path, destination_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    summary["path"] = destination_path
+    return summary
+
+
+def restore_database(
+    backup_path: str,
+    target_path: str,
+    pages_per_step: int = DEFAULT_PAGES_PER_STEP,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    Overwrites the database at `target_path` with the contents of `backup_path`.
+    The backup is verified first. Writers to the target should be stopped while this runs.
+    """
+    problems = integrity_problems(backup_path)
+    if problems:
+        raise BackupError(f"Refusing to restore a damaged backup: {'; '.join(problems)}")
+    # No sleeps and no restart limit: the target is not supposed to be written to meanwhile.
+    summary = _copy(backup_path, target_path, pages_per_step, sleep=0, max_restarts=1_000_000, progress=progress)
+    summary["path"] = target_path
+    return summary
+
+
+def integrity_problems(path: str) -> List[str]:
+    """Returns the problems PRAGMA integrity_check reports for the database at `path` (empty if healthy)."""
+    if not os.path.exists(path):
+        return [f"{path} does not exist"]
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        messages = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        messages = [str(e)] # e.g. "file is not a database"
+    finally:
+        conn.close()
+    return [] if messages == ["ok"] else messages
+
+
+def table_row_counts(path: str) -> dict:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        conn.close()
+
+
+def verify_backup(backup_path: str, source_path: Optional[str] = None) -> dict:
+    """
+    Checks a backup's integrity and returns its per-table row counts.
+    With `source_path`, also returns the live database's counts for comparison
+    (they may legitimately differ by the writes made since the backup).
+    """
+    result = {"problems": integrity_problems(backup_path), "row_counts": {}, "source_row_counts": None}
+    if not result["problems"]:
+        result["row_counts"] = table_row_counts(backup_path)
+        if source_path:
+            result["source_row_counts"] = table_row_counts(source_path)
+    return result
+
+
+def prune_backups(directory: str, keep: int) -> List[str]:
+    """
+    Deletes all but the `keep` newest backups in `directory`; returns the deleted paths.
+    Raises ValueError if `keep` is below 1, so a bad setting cannot delete every backup.
+    """
+    if keep < 1:
+        raise ValueError(f"keep must be at least 1, got {keep}")
+    backups = sorted(glob.glob(os.path.join(directory, f"{BACKUP_FILE_PREFIX}*.db")))
+    doomed = backups[:-keep]
+    for path in doomed:
+        os.remove(path)
+    return doomed
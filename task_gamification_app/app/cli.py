@@ -1,7 +1,7 @@
 import getpass # For securely getting password input
 from sqlalchemy.orm import Session
 from .db import SessionLocal
-from .models import User
+from .identity_cache import get_user_snapshot
 
 # Global variable to store the current logged-in user's ID (simple session management)
 # In a real web app, this would be handled by a proper session mechanism.
@@ -14,6 +14,7 @@ from .services import (
     create_task_for_user,
     get_tasks_for_user,
     complete_task,
+    get_user_stats,
     get_leaderboard_users_paginated, # Use the new paginated and more detailed function
     POINTS_PER_TASK,
     UsernameExistsError,
@@ -169,8 +170,9 @@ def complete_task_cli():
     db_session = get_db_session()
     try:
         completed_task = complete_task(db_session=db_session, task_id=task_id, user_id=CURRENT_USER_ID)
-        # We need the user's latest points total
-        user = db_session.query(User).filter(User.id == CURRENT_USER_ID).first()
+        # We need the user's latest points total. complete_task invalidated the cached snapshot,
+        # so this reloads it once and the main menu can reuse it afterwards.
+        user = get_user_snapshot(db_session, CURRENT_USER_ID)
         print(f"Task '{completed_task.description}' marked as completed. You earned {POINTS_PER_TASK} points!")
         if user:
             print(f"Your total points: {user.points}")
@@ -180,6 +182,27 @@ def complete_task_cli():
         db_session.close()
 
 
+def view_stats_cli():
+    """CLI function for a logged-in user to view their task statistics."""
+    if CURRENT_USER_ID is None:
+        print("You must be logged in to view your stats.")
+        return
+
+    print("\n--- Your Stats ---")
+    db_session = get_db_session()
+    try:
+        user_stats = get_user_stats(db_session=db_session, user_id=CURRENT_USER_ID)
+        print(f"Pending tasks:   {user_stats['pending_count']}")
+        print(f"Completed tasks: {user_stats['completed_count']}")
+        print(f"Overdue tasks:   {user_stats['overdue_count']}")
+        print(f"Current streak:  {user_stats['current_streak']} day(s)")
+        if user_stats['average_completion_seconds'] is not None:
+            print(f"Avg. time to complete: {user_stats['average_completion_seconds'] / 3600:.1f} hour(s)")
+    except ServiceError as e:
+        print(f"An error occurred while fetching your stats: {e}")
+    finally:
+        db_session.close()
+
 def display_main_menu():
     """Displays the main menu options based on login status."""
     print("\n--- Task Gamification App Menu ---")
@@ -191,7 +214,7 @@ def display_main_menu():
         # Display username if logged in
         db = get_db_session()
         try:
-            user = db.query(User).filter(User.id == CURRENT_USER_ID).first()
+            user = get_user_snapshot(db, CURRENT_USER_ID)
             username = user.username if user else "Unknown User"
             print(f"(Logged in as: {username})")
         finally:
@@ -202,6 +225,7 @@ def display_main_menu():
         print("5. Complete Task")
         print("6. View Leaderboard")
         print("7. Logout")
+        print("8. View My Stats")
         print("0. Exit")
 
 def view_leaderboard_cli():
@@ -252,6 +276,8 @@ def run_cli():
                 view_leaderboard_cli()
             elif choice == '7':
                 logout_user()
+            elif choice == '8':
+                view_stats_cli()
             elif choice == '0':
                 print("Exiting application.")
                 break
@@ -0,0 +1,305 @@
+"""
+Compact storage encoding for the task tables (opt-in).
+
+By default SQLite stores `tasks.status` as the enum name ("COMPLETED") and every task
+timestamp as ISO text ("2026-10-19 08:35:33.092195", 26 bytes), in the rows and in
+every index that contains them. With COMPACT_TASK_STORAGE=true, `tasks` and
+`tasks_archive` use these types instead:
+
+- IntegerEnum: the status as a small integer (a one-byte record field).
+- EpochMicroseconds: naive UTC datetimes as integer microseconds since 1970-01-01
+  (8 bytes). Microseconds keep values exact, so what is read back is what was written.
+
+Both are TypeDecorators: callers keep reading and writing TaskStatus members and
+datetimes, and comparisons, sorts and index lookups become integer compares. The few
+SQL expressions that depend on the encoding use `seconds_between` and `day_of`.
+
+The stored encoding must match the setting. `convert_task_tables` rewrites both tables
+into the configured encoding (migration 10 runs it when the setting is on;
+`manage.py convert-task-storage` runs it at any time, in either direction), and
+`check_task_storage` refuses to start on a mismatch. `benchmark_storage` compares two
+copies of a database, one per encoding.
+"""
+import datetime
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import BigInteger, DateTime, Enum as SAEnum, Integer, SmallInteger, func, inspect, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+COMPACT_TASK_STORAGE = os.environ.get("COMPACT_TASK_STORAGE", "false").lower() == "true"
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class IntegerEnum(TypeDecorator):
+    """An enum stored as the integer code given for each member in `codes` (a tuple of (member, code) pairs)."""
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class, codes: tuple):
+        super().__init__()
+        self.enum_class = enum_class
+        self.codes = codes
+        self._to_code = dict(codes)
+        self._to_member = {code: member for member, code in codes}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str): # Member names are accepted, as by Enum
+            value = self.enum_class[value]
+        return self._to_code[value]
+
+    def process_literal_param(self, value, dialect):
+        # Used when a partial index's WHERE clause is rendered.
+        return "NULL" if value is None else str(self.process_bind_param(value, dialect))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self._to_member[value]
+
+
+def to_epoch_microseconds(value: datetime.datetime) -> int:
+    if not isinstance(value, datetime.datetime): # A date means its midnight, as with DateTime
+        value = datetime.datetime.combine(value, datetime.time.min)
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+class EpochMicroseconds(TypeDecorator):
+    """A naive UTC datetime stored as integer microseconds since the Unix epoch."""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_epoch_microseconds(value)
+
+    def process_literal_param(self, value, dialect):
+        return "NULL" if value is None else str(to_epoch_microseconds(value))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else _EPOCH + datetime.timedelta(microseconds=value)
+
+
+def status_type(enum_class, codes: dict, name: str):
+    """Column type of a task status: IntegerEnum with COMPACT_TASK_STORAGE, else the usual Enum."""
+    if COMPACT_TASK_STORAGE:
+        return IntegerEnum(enum_class, tuple(sorted(codes.items(), key=lambda item: item[1])))
+    return SAEnum(enum_class, name=name)
+
+
+def timestamp_type():
+    """Column type of a task timestamp: EpochMicroseconds with COMPACT_TASK_STORAGE, else DateTime."""
+    return EpochMicroseconds() if COMPACT_TASK_STORAGE else DateTime()
+
+
+# --- Encoding-independent SQL ---
+
+def seconds_between(end, start):
+    """SQL expression for `end - start` in seconds, for two timestamp columns."""
+    if isinstance(end.type, EpochMicroseconds):
+        return (type_coerce(end, BigInteger) - type_coerce(start, BigInteger)) / 1000000.0
+    return (func.julianday(end) - func.julianday(start)) * 86400.0
+
+
+def day_of(column):
+    """SQL expression for the UTC day ('YYYY-MM-DD') of a timestamp column."""
+    if isinstance(column.type, EpochMicroseconds):
+        return func.date(type_coerce(column, BigInteger) / 1000000, "unixepoch")
+    return func.date(column)
+
+
+# --- Converting existing tables ---
+
+def _task_tables():
+    from .models import Task, TaskArchive
+    return [Task.__table__, TaskArchive.__table__]
+
+
+def stored_compact(connection, table_name: str) -> Optional[bool]:
+    """Whether `table_name` is stored in the compact encoding (None if the table does not exist)."""
+    inspector = inspect(connection)
+    if not inspector.has_table(table_name):
+        return None
+    status = next(column for column in inspector.get_columns(table_name) if column["name"] == "status")
+    return isinstance(status["type"], Integer)
+
+
+def check_task_storage(engine):
+    """Raises RuntimeError if the task tables are stored in another encoding than COMPACT_TASK_STORAGE selects."""
+    with engine.connect() as connection:
+        for table in _task_tables():
+            compact = stored_compact(connection, table.name)
+            if compact is not None and compact != COMPACT_TASK_STORAGE:
+                raise RuntimeError(
+                    f"Table {table.name} is stored in the {'compact' if compact else 'text'} encoding but "
+                    f"COMPACT_TASK_STORAGE is {'on' if COMPACT_TASK_STORAGE else 'off'}. Run "
+                    f"`python -m task_gamification_app.manage convert-task-storage` or change the setting."
+                )
+
+
+def _compact_status_codes() -> dict:
+    from .models import TASK_STATUS_CODES
+    return TASK_STATUS_CODES
+
+
+def _converted(column) -> str:
+    """SELECT expression that turns the value stored in the other encoding into `column`'s type."""
+    name = column.name
+    if isinstance(column.type, IntegerEnum):
+        cases = " ".join(f"WHEN '{member.name}' THEN {code}" for member, code in column.type.codes)
+        return f"CASE {name} {cases} END"
+    if isinstance(column.type, SAEnum):
+        cases = " ".join(f"WHEN {code} THEN '{member.name}'" for member, code in _compact_status_codes().items())
+        return f"CASE {name} {cases} END"
+    if isinstance(column.type, EpochMicroseconds):
+        # 'YYYY-MM-DD HH:MM:SS.ffffff' -> seconds * 10^6 + the microsecond digits (000000 when absent)
+        return (f"CAST(strftime('%s', {name}) AS INTEGER) * 1000000"
+                f" + CAST(substr({name} || '.000000', 21, 6) AS INTEGER)")
+    if isinstance(column.type, DateTime):
+        return f"strftime('%Y-%m-%d %H:%M:%S', {name} / 1000000, 'unixepoch') || printf('.%06d', {name} % 1000000)"
+    return name
+
+
+def convert_task_tables(connection) -> Dict[str, int]:
+    """
+    Rewrites `tasks` and `tasks_archive` into the encoding COMPACT_TASK_STORAGE selects, recreating
+    their indexes; tables already in that encoding are left alone. Returns {table: rows converted}.
+    SQLite cannot change a column's type in place, so each table is renamed, recreated from the
+    model and refilled with one INSERT ... SELECT. Everything runs in one SAVEPOINT, because the
+    sqlite3 driver would otherwise autocommit the DDL: an error leaves the tables as they were.
+    """
+    connection.exec_driver_sql("SAVEPOINT convert_task_tables")
+    try:
+        converted = _convert_task_tables(connection)
+    except Exception:
+        connection.exec_driver_sql("ROLLBACK TO convert_task_tables")
+        connection.exec_driver_sql("RELEASE convert_task_tables")
+        raise
+    connection.exec_driver_sql("RELEASE convert_task_tables")
+    return converted
+
+
+def _sequence(connection, table_name: str) -> int:
+    """The AUTOINCREMENT sequence of `table_name` (0 if it has none)."""
+    if not inspect(connection).has_table("sqlite_sequence"):
+        return 0
+    return connection.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = ?", (table_name,)).scalar() or 0
+
+
+def _convert_task_tables(connection) -> Dict[str, int]:
+    converted = {}
+    for table in _task_tables():
+        compact = stored_compact(connection, table.name)
+        if compact is None or compact == COMPACT_TASK_STORAGE:
+            continue
+        old_name = f"{table.name}_before_conversion"
+        sequence = _sequence(connection, table.name) # Renaming and dropping the table loses it
+        connection.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old_name}")
+        for index in inspect(connection).get_indexes(old_name):
+            connection.exec_driver_sql(f"DROP INDEX {index['name']}") # The new table recreates them
+        table.create(connection)
+        old_columns = {column["name"] for column in inspect(connection).get_columns(old_name)}
+        copied = [column for column in table.columns if column.name in old_columns] # Newer columns start empty
+        columns = ", ".join(column.name for column in copied)
+        values = ", ".join(_converted(column) for column in copied)
+        result = connection.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {values} FROM {old_name}")
+        connection.exec_driver_sql(f"DROP TABLE {old_name}")
+        if table.name == "tasks":
+            # New ids continue after archived ones and, on a shard, inside the shard's range.
+            from .archive import reserve_archived_ids
+            reserve_archived_ids(connection, at_least=sequence)
+        converted[table.name] = result.rowcount
+    return converted
+
+
+# --- Benchmark ---
+
+def _storage_report(path: str) -> dict:
+    """File size and the bytes of `tasks` plus its indexes, after a VACUUM (needs SQLite's dbstat)."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("VACUUM")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        report = {"file_bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size}
+        try:
+            report["objects"] = dict(conn.execute(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE name = 'tasks'"
+                " OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks')"
+                " GROUP BY name"
+            ))
+        except sqlite3.OperationalError: # SQLite built without dbstat
+            report["objects"] = {}
+        report["tasks_bytes"] = sum(report["objects"].values())
+        return report
+    finally:
+        conn.close()
+
+
+def _benchmark_queries(compact: bool, now: datetime.datetime) -> Dict[str, tuple]:
+    def ts(value):
+        return to_epoch_microseconds(value) if compact else value.isoformat(" ", "microseconds")
+
+    def status(member):
+        return _compact_status_codes()[member] if compact else member.name
+
+    from .models import TaskStatus
+    week_ago, month_ago = now - datetime.timedelta(days=7), now - datetime.timedelta(days=30)
+    return {
+        "pending due in a week (partial index)": (
+            "SELECT count(*) FROM tasks WHERE status = ? AND due_date >= ? AND due_date < ?",
+            (status(TaskStatus.PENDING), ts(now), ts(now + datetime.timedelta(days=7)))),
+        "created in the last 30 days (full scan)": (
+            "SELECT count(*) FROM tasks NOT INDEXED WHERE creation_date >= ?", (ts(month_ago),)),
+        "completed last week per status (full scan)": (
+            "SELECT status, count(*) FROM tasks NOT INDEXED WHERE completion_date >= ? GROUP BY status", (ts(week_ago),)),
+        "sort all by due date (temp b-tree)": (
+            "SELECT id FROM tasks NOT INDEXED ORDER BY due_date, creation_date LIMIT 100", ()),
+        "activity feed first page (index)": (
+            "SELECT id FROM tasks WHERE status = ? ORDER BY completion_date DESC, id DESC LIMIT 20",
+            (status(TaskStatus.COMPLETED),)),
+    }
+
+
+def benchmark_storage(paths: Dict[str, str], now: datetime.datetime, repeat: int = 5) -> dict:
+    """
+    Compares the databases in `paths` ({"text": path, "compact": path}, same data in each encoding):
+    size after VACUUM, and the best of `repeat` runs of representative queries, in milliseconds.
+    """
+    results = {}
+    for encoding, path in paths.items():
+        report = _storage_report(path)
+        timings = {}
+        conn = sqlite3.connect(path)
+        try:
+            for name, (sql, params) in _benchmark_queries(encoding == "compact", now).items():
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    conn.execute(sql, params).fetchall()
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[name] = round(best * 1000, 2)
+        finally:
+            conn.close()
+        report["query_ms"] = timings
+        results[encoding] = report
+    return results
+
+
+if __name__ == "__main__":
+    # python -m task_gamification_app.app.compact_storage PATH: converts a database file to the
+    # configured encoding (used by `manage.py bench-storage` for the copy in the other encoding).
+    # Run through the package module: the models' column types are its classes, not this copy's.
+    import sys
+    from sqlalchemy import create_engine
+    from task_gamification_app.app import compact_storage
+
+    target = create_engine(f"sqlite:///{sys.argv[1]}")
+    with target.begin() as conn:
+        print(compact_storage.convert_task_tables(conn))
+    target.dispose()
@@ -0,0 +1,170 @@
+"""
+Chunked, resumable data migrations (backfills).
+
+Schema migrations in app/migrations/versions are quick DDL. Rewriting the rows
+themselves as one UPDATE would hold SQLite's write lock for as long as the whole
+table takes, so every request that writes would wait (or time out) meanwhile.
+`backfill` splits the work instead:
+
+- Rows are visited in chunks of consecutive primary keys (keyset order, like
+  archive_completed_tasks), each in its own short transaction.
+- The key the chunk ended at is saved in data_migration_checkpoints in the same
+  transaction, so after a crash or Ctrl-C the next run - usually just running the
+  migrations again - continues after the last committed chunk.
+- The chunk size adapts to keep each transaction under `latency_budget` seconds,
+  and the job sleeps between chunks (`pause_ratio` times the chunk's duration)
+  so live writers get the lock in between.
+- Progress (rows done, rate, estimated time left) is printed at most every few
+  seconds; run_migrations.py also reports backfills that were interrupted.
+
+A migration uses it like this (for instance to fill a new `priority` column):
+
+    def upgrade(op):
+        tasks = Task.__table__
+        backfill(op.get_bind(), "backfill_task_priority", tasks,
+                 tasks.update().values(priority=0),
+                 where=tasks.c.priority.is_(None))
+
+A chunk's changes commit together with its checkpoint, so each chunk takes effect
+exactly once however often the migration is interrupted and restarted.
+"""
+import datetime
+import time
+from typing import Callable, List, Optional, Union
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from .models import DataMigrationCheckpoint
+
+DEFAULT_CHUNK_SIZE = 1000
+MIN_CHUNK_SIZE = 50
+MAX_CHUNK_SIZE = 50000
+DEFAULT_LATENCY_BUDGET = 0.1 # Seconds a chunk may hold the write lock
+DEFAULT_PAUSE_RATIO = 1.0 # Sleep this many times the chunk's duration after it: live traffic gets half the time
+REPORT_INTERVAL = 5.0 # Seconds between progress lines
+
+# chunk(connection, after_key, upto_key) -> rows changed, for keys in (after_key, upto_key].
+ChunkAction = Callable[[Connection, Optional[int], int], int]
+
+
+def print_progress(checkpoint: DataMigrationCheckpoint, rows_per_second: float):
+    """Default progress reporter."""
+    total = max(checkpoint.rows_total, checkpoint.rows_done)
+    percent = checkpoint.rows_done / total * 100 if total else 100.0
+    line = f"  {checkpoint.name}: {checkpoint.rows_done}/{total} row(s) ({percent:.0f}%)"
+    if checkpoint.completed_at is None and rows_per_second > 0:
+        line += f", {rows_per_second:.0f} rows/s, about {(total - checkpoint.rows_done) / rows_per_second:.0f}s left"
+    print(line)
+
+
+def interrupted_migrations(bind: Union[Engine, Connection]) -> List[DataMigrationCheckpoint]:
+    """Returns the data migrations that were started but have not completed."""
+    engine = bind.engine
+    DataMigrationCheckpoint.__table__.create(engine, checkfirst=True)
+    with Session(bind=engine) as db_session:
+        return (db_session.query(DataMigrationCheckpoint)
+                .filter(DataMigrationCheckpoint.completed_at.is_(None))
+                .order_by(DataMigrationCheckpoint.name).all())
+
+
+def _as_chunk_action(action: Union[ChunkAction, UpdateBase], key, where) -> ChunkAction:
+    if not isinstance(action, UpdateBase):
+        return action
+
+    def run_statement(connection, after_key, upto_key):
+        chunk = action.where(key <= upto_key)
+        if where is not None:
+            chunk = chunk.where(where)
+        if after_key is not None:
+            chunk = chunk.where(key > after_key)
+        return connection.execute(chunk).rowcount
+
+    return run_statement
+
+
+def backfill(
+    bind: Union[Engine, Connection],
+    name: str,
+    table,
+    action: Union[ChunkAction, UpdateBase],
+    where=None,
+    key=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    latency_budget: float = DEFAULT_LATENCY_BUDGET,
+    pause_ratio: float = DEFAULT_PAUSE_RATIO,
+    max_chunks: Optional[int] = None,
+    progress: Optional[Callable[[DataMigrationCheckpoint, float], None]] = print_progress,
+) -> DataMigrationCheckpoint:
+    """
+    Runs `action` over the rows of `table` matching `where`, in keyset-ordered chunks on
+    `key` (the integer primary key by default), committing and checkpointing under `name`
+    after each chunk. `action` is an UPDATE or DELETE statement (the chunk's key range
+    and `where` are added to its WHERE clause) or a ChunkAction callable. A migration that
+    has completed is not run again; one that was interrupted resumes after its last
+    committed chunk.
+    Returns the checkpoint; with `max_chunks`, stops early and leaves it incomplete.
+    """
+    engine = bind.engine # Chunks commit on their own connections, whatever transaction `bind` is in
+    key = key if key is not None else table.primary_key.columns.values()[0]
+    run_chunk = _as_chunk_action(action, key, where)
+    DataMigrationCheckpoint.__table__.create(engine, checkfirst=True)
+
+    def matching(query):
+        return query.where(where) if where is not None else query
+
+    db_session = Session(bind=engine, expire_on_commit=False) # The checkpoint is only changed here
+    try:
+        checkpoint = db_session.get(DataMigrationCheckpoint, name)
+        if checkpoint is None:
+            total = db_session.execute(matching(select(func.count()).select_from(table))).scalar()
+            checkpoint = DataMigrationCheckpoint(name=name, last_key=None, rows_done=0, rows_total=total)
+            db_session.add(checkpoint)
+            db_session.commit()
+        elif checkpoint.completed_at is not None:
+            return checkpoint
+        elif progress:
+            print(f"  {name}: resuming after key {checkpoint.last_key} ({checkpoint.rows_done}/{checkpoint.rows_total} row(s) done)")
+
+        started = time.perf_counter()
+        reported = started
+        rows_at_start = checkpoint.rows_done
+        chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            chunk_started = time.perf_counter()
+            remaining = matching(select(key).where(key > checkpoint.last_key) if checkpoint.last_key is not None
+                                 else select(key))
+            # The key `chunk_size` matching rows ahead, or the last matching key if fewer are left.
+            upto_key = db_session.execute(remaining.order_by(key).offset(chunk_size - 1).limit(1)).scalar()
+            if upto_key is None:
+                upto_key = db_session.execute(select(func.max(remaining.subquery().c[0]))).scalar()
+                if upto_key is None:
+                    checkpoint.completed_at = datetime.datetime.utcnow()
+                    db_session.commit()
+                    break
+
+            checkpoint.rows_done += run_chunk(db_session.connection(), checkpoint.last_key, upto_key)
+            checkpoint.last_key = upto_key
+            db_session.commit() # The chunk and its checkpoint, together
+            chunks += 1
+
+            elapsed = time.perf_counter() - chunk_started
+            if elapsed > latency_budget:
+                chunk_size = max(MIN_CHUNK_SIZE, int(chunk_size * latency_budget / elapsed * 0.8))
+            elif elapsed < latency_budget / 2:
+                chunk_size = min(MAX_CHUNK_SIZE, chunk_size * 2)
+            now = time.perf_counter()
+            if progress and now - reported >= REPORT_INTERVAL:
+                progress(checkpoint, (checkpoint.rows_done - rows_at_start) / (now - started))
+                reported = now
+            if pause_ratio:
+                time.sleep(elapsed * pause_ratio)
+
+        if progress and checkpoint.completed_at is not None:
+            elapsed = time.perf_counter() - started
+            progress(checkpoint, (checkpoint.rows_done - rows_at_start) / elapsed if elapsed else 0.0)
+        return checkpoint
+    finally:
+        db_session.close()
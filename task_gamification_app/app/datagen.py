@@ -0,0 +1,148 @@
+"""
+Synthetic data for load tests and benchmarks.
+
+Going through `create_user` / `create_task_for_user` costs a bcrypt hash per user
+and a commit per row, which makes production-sized databases impractical to build.
+`generate_dataset` writes rows directly with executemany inserts inside one
+transaction instead:
+
+- every user gets the same password hash, computed once (log in as any generated
+  user with `password`);
+- task status, due dates and completion times follow simple realistic distributions
+  (see `_task_rows`), and `users.points` is set from the generated completions;
+- user_stats is rebuilt for each chunk of new users right after it is inserted.
+
+Task rows are the bulk of the work, so they are passed to the driver as tuples
+already in SQLite's storage format (enum names and ISO datetimes, or integers under
+COMPACT_TASK_STORAGE): SQLAlchemy's per-value type processing would otherwise cost
+more than the inserts themselves.
+
+The same seed and `now` always produce the same rows. Ids continue after the
+highest existing user id, so a dataset can be added to a database in use.
+"""
+import datetime
+import random
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import hashing
+from .compact_storage import COMPACT_TASK_STORAGE, to_epoch_microseconds
+from .models import TASK_STATUS_CODES, TaskStatus, User
+from .services import POINTS_PER_TASK
+from .stats import rebuild_user_stats
+
+DEFAULT_PASSWORD = "password"
+HISTORY_DAYS = 90 # Tasks are created over this many days before `now`
+CACHE_KIB = 256 * 1024 # SQLite page cache while generating
+
+_VERBS = ["Write", "Review", "Fix", "Plan", "Call", "Clean", "Read", "Update", "Prepare", "Check"]
+_OBJECTS = ["report", "budget", "kitchen", "presentation", "garden", "inbox", "tests", "invoice", "notes", "schedule"]
+_DESCRIPTIONS = [f"{verb} {obj}" for verb in _VERBS for obj in _OBJECTS]
+
+_TASK_COLUMNS = ("description", "status", "creation_date", "due_date", "completion_date", "user_id")
+_INSERT_TASKS = f"INSERT INTO tasks ({', '.join(_TASK_COLUMNS)}) VALUES ({', '.join('?' for _ in _TASK_COLUMNS)})"
+
+
+def _stored(value: Optional[datetime.datetime]):
+    if value is None:
+        return None
+    if COMPACT_TASK_STORAGE:
+        return to_epoch_microseconds(value)
+    return value.isoformat(" ", "microseconds") # The format SQLAlchemy's SQLite DateTime type writes and parses
+
+
+_STORED_STATUS = {status: TASK_STATUS_CODES[status] if COMPACT_TASK_STORAGE else status.name for status in TaskStatus}
+
+
+def _task_rows(rng: random.Random, user_id: int, count: int, now: datetime.datetime) -> Tuple[List[tuple], int]:
+    """
+    Returns `count` task rows (tuples of _TASK_COLUMNS) for one user and how many of them are completed.
+    Creation times are uniform over HISTORY_DAYS. Older tasks are more likely to be
+    done (about 85% of the oldest, 20% of the newest); 70% of tasks have a due date
+    0-14 days after creation, and completions take an exponential ~2 days.
+    """
+    rows = []
+    completed = 0
+    history = HISTORY_DAYS * 86400
+    for _ in range(count):
+        age = rng.random()
+        creation = now - datetime.timedelta(seconds=int(age * history))
+        due = creation + datetime.timedelta(days=int(rng.random() * 15)) if rng.random() < 0.7 else None
+        completion = None
+        if rng.random() < 0.2 + 0.65 * age:
+            completed += 1
+            completion = min(creation + datetime.timedelta(seconds=int(rng.expovariate(1 / 172800))), now)
+        rows.append((
+            _DESCRIPTIONS[int(rng.random() * len(_DESCRIPTIONS))],
+            _STORED_STATUS[TaskStatus.PENDING if completion is None else TaskStatus.COMPLETED],
+            _stored(creation),
+            _stored(due),
+            _stored(completion),
+            user_id,
+        ))
+    return rows, completed
+
+
+def _chunks(first_id: int, users: int, size: int) -> Iterator[range]:
+    for start in range(first_id, first_id + users, size):
+        yield range(start, min(start + size, first_id + users))
+
+
+def generate_dataset(db_session: Session, users: int, tasks_per_user: int, seed: int = 0,
+                     now: Optional[datetime.datetime] = None, password: str = DEFAULT_PASSWORD,
+                     users_per_chunk: int = 1000, progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """
+    Inserts `users` users with `tasks_per_user` tasks each, with their stats rows.
+    `now` defaults to today at midnight (UTC), so runs on the same day are identical.
+    Rows are inserted `users_per_chunk` users at a time; `progress(users_done, users)` is
+    called after each chunk. Does not commit; returns counts and timings.
+    """
+    started = time.perf_counter()
+    now = now or datetime.datetime.combine(datetime.datetime.utcnow().date(), datetime.time())
+    rng = random.Random(seed)
+    password_hash = hashing.hash_password(password) # Once, instead of once per user
+    first_id = (db_session.execute(select(func.max(User.id))).scalar() or 0) + 1
+    connection = db_session.connection()
+    cache_size = connection.exec_driver_sql("PRAGMA cache_size").scalar()
+    # A page cache large enough for the task indexes, so that index inserts do not thrash.
+    connection.exec_driver_sql(f"PRAGMA cache_size = -{CACHE_KIB}")
+
+    task_count = completed_count = 0
+    stats_seconds = 0.0
+    for chunk in _chunks(first_id, users, users_per_chunk):
+        user_rows, task_rows = [], []
+        for user_id in chunk:
+            rows, completed = _task_rows(rng, user_id, tasks_per_user, now)
+            task_rows.extend(rows)
+            completed_count += completed
+            user_rows.append({
+                "id": user_id,
+                "first_name": "Load",
+                "last_name": f"User {user_id}",
+                "username": f"loadgen{user_id}",
+                "email": f"loadgen{user_id}@example.com",
+                "password_hash": password_hash,
+                "points": completed * POINTS_PER_TASK,
+            })
+        db_session.execute(User.__table__.insert(), user_rows)
+        if task_rows:
+            connection.exec_driver_sql(_INSERT_TASKS, task_rows)
+        task_count += len(task_rows)
+        stats_started = time.perf_counter()
+        rebuild_user_stats(db_session, chunk)
+        stats_seconds += time.perf_counter() - stats_started
+        if progress:
+            progress(chunk.stop - first_id, users)
+    connection.exec_driver_sql(f"PRAGMA cache_size = {cache_size}")
+
+    return {
+        "users": users,
+        "tasks": task_count,
+        "completed": completed_count,
+        "first_user_id": first_id,
+        "seconds": round(time.perf_counter() - started, 2),
+        "stats_seconds": round(stats_seconds, 2),
+    }
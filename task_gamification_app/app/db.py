@@ -1,17 +1,38 @@
+import os
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
 from .models import Base # Import Base from models.py
+from .sharding import ShardSet
 
 DATABASE_URL = "sqlite:///./task_gamification.db"
 
-engine = create_engine(
-    DATABASE_URL,
-    # connect_args={"check_same_thread": False} # Needed only for SQLite if using threads, e.g. in FastAPI
-)
+# Horizontal sharding (see app/sharding.py): with DATABASE_SHARDS=N (N > 1), users and their
+# rows are spread over ./task_gamification.shard0.db ... shard{N-1}.db, with usernames and emails
+# in ./task_gamification.directory.db. The number of shards cannot change once data exists.
+DATABASE_SHARDS = int(os.environ.get("DATABASE_SHARDS", 1))
+shard_set = ShardSet.for_files("./task_gamification", DATABASE_SHARDS) if DATABASE_SHARDS > 1 else None
+
+if shard_set is None:
+    engine = create_engine(
+        DATABASE_URL,
+        # connect_args={"check_same_thread": False} # Needed only for SQLite if using threads, e.g. in FastAPI
+    )
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+else:
+    # Code that needs a single database (maintenance, backups, migrations) gets the home shard;
+    # see database_urls() for all of them.
+    engine = shard_set.engines["shard0"]
+    SessionLocal = shard_set.sessionmaker(autocommit=False, autoflush=False)
+
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def database_urls() -> list:
+    """The URL of every database holding application tables: the one database, or each shard."""
+    if shard_set is None:
+        return [DATABASE_URL]
+    return [str(shard_engine.url) for shard_engine in shard_set.engines.values()]
 
 # Dependency to get DB session (useful for web frameworks like FastAPI)
 def get_db():
@@ -21,12 +42,22 @@ def get_db():
     finally:
         db.close()
 
-def init_db():
+def init_db(target=None):
     """
     Initializes the database and creates tables if they don't exist.
+    `target` is an engine to initialise instead of the app database (e.g. a scratch database).
     """
-    # This will create all tables defined in models.py that inherit from Base
-    Base.metadata.create_all(bind=engine)
+    if target is None and shard_set is not None:
+        shard_set.create_all()
+        print(f"Database initialized and tables created on {DATABASE_SHARDS} shards (if they didn't exist).")
+        return
+    with (target or engine).begin() as connection:
+        if connection.dialect.name == "sqlite":
+            # Only takes effect on a brand-new database (existing ones are switched by migration 7);
+            # it must run on the same connection that creates the first table.
+            connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        # This will create all tables defined in models.py that inherit from Base
+        Base.metadata.create_all(bind=connection)
     print("Database initialized and tables created (if they didn't exist).")
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""
+In-process domain events.
+
+Service functions publish a typed event once their transaction has committed
+(`TaskCreated`, `TaskCompleted`, `TaskDeleted`, `UserUpdated`). Side effects that
+are not part of the write itself -- caches, badges, notifications, live views --
+subscribe to those events instead of being added to the service function, so the
+write path stays one short transaction however many features react to it.
+
+A subscriber runs either synchronously in the publishing thread (for cheap work
+that later reads in the same request depend on) or on the bus's bounded thread pool
+(`background=True`). When the pool's queue is full the handler runs in the
+publishing thread instead, so events are never dropped and memory stays bounded.
+
+Every subscriber is timed and isolated: an exception is counted and reported, and
+never reaches the publisher or the other subscribers. `event_bus_stats()` reports
+calls, errors and timings per subscriber.
+"""
+import datetime
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+
+class TaskCreated(NamedTuple):
+    task_id: int
+    user_id: int
+    due_date: Optional[datetime.datetime]
+
+
+class TaskCompleted(NamedTuple):
+    task_id: int
+    user_id: int
+    points_awarded: int
+    completion_date: datetime.datetime
+
+
+class TaskDeleted(NamedTuple):
+    task_id: int
+    user_id: int
+    was_completed: bool
+
+
+class UserUpdated(NamedTuple):
+    user_id: int
+    changed_fields: Tuple[str, ...]
+    released: Tuple[Tuple[str, str], ...] = () # (field, old value) pairs of a changed username/email
+
+
+class _Subscriber:
+    """A handler plus its counters."""
+
+    def __init__(self, handler: Callable, background: bool, name: str):
+        self.handler = handler
+        self.background = background
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def run(self, event, on_error: Callable):
+        started = time.perf_counter()
+        error = None
+        try:
+            self.handler(event)
+        except Exception as e: # Isolation: a failing subscriber never breaks the publisher
+            error = e
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.calls += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            if error is not None:
+                self.errors += 1
+                self.last_error = f"{type(error).__name__}: {error}"
+        if error is not None:
+            on_error(self, event, error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "background": self.background,
+                "calls": self.calls,
+                "errors": self.errors,
+                "average_ms": round(self.total_seconds / self.calls * 1000, 3) if self.calls else None,
+                "max_ms": round(self.max_seconds * 1000, 3),
+                "last_error": self.last_error,
+            }
+
+
+def _report_error(subscriber: _Subscriber, event, error: Exception):
+    print(f"Event subscriber {subscriber.name} failed on {type(event).__name__}: {error!r}", file=sys.stderr)
+
+
+class EventBus:
+    """
+    Publish/subscribe by event type. Background handlers share a pool of `max_workers`
+    threads with at most `max_pending` queued or running calls.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 1000, on_error: Callable = _report_error):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.on_error = on_error
+        self._subscribers: Dict[Type, List[_Subscriber]] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._idle = threading.Condition()
+        self._pending = 0
+        self.published = 0
+        self.ran_inline = 0 # Background calls run by the publisher because the queue was full
+
+    def subscribe(self, event_type: Type, handler: Callable, background: bool = False, name: Optional[str] = None) -> Callable:
+        subscriber = _Subscriber(handler, background, name or getattr(handler, "__qualname__", repr(handler)))
+        with self._lock:
+            # Copy-on-write, so publish() can iterate without holding the lock.
+            self._subscribers[event_type] = self._subscribers.get(event_type, []) + [subscriber]
+        return handler
+
+    def subscriber(self, event_type: Type, background: bool = False):
+        """Decorator form of `subscribe`."""
+        def decorator(handler):
+            return self.subscribe(event_type, handler, background=background)
+        return decorator
+
+    def unsubscribe(self, event_type: Type, handler: Callable):
+        with self._lock:
+            self._subscribers[event_type] = [s for s in self._subscribers.get(event_type, []) if s.handler != handler]
+
+    def publish(self, event):
+        """Delivers `event` to the subscribers of its type; synchronous ones have run when this returns."""
+        self.published += 1
+        for subscriber in self._subscribers.get(type(event), ()):
+            if subscriber.background:
+                self._submit(subscriber, event)
+            else:
+                subscriber.run(event, self.on_error)
+
+    def _submit(self, subscriber: _Subscriber, event):
+        if not self._slots.acquire(blocking=False):
+            self.ran_inline += 1
+            subscriber.run(event, self.on_error)
+            return
+        with self._idle:
+            self._pending += 1
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="event-bus")
+        self._executor.submit(self._run_background, subscriber, event)
+
+    def _run_background(self, subscriber: _Subscriber, event):
+        try:
+            subscriber.run(event, self.on_error)
+        finally:
+            self._slots.release()
+            with self._idle:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._idle.notify_all()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Waits until no background calls are queued or running. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        subscribers = {}
+        for event_type, entries in list(self._subscribers.items()):
+            for subscriber in entries:
+                subscribers[f"{event_type.__name__}:{subscriber.name}"] = subscriber.stats()
+        return {"published": self.published, "pending": self._pending, "ran_inline": self.ran_inline,
+                "subscribers": subscribers}
+
+
+bus = EventBus(
+    max_workers=int(os.environ.get("EVENT_BUS_WORKERS", 2)),
+    max_pending=int(os.environ.get("EVENT_BUS_MAX_PENDING", 1000)),
+)
+
+
+# Set in a session's `info` by code that commits on the session's behalf later (see write_coalescer).
+AFTER_COMMIT_KEY = "after_commit"
+
+
+def after_commit(db_session, callback: Callable):
+    """
+    Runs `callback` now -- callers have just committed -- unless `db_session` belongs to a
+    coalesced write batch, in which case it runs once the batch has really committed.
+    """
+    deferred = db_session.info.get(AFTER_COMMIT_KEY) if db_session is not None else None
+    if deferred is None:
+        callback()
+    else:
+        deferred.append(callback)
+
+
+def subscribe(event_type: Type, handler: Callable, background: bool = False, name: Optional[str] = None) -> Callable:
+    return bus.subscribe(event_type, handler, background=background, name=name)
+
+
+def publish(event, db_session=None):
+    """Publishes `event`; pass the session that committed the change so batched writes publish after their commit."""
+    after_commit(db_session, lambda: bus.publish(event))
+
+
+def event_bus_stats() -> dict:
+    return bus.stats()
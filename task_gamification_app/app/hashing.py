@@ -0,0 +1,177 @@
+"""
+Password hashing with named cost profiles.
+
+Hashers are registered by scheme, and a stored hash names the scheme and the cost
+it was made with, so a hash can always be verified after the active profile changes.
+New passwords are hashed with the active profile, chosen by the PASSWORD_HASH_PROFILE
+environment variable (or `set_active_profile`):
+
+    fast     bcrypt, 4 rounds   -- tests and local development only
+    default  bcrypt, 12 rounds
+    strong   bcrypt, 13 rounds
+    scrypt   scrypt, n=2**14, r=8, p=1
+
+`needs_rehash` tells whether a stored hash was made with other parameters than the
+active profile's; verify_user_login then rehashes the password on the next
+successful login, which moves users between profiles without a password reset.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Dict
+
+import bcrypt
+
+
+class PasswordHasher(ABC):
+    """Base class of the hashers; `scheme` is the prefix that identifies its hashes."""
+    scheme = ""
+
+    @abstractmethod
+    def hash(self, password: str) -> str:
+        ...
+
+    @abstractmethod
+    def verify(self, password: str, password_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if `password_hash` (of this scheme) was made with different parameters."""
+
+    @classmethod
+    @abstractmethod
+    def handles(cls, password_hash: str) -> bool:
+        """True if `password_hash` was made by this scheme."""
+
+
+class BcryptHasher(PasswordHasher):
+    scheme = "bcrypt"
+    _ROUNDS_RE = re.compile(r"^\$2[abxy]?\$(\d\d)\$")
+
+    def __init__(self, rounds: int = 12):
+        self.rounds = rounds
+
+    def hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        match = self._ROUNDS_RE.match(password_hash)
+        return not match or int(match.group(1)) != self.rounds
+
+    @classmethod
+    def handles(cls, password_hash: str) -> bool:
+        return password_hash.startswith("$2")
+
+
+class ScryptHasher(PasswordHasher):
+    """hashlib.scrypt; hashes look like $scrypt$n=16384,r=8,p=1$<salt>$<key>."""
+    scheme = "scrypt"
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1, key_length: int = 32):
+        self.n, self.r, self.p, self.key_length = n, r, p, key_length
+
+    def _derive(self, password: str, salt: bytes, n: int, r: int, p: int, key_length: int) -> bytes:
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, dklen=key_length,
+                              maxmem=256 * n * r + 1024 * 1024)
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(16)
+        key = self._derive(password, salt, self.n, self.r, self.p, self.key_length)
+        encode = lambda raw: base64.b64encode(raw).decode('ascii')
+        return f"$scrypt$n={self.n},r={self.r},p={self.p}${encode(salt)}${encode(key)}"
+
+    @staticmethod
+    def _parse(password_hash: str):
+        _, _, params, salt, key = password_hash.split("$")
+        values = dict(item.split("=") for item in params.split(","))
+        return int(values["n"]), int(values["r"]), int(values["p"]), base64.b64decode(salt), base64.b64decode(key)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        try:
+            n, r, p, salt, key = self._parse(password_hash)
+        except (ValueError, KeyError):
+            return False
+        return hmac.compare_digest(self._derive(password, salt, n, r, p, len(key)), key)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        try:
+            n, r, p, _, key = self._parse(password_hash)
+        except (ValueError, KeyError):
+            return True
+        return (n, r, p, len(key)) != (self.n, self.r, self.p, self.key_length)
+
+    @classmethod
+    def handles(cls, password_hash: str) -> bool:
+        return password_hash.startswith("$scrypt$")
+
+
+# Verifiers by scheme, used for stored hashes whatever the active profile is.
+_SCHEMES = {"bcrypt": BcryptHasher, "scrypt": ScryptHasher}
+
+PROFILES: Dict[str, PasswordHasher] = {
+    "fast": BcryptHasher(rounds=4),
+    "default": BcryptHasher(rounds=12),
+    "strong": BcryptHasher(rounds=13),
+    "scrypt": ScryptHasher(),
+}
+
+DEFAULT_PROFILE = "default"
+_active_profile = os.environ.get("PASSWORD_HASH_PROFILE", DEFAULT_PROFILE)
+
+
+class UnknownHashProfileError(ValueError):
+    pass
+
+
+def register_profile(name: str, hasher: PasswordHasher):
+    """Adds (or replaces) a named profile."""
+    PROFILES[name] = hasher
+
+
+def set_active_profile(name: str):
+    global _active_profile
+    if name not in PROFILES:
+        raise UnknownHashProfileError(f"Unknown password hash profile '{name}'. Choose from: {', '.join(PROFILES)}.")
+    _active_profile = name
+
+
+def get_active_hasher() -> PasswordHasher:
+    if _active_profile not in PROFILES:
+        raise UnknownHashProfileError(f"Unknown password hash profile '{_active_profile}'. Choose from: {', '.join(PROFILES)}.")
+    return PROFILES[_active_profile]
+
+
+def _scheme_of(password_hash: str):
+    for scheme_class in _SCHEMES.values():
+        if scheme_class.handles(password_hash):
+            return scheme_class
+    return None
+
+
+def hash_password(password: str) -> str:
+    return get_active_hasher().hash(password)
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    """Checks `password` against a stored hash of any registered scheme."""
+    scheme_class = _scheme_of(password_hash or "")
+    if scheme_class is None:
+        return False
+    # Verification reads the cost parameters from the hash itself, so any instance will do.
+    return scheme_class().verify(password, password_hash)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True if the stored hash was not made with the active profile's scheme and parameters."""
+    hasher = get_active_hasher()
+    scheme_class = _scheme_of(password_hash or "")
+    if scheme_class is None or not isinstance(hasher, scheme_class):
+        return True
+    return hasher.needs_rehash(password_hash)
@@ -0,0 +1,115 @@
+"""
+Cached, read-only snapshots of user identity data.
+
+Pages and CLI menus look up the same user over and over just to show a name or a
+points total. A lookup first checks a per-request memo (kept in the SQLAlchemy
+session's `info` dict, so it lives exactly as long as the request's session) and
+then a process-wide LRU of `UserSnapshot`s. Only on a miss is the database hit.
+
+Writers that change any snapshot field call `invalidate_user_snapshot_on_commit`
+before committing; the snapshot is then dropped once the transaction has committed
+(for a coalesced write batch, once the whole batch has). A lookup that read the row
+while such a commit happened does not put its possibly stale result in the cache.
+"""
+import threading
+from typing import NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .cache import LRUCache
+from .models import User
+
+# Snapshots are small, so a few thousand entries cost well under a megabyte.
+# The TTL bounds staleness caused by writes from other processes.
+USER_SNAPSHOT_CACHE_SIZE = 4096
+USER_SNAPSHOT_TTL_SECONDS = 60
+
+_SESSION_MEMO_KEY = "user_snapshots"
+_PENDING_INVALIDATIONS_KEY = "user_snapshots_to_invalidate"
+
+
+class UserSnapshot(NamedTuple):
+    """Detached, immutable view of the identity fields of a User."""
+    id: int
+    username: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    email: Optional[str]
+    points: int
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(user.id, user.username, user.first_name, user.last_name, user.email, user.points)
+
+
+_snapshot_cache = LRUCache(maxsize=USER_SNAPSHOT_CACHE_SIZE, ttl=USER_SNAPSHOT_TTL_SECONDS)
+# Bumped by every invalidation, under the lock, so a lookup can tell whether one happened while it read.
+_invalidations = 0
+_invalidations_lock = threading.Lock()
+
+
+def _cache_key(db_session: Session, user_id: int) -> tuple:
+    # Key by engine so that different databases (e.g. tests, shards) never share entries.
+    bind = db_session.get_bind()
+    return (id(getattr(bind, "engine", bind)), user_id)
+
+
+def get_user_snapshot(db_session: Session, user_id: int) -> Optional[UserSnapshot]:
+    """
+    Returns a UserSnapshot for `user_id`, or None if the user does not exist.
+    Misses are not cached, so a user created later is found immediately.
+    """
+    memo = db_session.info.setdefault(_SESSION_MEMO_KEY, {})
+    snapshot = memo.get(user_id)
+    if snapshot is not None:
+        return snapshot
+
+    key = _cache_key(db_session, user_id)
+    snapshot = _snapshot_cache.get(key)
+    if snapshot is None:
+        invalidations = _invalidations
+        row = (
+            db_session.query(User.id, User.username, User.first_name, User.last_name, User.email, User.points)
+            .filter(User.id == user_id)
+            .first()
+        )
+        if row is None:
+            return None
+        snapshot = UserSnapshot(*row)
+        with _invalidations_lock:
+            if invalidations == _invalidations: # Otherwise the row may predate a write committed meanwhile
+                _snapshot_cache.set(key, snapshot)
+    memo[user_id] = snapshot
+    return snapshot
+
+
+def invalidate_user_snapshot(db_session: Session, user_id: int) -> None:
+    """Drops any cached snapshot of `user_id`, both for this request and process-wide."""
+    global _invalidations
+    db_session.info.get(_SESSION_MEMO_KEY, {}).pop(user_id, None)
+    with _invalidations_lock:
+        _invalidations += 1
+        _snapshot_cache.delete(_cache_key(db_session, user_id))
+
+
+def invalidate_user_snapshot_on_commit(db_session: Session, user_id: int) -> None:
+    """Drops the cached snapshot of `user_id` once `db_session`'s transaction commits. Call before committing."""
+    db_session.info.setdefault(_PENDING_INVALIDATIONS_KEY, set()).add(user_id)
+    # after_commit fires for the outermost transaction only, so a write batch's savepoints do not trigger it.
+    if not event.contains(db_session, "after_commit", _invalidate_pending_snapshots):
+        event.listen(db_session, "after_commit", _invalidate_pending_snapshots)
+
+
+def _invalidate_pending_snapshots(db_session: Session) -> None:
+    for user_id in db_session.info.pop(_PENDING_INVALIDATIONS_KEY, ()):
+        invalidate_user_snapshot(db_session, user_id)
+
+
+def clear_user_snapshot_cache() -> None:
+    """Empties the process-wide snapshot cache (mainly for tests)."""
+    _snapshot_cache.clear()
+
+
+def user_snapshot_cache_stats() -> dict:
+    return _snapshot_cache.stats()
@@ -0,0 +1,211 @@
+"""
+Online SQLite maintenance: planner statistics, incremental vacuum, integrity checks
+and a size / query-plan report. Everything here is safe to run while the app serves
+traffic; none of it rewrites the whole database file.
+"""
+import contextlib
+import datetime
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+AUTO_VACUUM_MODES = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}
+
+# A plan step that reads a whole table row by row: "SCAN tasks" ("SCAN TABLE tasks" before SQLite 3.36).
+# "SCAN tasks USING INDEX ..." walks an index instead and is not matched.
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+INDEXED_TABLES = ("tasks", "tasks_archive", "recurring_tasks")
+
+
+def _pragma(conn, name: str):
+    return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def analyze(engine: Engine):
+    """Refreshes the query planner's statistics (ANALYZE, then PRAGMA optimize)."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize")
+
+
+def incremental_vacuum(engine: Engine, max_pages: Optional[int] = None, pages_per_transaction: int = 1000) -> dict:
+    """
+    Returns free pages to the file system, up to `max_pages` (all of them if None).
+    Requires auto_vacuum=INCREMENTAL (set up by migration 7); otherwise nothing is done.
+
+    SQLite frees one page per step of the pragma and the sqlite3 module only steps it once
+    per execute, so the pragma is executed once per page, in short write transactions
+    of `pages_per_transaction` pages so concurrent writers are not blocked for long.
+    """
+    with engine.connect() as conn:
+        mode = AUTO_VACUUM_MODES.get(_pragma(conn, "auto_vacuum"), "UNKNOWN")
+        free_before = _pragma(conn, "freelist_count")
+        if mode == "INCREMENTAL" and free_before:
+            remaining = free_before if max_pages is None else min(max_pages, free_before)
+            while remaining > 0:
+                chunk = min(remaining, pages_per_transaction)
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                try:
+                    for _ in range(chunk):
+                        conn.exec_driver_sql("PRAGMA incremental_vacuum")
+                    conn.exec_driver_sql("COMMIT")
+                except Exception:
+                    conn.exec_driver_sql("ROLLBACK")
+                    raise
+                remaining -= chunk
+        free_after = _pragma(conn, "freelist_count")
+        page_size = _pragma(conn, "page_size")
+    return {
+        "auto_vacuum": mode,
+        "freed_pages": free_before - free_after,
+        "freed_bytes": (free_before - free_after) * page_size,
+        "free_pages_left": free_after,
+    }
+
+
+def integrity_check(engine: Engine, max_errors: int = 100) -> List[str]:
+    """Runs PRAGMA integrity_check and returns its messages (["ok"] for a healthy database)."""
+    with engine.connect() as conn:
+        return [row[0] for row in conn.exec_driver_sql(f"PRAGMA integrity_check({int(max_errors)})")]
+
+
+def object_sizes(engine: Engine) -> List[Tuple[str, int]]:
+    """
+    Returns (table or index name, bytes) pairs, largest first.
+    Uses the dbstat virtual table when SQLite was built with it; otherwise reports only the whole file.
+    """
+    with engine.connect() as conn:
+        try:
+            rows = conn.exec_driver_sql(
+                "SELECT name, SUM(pgsize) AS size FROM dbstat GROUP BY name ORDER BY size DESC"
+            ).fetchall()
+            return [(name, size) for name, size in rows]
+        except Exception:
+            page_size = _pragma(conn, "page_size")
+            return [("(database file)", _pragma(conn, "page_count") * page_size)]
+
+
+@contextlib.contextmanager
+def capture_statements(engine: Engine):
+    """
+    Records every SQL statement executed on `engine` inside the block.
+    Yields a list that fills with (statement, parameters) tuples.
+    """
+    statements: List[Tuple[str, tuple]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextlib.contextmanager
+def rolled_back_session(engine: Engine):
+    """
+    Yields a session whose writes, including those it commits, are all undone at the end.
+    The session is bound to one connection whose transaction is always rolled back; its
+    commits leave that transaction open, and its rollbacks only return to a SAVEPOINT.
+    """
+    with engine.connect() as conn:
+        trans = conn.begin()
+        if conn.dialect.name == "sqlite":
+            # pysqlite only begins before a write, so the SAVEPOINT would otherwise start the transaction.
+            conn.exec_driver_sql("BEGIN")
+        nested = [conn.begin_nested()]
+        db_session = Session(bind=conn)
+
+        @event.listens_for(db_session, "after_transaction_end")
+        def restart_savepoint(session, transaction):
+            if not nested[0].is_active:
+                nested[0] = conn.begin_nested()
+
+        try:
+            yield db_session
+        finally:
+            db_session.close()
+            trans.rollback()
+
+
+def explain(db_session: Session, statement: str, parameters=()) -> List[str]:
+    """Returns the EXPLAIN QUERY PLAN details of a raw SQL statement."""
+    rows = db_session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan: List[str], tables=INDEXED_TABLES) -> List[str]:
+    """Returns the steps of a query plan (from `explain`) that scan one of `tables` without an index."""
+    scans = []
+    for line in plan:
+        match = _FULL_SCAN.match(line)
+        if match and match.group(1) in tables:
+            scans.append(line)
+    return scans
+
+
+def _sample_service_calls(db_session: Session) -> Dict[str, Callable[[], object]]:
+    """The read paths whose plans matter most, called with representative arguments."""
+    from .models import User
+    from .services import (
+        get_tasks_for_user,
+        get_tasks_page,
+        count_tasks_by_status,
+        get_tasks_due_between,
+        get_leaderboard_users_paginated,
+        get_recent_activity,
+        get_user_stats,
+    )
+
+    user_id = db_session.query(User.id).order_by(User.id).limit(1).scalar() or 0
+    now = datetime.datetime.utcnow()
+    return {
+        "get_tasks_for_user": lambda: get_tasks_for_user(db_session, user_id, sort_by="due_date"),
+        "get_tasks_for_user(completion_date)": lambda: get_tasks_for_user(db_session, user_id, completion_date=now.date()),
+        "get_tasks_page": lambda: get_tasks_page(db_session, user_id, sort_by="due_date"),
+        "count_tasks_by_status": lambda: count_tasks_by_status(db_session, user_id),
+        "get_tasks_due_between": lambda: get_tasks_due_between(db_session, now, now + datetime.timedelta(days=1)),
+        "get_leaderboard_users_paginated": lambda: get_leaderboard_users_paginated(db_session, page=1, per_page=10),
+        "get_recent_activity": lambda: get_recent_activity(db_session, cursor=None, limit=20),
+        "get_user_stats": lambda: get_user_stats(db_session, user_id) if user_id else None,
+    }
+
+
+def service_query_plans(engine: Engine) -> Dict[str, List[Tuple[str, List[str]]]]:
+    """
+    Runs the main service queries once and returns, per service call, each SELECT it issued
+    together with its query plan. Some calls write (materialising recurring tasks, rebuilding
+    a stats row); all of it is rolled back.
+    """
+    plans: Dict[str, List[Tuple[str, List[str]]]] = {}
+    with rolled_back_session(engine) as db_session:
+        for name, call in _sample_service_calls(db_session).items():
+            with capture_statements(engine) as statements:
+                call()
+            plans[name] = [
+                (statement, explain(db_session, statement, parameters))
+                for statement, parameters in statements
+                if statement.lstrip().upper().startswith("SELECT")
+            ]
+    return plans
+
+
+def print_report(engine: Engine):
+    """Prints table/index sizes and the query plans of the main service queries."""
+    print("\n--- Table and index sizes ---")
+    for name, size in object_sizes(engine):
+        print(f"{name:<40} {size / 1024:>12.1f} KiB")
+
+    print("\n--- Query plans ---")
+    for name, statements in service_query_plans(engine).items():
+        print(f"\n{name}:")
+        for statement, plan in statements:
+            print("  " + " ".join(statement.split())[:120])
+            scans = full_scans(plan)
+            for line in plan:
+                print(f"    -> {line}" + ("    <-- full table scan" if line in scans else ""))
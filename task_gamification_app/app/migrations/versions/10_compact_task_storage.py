@@ -0,0 +1,39 @@
+"""Rewrite tasks and tasks_archive in the compact encoding (opt-in)
+
+Only does something when COMPACT_TASK_STORAGE=true: the status is then stored as a
+small integer and the timestamps as integer epoch microseconds (see
+app/compact_storage.py). Both tables are rebuilt with one INSERT ... SELECT each,
+which needs free disk space for a second copy of them while it runs; the old pages
+are reclaimed by the next `manage.py maintenance` (incremental vacuum).
+
+Without the setting the migration is a no-op. Databases can be converted later, in
+either direction, with `manage.py convert-task-storage`.
+"""
+from alembic.operations import Operations
+
+from task_gamification_app.app import compact_storage
+
+# revision identifiers, used by this migration.
+revision = '10'
+down_revision = '9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(op: Operations):
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    if not compact_storage.COMPACT_TASK_STORAGE:
+        print("COMPACT_TASK_STORAGE is off; leaving the task tables in the text encoding.")
+        return
+    for table, rows in compact_storage.convert_task_tables(op.get_bind()).items():
+        print(f"Converted {rows} row(s) of {table} to the compact encoding.")
+
+
+def downgrade(op: Operations):
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    if compact_storage.COMPACT_TASK_STORAGE:
+        raise RuntimeError("Unset COMPACT_TASK_STORAGE to convert the task tables back to the text encoding.")
+    for table, rows in compact_storage.convert_task_tables(op.get_bind()).items():
+        print(f"Converted {rows} row(s) of {table} back to the text encoding.")
@@ -0,0 +1,68 @@
+"""Add unique indexes on users.username and users.email
+
+create_user and update_user rely on these indexes to reject duplicates, so databases
+whose email column was added by migration 2 (without an index) need them created.
+Such databases may already hold duplicates (the form checks were racy); the migration
+then stops before changing anything and lists them, since only a person can decide
+which account keeps the name.
+"""
+from alembic.operations import Operations
+from sqlalchemy import inspect, text
+
+# revision identifiers, used by this migration.
+revision = '4'
+down_revision = '3'
+branch_labels = None
+depends_on = None
+
+
+def _unique_columns(inspector):
+    """Returns the single columns of 'users' already covered by a unique index or constraint."""
+    covered = set()
+    for index in inspector.get_indexes('users'):
+        if index.get('unique') and len(index['column_names']) == 1:
+            covered.add(index['column_names'][0])
+    for constraint in inspector.get_unique_constraints('users'):
+        if len(constraint['column_names']) == 1:
+            covered.add(constraint['column_names'][0])
+    return covered
+
+
+def _duplicates(connection, column):
+    """Returns [(value, [user ids])] for every non-NULL value of `column` held by more than one user."""
+    rows = connection.execute(text(
+        f"SELECT {column}, id FROM users WHERE {column} IN ("
+        f"SELECT {column} FROM users WHERE {column} IS NOT NULL GROUP BY {column} HAVING count(*) > 1"
+        f") ORDER BY {column}, id"
+    )).fetchall()
+    duplicates = {}
+    for value, user_id in rows:
+        duplicates.setdefault(value, []).append(user_id)
+    return list(duplicates.items())
+
+
+def upgrade(op: Operations):
+    inspector = inspect(op.get_bind())
+    covered = _unique_columns(inspector)
+    index_names = {index['name'] for index in inspector.get_indexes('users')}
+    columns = [column for column in ('username', 'email') if column not in covered]
+    conflicts = [(column, value, ids) for column in columns for value, ids in _duplicates(op.get_bind(), column)]
+    if conflicts:
+        listing = "\n".join(f"  {column} {value!r}: user ids {', '.join(map(str, ids))}" for column, value, ids in conflicts)
+        raise RuntimeError(
+            f"Cannot add the unique indexes on users: {len(conflicts)} value(s) are shared by several users.\n"
+            f"{listing}\n"
+            "Rename or merge these accounts so each username and email belongs to one user "
+            "(e.g. UPDATE users SET email = ... WHERE id = ...), then run the migrations again."
+        )
+    for column in columns:
+        name = f'ix_users_{column}'
+        if name in index_names:
+            # A non-unique index with the conventional name exists; replace it.
+            op.drop_index(name, table_name='users')
+        op.create_index(name, 'users', [column], unique=True)
+
+
+def downgrade(op: Operations):
+    # The indexes match what Base.metadata.create_all() builds, so they are kept.
+    pass
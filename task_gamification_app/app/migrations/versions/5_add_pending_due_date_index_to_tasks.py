@@ -0,0 +1,41 @@
+"""Add a partial index on pending tasks' due dates, and reminded_for_due_date to tasks
+
+Both back the due-date reminder scanner (app/reminders.py): the index serves
+get_tasks_due_between, and reminded_for_due_date records the due date a task was
+last reminded about, so a task created or re-dated after a scan is still reminded.
+"""
+from alembic.operations import Operations
+from sqlalchemy import Column, inspect
+
+from task_gamification_app.app.compact_storage import timestamp_type
+from task_gamification_app.app.models import Task
+
+# revision identifiers, used by this migration.
+revision = '5'
+down_revision = '4'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_tasks_pending_due_date'
+COLUMN_NAME = 'reminded_for_due_date'
+
+
+def _index(name):
+    return next(index for index in Task.__table__.indexes if index.name == name)
+
+
+def upgrade(op: Operations):
+    inspector = inspect(op.get_bind())
+    if COLUMN_NAME not in [col['name'] for col in inspector.get_columns('tasks')]:
+        op.add_column('tasks', Column(COLUMN_NAME, timestamp_type(), nullable=True))
+    if INDEX_NAME not in [index['name'] for index in inspector.get_indexes('tasks')]:
+        # Build it from the model so the WHERE clause matches how the status is stored.
+        _index(INDEX_NAME).create(op.get_bind())
+
+
+def downgrade(op: Operations):
+    inspector = inspect(op.get_bind())
+    if INDEX_NAME in [index['name'] for index in inspector.get_indexes('tasks')]:
+        op.drop_index(INDEX_NAME, table_name='tasks')
+    if COLUMN_NAME in [col['name'] for col in inspector.get_columns('tasks')]:
+        op.drop_column('tasks', COLUMN_NAME)
@@ -0,0 +1,28 @@
+"""Add a (user_id, status, due_date) index on tasks
+
+Serves the per-user task queries and the overdue count in get_user_stats.
+The user_stats table itself is created by init_db() and filled lazily per user
+(or at once with `manage.py rebuild-stats`).
+"""
+from alembic.operations import Operations
+from sqlalchemy import inspect
+
+# revision identifiers, used by this migration.
+revision = '6'
+down_revision = '5'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_tasks_user_status_due'
+
+
+def upgrade(op: Operations):
+    inspector = inspect(op.get_bind())
+    if INDEX_NAME not in [index['name'] for index in inspector.get_indexes('tasks')]:
+        op.create_index(INDEX_NAME, 'tasks', ['user_id', 'status', 'due_date'])
+
+
+def downgrade(op: Operations):
+    inspector = inspect(op.get_bind())
+    if INDEX_NAME in [index['name'] for index in inspector.get_indexes('tasks')]:
+        op.drop_index(INDEX_NAME, table_name='tasks')
@@ -0,0 +1,33 @@
+"""Switch the SQLite database to auto_vacuum=INCREMENTAL
+
+With incremental auto-vacuum, `manage.py maintenance` can hand free pages back to the
+file system a few at a time instead of the file only ever growing. Changing the mode
+of an existing database needs one full VACUUM, which this migration runs once.
+"""
+from alembic.operations import Operations
+
+# revision identifiers, used by this migration.
+revision = '7'
+down_revision = '6'
+branch_labels = None
+depends_on = None
+
+INCREMENTAL = 2
+
+
+def upgrade(op: Operations):
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    if bind.exec_driver_sql("PRAGMA auto_vacuum").scalar() == INCREMENTAL:
+        return
+    bind.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+    bind.exec_driver_sql("VACUUM") # Rewrites the file once so the new mode takes effect
+
+
+def downgrade(op: Operations):
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    bind.exec_driver_sql("PRAGMA auto_vacuum = NONE")
+    bind.exec_driver_sql("VACUUM")
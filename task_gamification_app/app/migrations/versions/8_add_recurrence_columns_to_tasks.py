@@ -0,0 +1,40 @@
+"""Add recurring_task_id and occurrence_date to tasks
+
+Links tasks materialised from a recurring_tasks template to their template and
+occurrence date, with a unique index that makes materialisation idempotent.
+The recurring_tasks table itself is created by init_db(). SQLite cannot add a
+foreign key constraint to an existing table, so the column is added without one
+on upgraded databases.
+"""
+from alembic.operations import Operations
+from sqlalchemy import Column, Date, Integer, inspect
+
+# revision identifiers, used by this migration.
+revision = '8'
+down_revision = '7'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ux_tasks_recurrence_occurrence'
+
+
+def upgrade(op: Operations):
+    inspector = inspect(op.get_bind())
+    columns = [col['name'] for col in inspector.get_columns('tasks')]
+    if 'recurring_task_id' not in columns:
+        op.add_column('tasks', Column('recurring_task_id', Integer, nullable=True))
+    if 'occurrence_date' not in columns:
+        op.add_column('tasks', Column('occurrence_date', Date, nullable=True))
+    if INDEX_NAME not in [index['name'] for index in inspector.get_indexes('tasks')]:
+        op.create_index(INDEX_NAME, 'tasks', ['recurring_task_id', 'occurrence_date'], unique=True)
+
+
+def downgrade(op: Operations):
+    inspector = inspect(op.get_bind())
+    if INDEX_NAME in [index['name'] for index in inspector.get_indexes('tasks')]:
+        op.drop_index(INDEX_NAME, table_name='tasks')
+    columns = [col['name'] for col in inspector.get_columns('tasks')]
+    if 'occurrence_date' in columns:
+        op.drop_column('tasks', 'occurrence_date')
+    if 'recurring_task_id' in columns:
+        op.drop_column('tasks', 'recurring_task_id')
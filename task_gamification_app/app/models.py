@@ -1,7 +1,8 @@
 import datetime
 import enum # Import the standard enum module
-import bcrypt # Import bcrypt for password hashing
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Enum as SAEnum
+from . import hashing # Password hashing with configurable cost profiles
+from .compact_storage import status_type, timestamp_type # Opt-in integer encoding of the task tables
+from sqlalchemy import create_engine, Column, Integer, Float, String, Date, DateTime, ForeignKey, Index, Enum as SAEnum
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -21,13 +22,16 @@ class User(Base):
     tasks = relationship("Task", back_populates="owner")
 
     def set_password(self, password: str):
-        """Hashes the password and stores it."""
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        """Hashes the password with the active hash profile and stores it."""
+        self.password_hash = hashing.hash_password(password)
 
     def check_password(self, password: str) -> bool:
         """Verifies the given password against the stored hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return hashing.verify_password(password, self.password_hash)
+
+    def password_needs_rehash(self) -> bool:
+        """True if the stored hash was made with other parameters than the active hash profile's."""
+        return hashing.needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}', points={self.points})>"
@@ -36,22 +40,157 @@ class TaskStatus(enum.Enum):
     PENDING = "pending"
     COMPLETED = "completed"
 
+# Stored codes under COMPACT_TASK_STORAGE (see compact_storage.py). Never renumber a status.
+TASK_STATUS_CODES = {TaskStatus.PENDING: 0, TaskStatus.COMPLETED: 1}
+
 class Task(Base):
     __tablename__ = "tasks"
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String, nullable=False)
-    status = Column(SAEnum(TaskStatus, name="task_status_enum"), default=TaskStatus.PENDING, nullable=False)
-    creation_date = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
-    due_date = Column(DateTime, nullable=True)  # Added due_date
-    completion_date = Column(DateTime, nullable=True)
+    status = Column(status_type(TaskStatus, TASK_STATUS_CODES, name="task_status_enum"), default=TaskStatus.PENDING, nullable=False)
+    creation_date = Column(timestamp_type(), default=datetime.datetime.utcnow, nullable=False)
+    due_date = Column(timestamp_type(), nullable=True)  # Added due_date
+    completion_date = Column(timestamp_type(), nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Set on instances materialised from a RecurringTask (see app/recurrence.py).
+    recurring_task_id = Column(Integer, ForeignKey("recurring_tasks.id"), nullable=True)
+    occurrence_date = Column(Date, nullable=True)
+    # The due date the reminder scanner last sent a reminder for (see app/reminders.py); a task
+    # created or re-dated later is reminded about its new due date.
+    reminded_for_due_date = Column(timestamp_type(), nullable=True)
 
     owner = relationship("User", back_populates="tasks")
 
+    is_archived = False
+
+    __table_args__ = (
+        # Partial index for the due-date reminder scan: only pending tasks with a due date matter.
+        Index(
+            "ix_tasks_pending_due_date",
+            "due_date",
+            sqlite_where=(status == TaskStatus.PENDING) & due_date.isnot(None),
+            postgresql_where=(status == TaskStatus.PENDING) & due_date.isnot(None),
+        ),
+        # The global activity feed (get_recent_activity): newest completions first, keyset-paginated.
+        Index(
+            "ix_tasks_completed_recent",
+            completion_date.desc(),
+            id.desc(),
+            sqlite_where=status == TaskStatus.COMPLETED,
+            postgresql_where=status == TaskStatus.COMPLETED,
+        ),
+        # Per-user lookups: get_tasks_for_user, per-status counts and the overdue count in get_user_stats.
+        Index("ix_tasks_user_status_due", "user_id", "status", "due_date"),
+        # One instance per occurrence: materialisation inserts with OR IGNORE, so it is idempotent.
+        # Tasks that are not recurring have NULLs here, which never collide.
+        Index("ux_tasks_recurrence_occurrence", "recurring_task_id", "occurrence_date", unique=True),
+        # Archived rows keep their id (see TaskArchive), so ids must never be reused once the
+        # newest task is archived: AUTOINCREMENT makes SQLite continue after the highest id ever used.
+        {"sqlite_autoincrement": True},
+    )
+
     def __repr__(self):
         return f"<Task(id={self.id}, description='{self.description}', status='{self.status}', due_date='{self.due_date}', user_id={self.user_id})>"
 
+class TaskArchive(Base):
+    """
+    Cold storage for completed tasks, moved out of `tasks` by app/archive.py once they are old.
+    Rows keep their original task id. Read-only from the application's point of view.
+    """
+    __tablename__ = "tasks_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String, nullable=False)
+    status = Column(status_type(TaskStatus, TASK_STATUS_CODES, name="task_status_enum"), default=TaskStatus.COMPLETED, nullable=False)
+    creation_date = Column(timestamp_type(), nullable=False)
+    due_date = Column(timestamp_type(), nullable=True)
+    completion_date = Column(timestamp_type(), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    archived_at = Column(timestamp_type(), default=datetime.datetime.utcnow, nullable=False)
+
+    is_archived = True
+
+    __table_args__ = (
+        Index("ix_tasks_archive_user_completion", "user_id", "completion_date"),
+    )
+
+    def __repr__(self):
+        return f"<TaskArchive(id={self.id}, description='{self.description}', user_id={self.user_id})>"
+
+class RecurrenceFrequency(enum.Enum):
+    DAILY = "daily"
+    WEEKLY = "weekly"
+
+class RecurringTask(Base):
+    """
+    A task that repeats every `interval` days or weeks from `start_date`, until `end_date` if set.
+    Concrete Task rows are created lazily by app/recurrence.py, only up to the dates someone
+    looks at; `materialized_until` is the last date that has been expanded.
+    """
+    __tablename__ = "recurring_tasks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    description = Column(String, nullable=False)
+    frequency = Column(SAEnum(RecurrenceFrequency, name="recurrence_frequency_enum"), nullable=False)
+    interval = Column(Integer, default=1, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=True)
+    materialized_until = Column(Date, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # materialize_recurring_tasks looks up a user's templates that are behind the requested date.
+        Index("ix_recurring_tasks_user_materialized", "user_id", "materialized_until"),
+    )
+
+    def __repr__(self):
+        return f"<RecurringTask(id={self.id}, description='{self.description}', frequency='{self.frequency}', interval={self.interval}, user_id={self.user_id})>"
+
+class UserStats(Base):
+    """
+    Per-user task statistics, maintained incrementally by the task services (see app/stats.py).
+    The overdue count is not stored because it changes with the clock; it is counted on read.
+    """
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    pending_count = Column(Integer, default=0, nullable=False)
+    completed_count = Column(Integer, default=0, nullable=False)
+    total_completion_seconds = Column(Float, default=0.0, nullable=False) # Sum of (completion - creation) times
+    current_streak = Column(Integer, default=0, nullable=False) # Consecutive days with a completion, up to last_completion_day
+    last_completion_day = Column(Date, nullable=True)
+
+    def __repr__(self):
+        return f"<UserStats(user_id={self.user_id}, pending={self.pending_count}, completed={self.completed_count}, streak={self.current_streak})>"
+
+class JobWatermark(Base):
+    """Remembers how far a periodic background job (e.g. the reminder scanner) has progressed."""
+    __tablename__ = "job_watermarks"
+
+    name = Column(String, primary_key=True)
+    value = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<JobWatermark(name='{self.name}', value='{self.value}')>"
+
+class DataMigrationCheckpoint(Base):
+    """How far a chunked data migration (see app/data_migrations.py) has got, committed with each chunk."""
+    __tablename__ = "data_migration_checkpoints"
+
+    name = Column(String, primary_key=True)
+    last_key = Column(Integer, nullable=True) # Highest key processed; NULL before the first chunk
+    rows_done = Column(Integer, default=0, nullable=False)
+    rows_total = Column(Integer, nullable=False) # Matching rows counted when the migration started
+    started_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<DataMigrationCheckpoint(name='{self.name}', last_key={self.last_key}, rows_done={self.rows_done}/{self.rows_total})>"
+
 # The engine creation and table creation logic is now primarily in app/db.py.
 # The __main__ block here can be used for direct model testing if needed,
 # but ensure it doesn't conflict with db.py's initialization.
@@ -0,0 +1,248 @@
+"""
+Token-bucket rate limiting for the expensive authentication paths.
+
+`verify_user_login` runs a bcrypt check and `send_password_reset_email` signs a
+token, so an unthrottled burst of POSTs to /login or /forgot_password can pin
+every worker's CPU. A `RateLimiter` is checked *before* that work happens and
+raises `RateLimitExceededError`, which the web layer turns into a 429.
+
+Two bucket stores are provided:
+- `InMemoryBucketStore`: per-process, bounded LRU of buckets (the default).
+- `SQLiteBucketStore`: a small SQLite file shared by several worker processes.
+"""
+import itertools
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from .services import ServiceError
+
+
+class RateLimitExceededError(ServiceError):
+    """Raised when a caller has used up its request budget."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _refill(tokens: float, updated_at: float, now: float, capacity: float, refill_rate: float) -> float:
+    """Returns the bucket level after refilling it for the time elapsed since `updated_at`."""
+    elapsed = max(0.0, now - updated_at)
+    return min(capacity, tokens + elapsed * refill_rate)
+
+
+class InMemoryBucketStore:
+    """
+    Keeps token buckets in a process-local dict.
+    The number of tracked keys is capped (least recently used keys are evicted first),
+    so a flood of random usernames cannot grow memory without bound.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, capacity: float, refill_rate: float, now: float, cost: float = 1.0) -> float:
+        """
+        Tries to take `cost` tokens from the bucket for `key`.
+        Returns 0 if the tokens were taken, otherwise the seconds until enough tokens are available.
+        """
+        return self.consume_all([key], capacity, refill_rate, now, cost)[0]
+
+    def consume_all(self, keys: Sequence[str], capacity: float, refill_rate: float, now: float,
+                    cost: float = 1.0) -> List[float]:
+        """
+        Takes `cost` tokens from the bucket of every key, or from none of them if any bucket is short.
+        Returns the seconds each key has to wait (all 0 if the tokens were taken).
+        """
+        with self._lock:
+            levels = [_refill(*self._buckets.get(key, (capacity, now)), now, capacity, refill_rate) for key in keys]
+            waits = [0.0 if tokens >= cost else (cost - tokens) / refill_rate for tokens in levels]
+            if not any(waits):
+                for key, tokens in zip(keys, levels):
+                    self._buckets.pop(key, None)
+                    self._buckets[key] = (tokens - cost, now)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            return waits
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore:
+    """
+    Keeps token buckets in a SQLite file so that all workers on a host share one budget.
+    Each check is a single `BEGIN IMMEDIATE` transaction, which serialises concurrent
+    updates of the same bucket across processes. Every `purge_every`-th check also deletes
+    the buckets idle for `idle_after` seconds (or the caller's full refill time, if longer).
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0, idle_after: float = 3600, purge_every: int = 1000):
+        self.path = path
+        self.timeout = timeout
+        self.idle_after = idle_after
+        self.purge_every = purge_every
+        self._checks = itertools.count(1)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                " key TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None lets us issue BEGIN IMMEDIATE ourselves.
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key: str, capacity: float, refill_rate: float, now: float, cost: float = 1.0) -> float:
+        return self.consume_all([key], capacity, refill_rate, now, cost)[0]
+
+    def consume_all(self, keys: Sequence[str], capacity: float, refill_rate: float, now: float,
+                    cost: float = 1.0) -> List[float]:
+        """Like InMemoryBucketStore.consume_all(), in one transaction."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for key in keys:
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated_at = row if row else (capacity, now)
+                levels.append(_refill(tokens, updated_at, now, capacity, refill_rate))
+            waits = [0.0 if tokens >= cost else (cost - tokens) / refill_rate for tokens in levels]
+            if not any(waits):
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(key, tokens - cost, now) for key, tokens in zip(keys, levels)],
+                )
+            if next(self._checks) % self.purge_every == 0:
+                idle_after = max(self.idle_after, capacity / refill_rate) # Only buckets that are full again
+                conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (now - idle_after,))
+            conn.execute("COMMIT")
+            return waits
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def purge(self, older_than: float):
+        """Deletes buckets that have not been touched since `older_than` (they would be full anyway)."""
+        conn = self._connect()
+        conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (older_than,))
+
+    def reset(self):
+        self._connect().execute("DELETE FROM rate_limit_buckets")
+
+
+class RateLimiter:
+    """
+    A named token-bucket limiter.
+    `capacity` is the burst size, `refill_rate` the sustained number of requests per second.
+    Keys are free-form strings such as "ip:10.0.0.1" or "user:alice"; each key has its own bucket.
+    """
+
+    def __init__(self, name: str, capacity: float, refill_rate: float, store=None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.store = store if store is not None else InMemoryBucketStore()
+        # A shared store needs a clock that means the same thing in every process.
+        self.clock = time.time if isinstance(self.store, SQLiteBucketStore) and clock is time.monotonic else clock
+        self._counter_lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.rejected_by_scope: Dict[str, int] = {}
+        _LIMITERS[name] = self
+
+    def check(self, *keys: str) -> None:
+        """
+        Takes one token from the bucket of every key.
+        Raises RateLimitExceededError if any of the buckets is empty, without taking a token
+        from any of them: a locked-out IP must not drain the buckets of the accounts it targets.
+        The store checks and charges all keys at once, so concurrent checks cannot take a
+        token from one bucket and then be refused by another.
+        """
+        waits = self.store.consume_all(keys, self.capacity, self.refill_rate, self.clock())
+        retry_after = 0.0
+        exhausted_scope = None
+        for key, wait in zip(keys, waits):
+            if wait > retry_after:
+                retry_after = wait
+                exhausted_scope = key.split(":", 1)[0]
+        with self._counter_lock:
+            if exhausted_scope is None:
+                self.allowed += 1
+                return
+            self.rejected += 1
+            self.rejected_by_scope[exhausted_scope] = self.rejected_by_scope.get(exhausted_scope, 0) + 1
+        raise RateLimitExceededError(
+            f"Too many requests. Please try again in {int(retry_after) + 1} seconds.",
+            retry_after=retry_after,
+        )
+
+    def counters(self) -> dict:
+        """Returns a snapshot of this limiter's counters."""
+        with self._counter_lock:
+            return {
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "rejected_by_scope": dict(self.rejected_by_scope),
+            }
+
+    def reset(self):
+        """Clears all buckets and counters (mainly for tests)."""
+        self.store.reset()
+        with self._counter_lock:
+            self.allowed = 0
+            self.rejected = 0
+            self.rejected_by_scope = {}
+
+
+# All limiters created in this process, by name, so their counters can be exported together.
+_LIMITERS: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limit_counters() -> Dict[str, dict]:
+    """Returns the counters of every registered limiter, keyed by limiter name."""
+    return {name: limiter.counters() for name, limiter in _LIMITERS.items()}
+
+
+def normalize_identity(value: Optional[str]) -> str:
+    """Normalises a username/email so "Alice" and " alice " share a bucket."""
+    return (value or "").strip().lower()
+
+
+def rate_limited(limiter: RateLimiter, key_func: Callable[..., Iterable[str]]):
+    """
+    Decorator that checks `limiter` before calling the wrapped service function.
+
+    `key_func` receives the same arguments as the wrapped function and returns the
+    keys to charge. The wrapper additionally accepts a `client_ip` keyword argument,
+    which is charged as an "ip:<address>" key and is not passed on.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, client_ip: Optional[str] = None, **kwargs):
+            keys: List[str] = []
+            if client_ip:
+                keys.append(f"ip:{client_ip}")
+            keys.extend(key_func(*args, **kwargs))
+            limiter.check(*keys)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,125 @@
+"""
+Lazy materialisation of recurring tasks.
+
+A RecurringTask only describes a schedule. Concrete Task rows are created on demand,
+up to the last date a reader needs: the task listings expand a user's templates up
+to `DEFAULT_WINDOW` ahead (or up to a later due-date filter), and the reminder
+scanner expands everybody's up to the end of its scan window. Years of occurrences
+are never generated in advance, and at most `MAX_BACKFILL` of them in the past.
+
+Expansion is set-based: one SELECT finds the templates that are behind the requested
+date (via `materialized_until`), the occurrence dates are computed arithmetically,
+and the new rows go in with one INSERT OR IGNORE executemany per user. The unique
+index on (recurring_task_id, occurrence_date) makes concurrent or repeated expansion
+harmless, and the watermark keeps occurrences the user deleted from coming back.
+"""
+import datetime
+from collections import defaultdict
+from typing import List, Optional
+
+from sqlalchemy import bindparam, insert, or_, select
+from sqlalchemy.orm import Session
+
+from . import stats
+from .models import RecurrenceFrequency, RecurringTask, Task, TaskStatus
+from .statement_cache import cached_statement
+
+# How far ahead the task listings materialise occurrences.
+DEFAULT_WINDOW = datetime.timedelta(days=7)
+# Upper bound on a single expansion (e.g. for a due-date filter far in the future).
+MAX_WINDOW = datetime.timedelta(days=366)
+# How far into the past occurrences are created, for a template that starts (or was last
+# expanded) long ago: a daily template started years back must not insert thousands of tasks.
+MAX_BACKFILL = datetime.timedelta(days=7)
+
+_STEP_DAYS = {RecurrenceFrequency.DAILY: 1, RecurrenceFrequency.WEEKLY: 7}
+
+
+def occurrence_dates(template: RecurringTask, start: datetime.date, end: datetime.date) -> List[datetime.date]:
+    """The template's occurrence dates within [start, end]."""
+    step = _STEP_DAYS[template.frequency] * max(template.interval or 1, 1)
+    first = max(start, template.start_date)
+    last = min(end, template.end_date) if template.end_date else end
+    if first > last:
+        return []
+    steps_to_first = -(-(first - template.start_date).days // step) # Ceiling division
+    day = template.start_date + datetime.timedelta(days=steps_to_first * step)
+    dates = []
+    while day <= last:
+        dates.append(day)
+        day += datetime.timedelta(days=step)
+    return dates
+
+
+def _behind_statement(for_one_user: bool):
+    def build():
+        statement = select(RecurringTask).where(
+            or_(RecurringTask.materialized_until.is_(None), RecurringTask.materialized_until < bindparam("until")),
+            RecurringTask.start_date <= bindparam("until"),
+            or_(
+                RecurringTask.end_date.is_(None),
+                RecurringTask.materialized_until.is_(None),
+                RecurringTask.end_date > RecurringTask.materialized_until,
+            ),
+        )
+        if for_one_user:
+            statement = statement.where(RecurringTask.user_id == bindparam("user_id"))
+        return statement
+    return cached_statement(("recurrence.behind", for_one_user), build)
+
+
+def materialize_recurring_tasks(
+    db_session: Session,
+    until: datetime.date,
+    user_id: Optional[int] = None,
+    today: Optional[datetime.date] = None,
+) -> int:
+    """
+    Creates the Task instances of all recurring tasks (of `user_id`, or of everybody) up to `until`,
+    and commits. Occurrences before `today - MAX_BACKFILL` are skipped.
+    Returns the number of tasks created (0 without touching anything if all are current).
+    """
+    today = today or datetime.datetime.utcnow().date()
+    until = min(until, today + MAX_WINDOW)
+    earliest = today - MAX_BACKFILL
+    params = {"until": until}
+    if user_id is not None:
+        params["user_id"] = user_id
+    templates = db_session.execute(_behind_statement(user_id is not None), params).scalars().all()
+    if not templates:
+        return 0
+
+    now = datetime.datetime.utcnow()
+    rows_by_user = defaultdict(list)
+    for template in templates:
+        start = template.materialized_until + datetime.timedelta(days=1) if template.materialized_until else template.start_date
+        start = max(start, earliest)
+        for day in occurrence_dates(template, start, until):
+            rows_by_user[template.user_id].append({
+                "description": template.description,
+                "status": TaskStatus.PENDING,
+                "creation_date": now,
+                "due_date": datetime.datetime.combine(day, datetime.time.min),
+                "user_id": template.user_id,
+                "recurring_task_id": template.id,
+                "occurrence_date": day,
+            })
+        template.materialized_until = until
+
+    created = 0
+    insert_ignore = insert(Task).prefix_with("OR IGNORE", dialect="sqlite")
+    for owner_id, rows in rows_by_user.items():
+        result = db_session.execute(insert_ignore, rows)
+        # Only rows that were really inserted count; duplicates from a concurrent expansion were ignored.
+        if result.rowcount > 0:
+            stats.record_task_created(db_session, owner_id, count=result.rowcount)
+            created += result.rowcount
+    db_session.commit()
+    return created
+
+
+def visible_until(due_date: Optional[datetime.date] = None, today: Optional[datetime.date] = None) -> datetime.date:
+    """The date up to which a task listing needs occurrences: the default window, or a later due-date filter."""
+    today = today or datetime.datetime.utcnow().date()
+    until = today + DEFAULT_WINDOW
+    return max(until, due_date) if due_date else until
@@ -0,0 +1,116 @@
+"""
+Periodic scanner that sends due-date reminders.
+
+Each run looks at pending tasks due before `now + lead_time`, using
+get_tasks_due_between (and therefore the partial index on pending due dates), and
+skips those already reminded about their current due date: each task records the
+due date it was reminded for, so a task created, re-dated or materialised inside an
+already scanned window is still picked up by the next run, and a re-dated task is
+reminded again. The window starts `initial_lookback` before now, so tasks already
+long overdue when they are created are not reminded about; after a longer outage it
+reaches back to the previous run instead (kept in the job_watermarks table, so a new
+process continues where the last one stopped). Reminders are batched so every user
+gets at most one message per run.
+Recurring tasks are materialised up to the end of the window before the scan.
+"""
+import datetime
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .identity_cache import UserSnapshot, get_user_snapshot
+from .models import JobWatermark, Task
+from .recurrence import materialize_recurring_tasks
+from .services import get_tasks_due_between
+
+REMINDER_JOB_NAME = "due_date_reminders"
+DEFAULT_LEAD_TIME = datetime.timedelta(hours=24)
+# Every run also reminds about tasks that became due up to this long ago and were not reminded yet.
+DEFAULT_INITIAL_LOOKBACK = datetime.timedelta(days=1)
+
+
+def print_reminder(user: UserSnapshot, due_soon: List[Task], overdue: List[Task]):
+    """Default notifier. In a real application this would send an email (see send_password_reset_email)."""
+    recipient = user.email or user.username
+    print(f"Reminder for {recipient}: {len(due_soon)} task(s) due soon, {len(overdue)} overdue.")
+    for task in overdue + due_soon:
+        print(f"  - {task.description} (due {task.due_date.strftime('%Y-%m-%d %H:%M')})")
+
+
+class ReminderScanner:
+    """
+    Scans for newly due tasks and notifies their owners, one batch per user.
+
+    `notifier(user_snapshot, due_soon_tasks, overdue_tasks)` is called once per user per run.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        notifier: Callable[[UserSnapshot, List[Task], List[Task]], None] = print_reminder,
+        lead_time: datetime.timedelta = DEFAULT_LEAD_TIME,
+        initial_lookback: datetime.timedelta = DEFAULT_INITIAL_LOOKBACK,
+        job_name: str = REMINDER_JOB_NAME,
+    ):
+        self.session_factory = session_factory
+        self.notifier = notifier
+        self.lead_time = lead_time
+        self.initial_lookback = initial_lookback
+        self.job_name = job_name
+
+    def run_once(self, now: Optional[datetime.datetime] = None) -> dict:
+        """
+        Sends reminders for tasks that became due since the last run and advances the watermark.
+        Returns a summary dict with the scanned window and counts.
+        """
+        now = now or datetime.datetime.utcnow()
+        window_end = now + self.lead_time
+        db_session = self.session_factory()
+        try:
+            watermark = db_session.query(JobWatermark).filter(JobWatermark.name == self.job_name).first()
+            # Covers tasks that became due during an outage, and those created shortly after their due date.
+            window_start = now - self.initial_lookback
+            if watermark is not None:
+                window_start = min(watermark.value, window_start)
+
+            # Recurring tasks only exist as rows once materialised; expand everybody's up to the window end.
+            materialize_recurring_tasks(db_session, window_end.date(), today=now.date())
+
+            tasks_by_user: Dict[int, List[Task]] = defaultdict(list)
+            tasks = [
+                task for task in get_tasks_due_between(db_session, window_start, window_end)
+                if task.reminded_for_due_date != task.due_date
+            ]
+            for task in tasks:
+                tasks_by_user[task.user_id].append(task)
+
+            for user_id, user_tasks in tasks_by_user.items():
+                user = get_user_snapshot(db_session, user_id)
+                if user is None:
+                    continue
+                overdue = [task for task in user_tasks if task.due_date < now]
+                due_soon = [task for task in user_tasks if task.due_date >= now]
+                self.notifier(user, due_soon, overdue)
+
+            # Only mark tasks and advance the watermark once every batch was handed to the notifier
+            # (at-least-once delivery). Only this column is written, so a concurrent re-dating wins.
+            for task in tasks:
+                task.reminded_for_due_date = task.due_date
+            if watermark is None:
+                db_session.add(JobWatermark(name=self.job_name, value=now))
+            else:
+                watermark.value = now
+            db_session.commit()
+            return {"start": window_start, "end": window_end, "tasks": len(tasks), "users": len(tasks_by_user)}
+        finally:
+            db_session.close()
+
+    def run_forever(self, interval_seconds: float = 300):
+        """Runs the scanner every `interval_seconds` until interrupted."""
+        while True:
+            summary = self.run_once()
+            print(f"Reminder scan {summary['start']:%Y-%m-%d %H:%M} -> {summary['end']:%Y-%m-%d %H:%M}: "
+                  f"{summary['tasks']} task(s) for {summary['users']} user(s).")
+            time.sleep(interval_seconds)
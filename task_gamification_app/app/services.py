@@ -1,8 +1,20 @@
+from sqlalchemy import and_, bindparam, func, inspect, or_, select, union_all
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from typing import Union, List, Optional
+import base64
 import datetime
-from .models import User, Task, TaskStatus
+import json
+from .models import User, Task, TaskArchive, TaskStatus, RecurringTask, RecurrenceFrequency
+from .identity_cache import invalidate_user_snapshot_on_commit
+from . import stats
+from . import recurrence
+from .events import TaskCompleted, TaskCreated, TaskDeleted, UserUpdated, publish, subscribe
+from .archive import archive_horizon
+from .statement_cache import cached_statement
+from .cache import LRUCache
+from .singleflight import SingleFlight, StaleWhileRevalidateCache
+from .sharding import execute_ordered, is_sharded, sum_over_shards
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
 
@@ -29,34 +41,62 @@ class TaskCompletionError(ServiceError):
     """Raised for errors during task completion."""
     pass
 
+def _raise_for_unique_violation(error: IntegrityError, username: Optional[str], email: Optional[str], reason: str = "already exists"):
+    """
+    Maps an IntegrityError raised by the unique indexes on users.username / users.email
+    to the matching service exception. Does nothing for other integrity errors.
+    """
+    message = str(error.orig).lower()
+    # SQLite reports "UNIQUE constraint failed: users.username"; other backends name the index (ix_users_username).
+    # On a sharded database the directory's user_directory.username/email are the unique ones.
+    if "users.username" in message or "ix_users_username" in message or "user_directory.username" in message:
+        raise UsernameExistsError(f"Username '{username}' {reason}.")
+    if "users.email" in message or "ix_users_email" in message or "user_directory.email" in message:
+        raise UserCreationError(f"Email '{email}' {reason}.")
+
 def create_user(db_session: Session, first_name: str, last_name: str, username: str, email: str, password: str) -> User:
     """
     Creates a new user, hashes their password, and saves them to the database.
     Returns the User object if successful.
     Raises UsernameExistsError if username is taken.
-    Raises UserCreationError for other database issues.
-    """
-    existing_user = db_session.query(User).filter(User.username == username).first()
-    if existing_user:
-        raise UsernameExistsError(f"Username '{username}' already exists.")
-
-    existing_email = db_session.query(User).filter(User.email == email).first()
-    if existing_email:
-        raise UserCreationError(f"Email '{email}' already exists.")
+    Raises UserCreationError if the email is taken or for other database issues.
 
+    Uniqueness is enforced by the unique indexes on users.username and users.email:
+    the INSERT is attempted directly and a violation is mapped to the service exception,
+    which takes a single round-trip and is free of check-then-insert races.
+    On a sharded database (app/sharding.py) the directory plays that part and assigns the id.
+    """
     new_user = User(first_name=first_name, last_name=last_name, username=username, email=email)
     new_user.set_password(password)
+    shard_set = db_session.shard_set if is_sharded(db_session) else None
+    if shard_set is not None:
+        try:
+            new_user.id = shard_set.reserve_user(username, email)
+        except IntegrityError as e:
+            _raise_for_unique_violation(e, username, email)
+            raise UserCreationError(f"Database error occurred during user creation: {e}")
+
+    def undo():
+        db_session.rollback()
+        if shard_set is not None:
+            shard_set.release_user(new_user.id)
+
     db_session.add(new_user)
     try:
         db_session.commit()
-        db_session.refresh(new_user)
+        _leaderboard_pages.mark_stale() # A new user changes the page they land on and the total
+        # No refresh(): the session reloads the row lazily if the caller reads an attribute.
         return new_user
+    except IntegrityError as e:
+        undo()
+        _raise_for_unique_violation(e, username, email)
+        raise UserCreationError(f"Database error occurred during user creation: {e}")
     except SQLAlchemyError as e: # Catch specific SQLAlchemy errors
-        db_session.rollback()
+        undo()
         # Log error e here if logging is set up
         raise UserCreationError(f"Database error occurred during user creation: {e}")
     except Exception as e: # Catch any other unexpected errors
-        db_session.rollback()
+        undo()
         # Log error e here
         raise UserCreationError(f"An unexpected error occurred during user creation: {e}")
 
@@ -65,9 +105,17 @@ def verify_user_login(db_session: Session, username_or_email: str, password: str
     """
     Verifies user credentials.
     Returns the User object if login is successful, None otherwise.
+    On success, a hash made with a stale profile is replaced by one made with the active profile.
     """
     user = db_session.query(User).filter((User.username == username_or_email) | (User.email == username_or_email)).first()
     if user and user.check_password(password):
+        if user.password_needs_rehash():
+            # The plain password is only available here, so this is where hashes move to the active profile.
+            user.set_password(password)
+            try:
+                db_session.commit()
+            except SQLAlchemyError:
+                db_session.rollback() # Keep the old hash; the login itself still succeeds
         return user
     return None
 
@@ -78,6 +126,9 @@ def get_user_by_id(db_session: Session, user_id: int) -> Optional[User]:
     """
     return db_session.query(User).filter(User.id == user_id).first()
 
+# Read-only identity lookups (username, names, email, points) should prefer the cached
+# get_user_snapshot(db_session, user_id) from identity_cache over get_user_by_id.
+
 def update_user(db_session: Session, user_id: int, first_name: Optional[str] = None, last_name: Optional[str] = None, username: Optional[str] = None, email: Optional[str] = None) -> User:
     """
     Updates a user's details, such as username and email.
@@ -96,24 +147,47 @@ def update_user(db_session: Session, user_id: int, first_name: Optional[str] = N
     if last_name is not None:
         user.last_name = last_name
 
+    old_identity = (user.username, user.email)
+
+    # Username/email uniqueness is left to the unique indexes (see create_user).
     if username is not None and username != user.username:
-        existing_user = db_session.query(User).filter(User.username == username).first()
-        if existing_user:
-            raise UsernameExistsError(f"Username '{username}' is already taken.")
         user.username = username
 
     if email is not None and email != user.email:
-        existing_email = db_session.query(User).filter(User.email == email).first()
-        if existing_email:
-            raise UserCreationError(f"Email '{email}' is already taken.")
         user.email = email
 
+    user_state = inspect(user)
+    changed_fields = tuple(name for name in ("first_name", "last_name", "username", "email")
+                           if user_state.attrs[name].history.has_changes())
+    shard_set = db_session.shard_set if is_sharded(db_session) else None
+    renamed = shard_set is not None and (user.username, user.email) != old_identity
+    if renamed:
+        # The directory checks uniqueness across shards; it is put back if the shard's commit fails.
+        try:
+            shard_set.rename_user(user_id, user.username, user.email)
+        except IntegrityError as e:
+            db_session.rollback()
+            _raise_for_unique_violation(e, username, email, reason="is already taken")
+            raise ServiceError(f"Database error occurred while updating user: {e}")
+    invalidate_user_snapshot_on_commit(db_session, user_id)
     try:
         db_session.commit()
         db_session.refresh(user)
+        if changed_fields:
+            released = tuple((field, old) for field, old in zip(("username", "email"), old_identity)
+                             if old and old != getattr(user, field))
+            publish(UserUpdated(user_id=user_id, changed_fields=changed_fields, released=released), db_session)
         return user
+    except IntegrityError as e:
+        db_session.rollback()
+        if renamed:
+            shard_set.rename_user(user_id, *old_identity)
+        _raise_for_unique_violation(e, username, email, reason="is already taken")
+        raise ServiceError(f"Database error occurred while updating user: {e}")
     except SQLAlchemyError as e:
         db_session.rollback()
+        if renamed:
+            shard_set.rename_user(user_id, *old_identity)
         raise ServiceError(f"Database error occurred while updating user: {e}")
 
 def create_task_for_user(db_session: Session, user_id: int, description: str, due_date: Optional[datetime.date] = None) -> Task:
@@ -121,8 +195,10 @@ def create_task_for_user(db_session: Session, user_id: int, description: str, du
     new_task = Task(description=description, user_id=user_id, due_date=due_date)
     db_session.add(new_task)
     try:
+        stats.record_task_created(db_session, user_id)
         db_session.commit()
         db_session.refresh(new_task)
+        publish(TaskCreated(task_id=new_task.id, user_id=user_id, due_date=new_task.due_date), db_session)
         return new_task
     except SQLAlchemyError as e:
         db_session.rollback()
@@ -148,6 +224,9 @@ def update_task_details(db_session: Session, task_id: int, user_id: int, descrip
     elif due_date is not None: # Only update if due_date is explicitly passed and not None
         task.due_date = due_date
 
+    # No user_stats change is needed here: the only stat a due date affects is the overdue
+    # count, which get_user_stats counts on read because it changes with the clock.
+
     try:
         db_session.commit()
         db_session.refresh(task)
@@ -162,14 +241,144 @@ def delete_task_for_user(db_session: Session, task_id: int, user_id: int) -> boo
     if not task:
         raise TaskNotFoundError(f"Task with ID {task_id} not found or does not belong to you.")
 
+    event = TaskDeleted(task_id=task_id, user_id=user_id, was_completed=task.status == TaskStatus.COMPLETED)
     db_session.delete(task)
     try:
+        stats.record_task_deleted(db_session, task)
         db_session.commit()
+        publish(event, db_session)
         return True
     except SQLAlchemyError as e:
         db_session.rollback()
         raise ServiceError(f"Database error occurred while deleting task: {e}")
 
+def create_recurring_task(
+    db_session: Session,
+    user_id: int,
+    description: str,
+    frequency: RecurrenceFrequency,
+    start_date: Optional[datetime.date] = None,
+    interval: int = 1,
+    end_date: Optional[datetime.date] = None
+) -> RecurringTask:
+    """
+    Creates a task that repeats every `interval` days or weeks from `start_date` (default today).
+    Instances are created lazily when the user's tasks are listed, starting with the current window.
+    """
+    if interval < 1:
+        raise ServiceError("The repeat interval must be at least 1.")
+    start_date = start_date or datetime.datetime.utcnow().date()
+    if end_date and end_date < start_date:
+        raise ServiceError("A recurring task cannot end before it starts.")
+    template = RecurringTask(user_id=user_id, description=description, frequency=frequency,
+                             interval=interval, start_date=start_date, end_date=end_date)
+    db_session.add(template)
+    try:
+        db_session.commit()
+        db_session.refresh(template)
+    except SQLAlchemyError as e:
+        db_session.rollback()
+        raise ServiceError(f"Database error occurred while creating recurring task: {e}")
+    db_session.info.get("recurrence_materialized_until", {}).pop(user_id, None)
+    return template
+
+def get_recurring_tasks_for_user(db_session: Session, user_id: int) -> List[RecurringTask]:
+    """Returns the user's recurring tasks that have not ended, oldest first."""
+    today = datetime.datetime.utcnow().date()
+    return (
+        db_session.query(RecurringTask)
+        .filter(RecurringTask.user_id == user_id)
+        .filter((RecurringTask.end_date.is_(None)) | (RecurringTask.end_date >= today))
+        .order_by(RecurringTask.id.asc())
+        .all()
+    )
+
+def stop_recurring_task(db_session: Session, recurring_task_id: int, user_id: int) -> RecurringTask:
+    """
+    Ends a recurring task as of yesterday, so no further occurrences are generated.
+    Instances that already exist are ordinary tasks and are left alone.
+    """
+    template = db_session.query(RecurringTask).filter(
+        RecurringTask.id == recurring_task_id, RecurringTask.user_id == user_id
+    ).first()
+    if not template:
+        raise TaskNotFoundError(f"Recurring task with ID {recurring_task_id} not found or does not belong to you.")
+    template.end_date = datetime.datetime.utcnow().date() - datetime.timedelta(days=1)
+    try:
+        db_session.commit()
+        return template
+    except SQLAlchemyError as e:
+        db_session.rollback()
+        raise ServiceError(f"Database error occurred while stopping recurring task: {e}")
+
+_TASK_FILTERS = ("description", "status", "creation_date", "due_date", "completion_date")
+
+class InvalidCursorError(ServiceError):
+    """Raised when a pagination cursor is malformed or belongs to another sort order."""
+    pass
+
+def _task_filter_criteria(model, shape: tuple) -> list:
+    """WHERE criteria for the filters named in `shape`, with every value left as a bound parameter."""
+    criteria = [model.user_id == bindparam("user_id")]
+    if "description" in shape:
+        criteria.append(model.description.ilike(bindparam("description_pattern")))
+    if "status" in shape:
+        criteria.append(model.status == bindparam("status"))
+    for name in ("creation_date", "due_date", "completion_date"):
+        if name in shape:
+            # A day is the range [start, end): unlike date(column) = :day this can use an index, and
+            # it works for either storage encoding of the column (see compact_storage.py).
+            column = getattr(model, name)
+            criteria.append(column >= bindparam(f"{name}_start", type_=column.type))
+            criteria.append(column < bindparam(f"{name}_end", type_=column.type))
+    return criteria
+
+def _task_filter_params(user_id: int, status, description, creation_date, due_date, completion_date) -> tuple:
+    """Returns the (shape, params) pair of a filter combination."""
+    values = dict(zip(_TASK_FILTERS, (description, status, creation_date, due_date, completion_date)))
+    shape = tuple(name for name in _TASK_FILTERS if values[name])
+    params = {"user_id": user_id}
+    if status:
+        params["status"] = status
+    for name in ("creation_date", "due_date", "completion_date"):
+        if name in shape:
+            params[f"{name}_start"] = datetime.datetime.combine(values[name], datetime.time.min)
+            params[f"{name}_end"] = params[f"{name}_start"] + datetime.timedelta(days=1)
+    if description:
+        params["description_pattern"] = f"%{description}%"
+    return shape, params
+
+def _task_filter_statement(model, shape: tuple, sort_by: str):
+    """
+    The cached SELECT of get_tasks_for_user for `model` (Task or TaskArchive), one per filter shape
+    (the names of the filters present) and sort order. All values are bound parameters.
+    """
+    def build():
+        statement = select(model).where(*_task_filter_criteria(model, shape))
+        # Same order as the pages of get_tasks_page: the sort column, then id.
+        if sort_by == "due_date":
+            return statement.order_by(model.due_date.asc().nullslast(), model.id.desc())
+        return statement.order_by(model.creation_date.desc(), model.id.desc())
+    return cached_statement(("get_tasks_for_user", model.__tablename__, shape, sort_by), build)
+
+def _reads_archive(db_session: Session, status, completion_date, include_archived: bool) -> bool:
+    """Whether a task listing with these filters has to look at tasks_archive too."""
+    if status == TaskStatus.PENDING:
+        return False # Only completed tasks are ever archived
+    if not include_archived and completion_date:
+        horizon = archive_horizon(db_session)
+        include_archived = horizon is not None and completion_date <= horizon.date()
+    return include_archived
+
+def _materialize_for_listing(db_session: Session, user_id: int, due_date: Optional[datetime.date]):
+    """Creates the user's recurring task instances that a listing may show (once per session and date)."""
+    until = recurrence.visible_until(due_date)
+    done = db_session.info.setdefault("recurrence_materialized_until", {})
+    if done.get(user_id) and done[user_id] >= until:
+        return
+    recurrence.materialize_recurring_tasks(db_session, until, user_id=user_id)
+    done[user_id] = until
+
 def get_tasks_for_user(
     db_session: Session,
     user_id: int,
@@ -178,31 +387,187 @@ def get_tasks_for_user(
     description: Optional[str] = None,
     creation_date: Optional[datetime.date] = None,
     due_date: Optional[datetime.date] = None,
-    completion_date: Optional[datetime.date] = None
-) -> List[Task]:
+    completion_date: Optional[datetime.date] = None,
+    include_archived: bool = False
+) -> List[Union[Task, TaskArchive]]:
     """
     Retrieves tasks for a given user, with extensive filtering and sorting.
+    Recurring tasks are first materialised up to the visible window (see app/recurrence.py).
+    Only the hot `tasks` table is read unless `include_archived` is set, or a
+    `completion_date` filter reaches back past the archive horizon, in which case
+    matching rows from `tasks_archive` are merged in (as TaskArchive objects).
+    Pages should use get_tasks_page instead, which does not load every matching task.
     """
-    query = db_session.query(Task).filter(Task.user_id == user_id)
-
-    # Apply filters
-    if description:
-        query = query.filter(Task.description.ilike(f'%{description}%'))
-    if status:
-        query = query.filter(Task.status == status)
-    if creation_date:
-        query = query.filter(func.date(Task.creation_date) == creation_date)
-    if due_date:
-        query = query.filter(func.date(Task.due_date) == due_date)
-    if completion_date:
-        query = query.filter(func.date(Task.completion_date) == completion_date)
-
-    # Apply sorting
+    _materialize_for_listing(db_session, user_id, due_date)
+    shape, params = _task_filter_params(user_id, status, description, creation_date, due_date, completion_date)
+    sort_by = "due_date" if sort_by == "due_date" else "creation_date" # Default sort by creation_date
+
+    tasks = db_session.execute(_task_filter_statement(Task, shape, sort_by), params).scalars().all()
+    if not _reads_archive(db_session, status, completion_date, include_archived):
+        return tasks
+
+    archived = db_session.execute(_task_filter_statement(TaskArchive, shape, sort_by), params).scalars().all()
+    if not archived:
+        return tasks
+    return sorted(tasks + archived, key=_task_page_key(sort_by))
+
+# --- Keyset pagination ---
+# Pages are ordered by the sort column plus id, which makes every position unique:
+#   creation_date: creation_date DESC, id DESC
+#   due_date:      due_date ASC NULLS LAST, id DESC
+# A cursor encodes the sort column value and id of the last task shown; the next page
+# starts strictly after it, so its cost does not grow with the page number.
+
+def encode_task_cursor(sort_by: str, task: Union[Task, TaskArchive]) -> str:
+    value = getattr(task, sort_by)
+    payload = {"s": sort_by, "v": value.isoformat() if value else None, "id": task.id}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_task_cursor(cursor: str, sort_by: str) -> tuple:
+    """Returns the (sort value, id) of a cursor made by encode_task_cursor for the same sort order."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value = datetime.datetime.fromisoformat(payload["v"]) if payload["v"] else None
+        if payload["s"] != sort_by or (value is None and sort_by != "due_date"):
+            raise ValueError("cursor does not match the sort order")
+        return value, int(payload["id"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursorError(f"Invalid page cursor: {e}")
+
+def _task_page_statement(model, shape: tuple, sort_by: str, position: str):
+    """
+    Cached keyset-paginated SELECT. `position` is "first" (no cursor), "after" (cursor with a value)
+    or "after_null" (due_date cursor on a task without due date).
+    """
+    def build():
+        criteria = _task_filter_criteria(model, shape)
+        column = model.due_date if sort_by == "due_date" else model.creation_date
+        after_value = bindparam("after_value", type_=column.type)
+        after_id = bindparam("after_id")
+        if sort_by == "due_date":
+            if position == "after":
+                criteria.append(or_(column > after_value, and_(column == after_value, model.id < after_id), column.is_(None)))
+            elif position == "after_null":
+                criteria.append(and_(column.is_(None), model.id < after_id))
+            order = (column.asc().nullslast(), model.id.desc())
+        else:
+            if position == "after":
+                criteria.append(or_(column < after_value, and_(column == after_value, model.id < after_id)))
+            order = (column.desc(), model.id.desc())
+        return select(model).where(*criteria).order_by(*order).limit(bindparam("limit"))
+    return cached_statement(("get_tasks_page", model.__tablename__, shape, sort_by, position), build)
+
+def _task_page_key(sort_by: str):
+    """Python equivalent of the page (and get_tasks_for_user) ORDER BY, for merging hot and archived rows."""
     if sort_by == "due_date":
-        query = query.order_by(Task.due_date.asc().nullslast(), Task.creation_date.desc())
-    else:  # Default sort by creation_date
-        query = query.order_by(Task.creation_date.desc())
+        return lambda task: (task.due_date is None, task.due_date or datetime.datetime.min, -task.id)
+    return lambda task: (-task.creation_date.timestamp(), -task.id)
 
+def get_tasks_page(
+    db_session: Session,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    status: Optional[TaskStatus] = None,
+    sort_by: str = "creation_date",
+    description: Optional[str] = None,
+    creation_date: Optional[datetime.date] = None,
+    due_date: Optional[datetime.date] = None,
+    completion_date: Optional[datetime.date] = None,
+    include_archived: bool = False
+) -> tuple:
+    """
+    Returns one page of get_tasks_for_user's results as (tasks, next_cursor).
+    `cursor` is the next_cursor of the previous page (None for the first page);
+    next_cursor is None on the last page. Raises InvalidCursorError for a bad cursor.
+    """
+    _materialize_for_listing(db_session, user_id, due_date)
+    shape, params = _task_filter_params(user_id, status, description, creation_date, due_date, completion_date)
+    sort_by = "due_date" if sort_by == "due_date" else "creation_date"
+    position = "first"
+    if cursor:
+        params["after_value"], params["after_id"] = decode_task_cursor(cursor, sort_by)
+        position = "after" if params["after_value"] is not None else "after_null"
+    params["limit"] = limit + 1 # One extra row tells whether there is a next page
+
+    tasks = db_session.execute(_task_page_statement(Task, shape, sort_by, position), params).scalars().all()
+    if _reads_archive(db_session, status, completion_date, include_archived):
+        archived = db_session.execute(_task_page_statement(TaskArchive, shape, sort_by, position), params).scalars().all()
+        if archived:
+            tasks = sorted(tasks + archived, key=_task_page_key(sort_by))
+
+    if len(tasks) <= limit:
+        return tasks, None
+    tasks = tasks[:limit]
+    return tasks, encode_task_cursor(sort_by, tasks[-1])
+
+_filter_counts = SingleFlight() # Coalesces identical count_tasks_by_status searches in flight
+
+def count_tasks_by_status(
+    db_session: Session,
+    user_id: int,
+    status: Optional[TaskStatus] = None,
+    description: Optional[str] = None,
+    creation_date: Optional[datetime.date] = None,
+    due_date: Optional[datetime.date] = None,
+    completion_date: Optional[datetime.date] = None,
+    include_archived: bool = False
+) -> dict:
+    """
+    Counts the tasks matching the same filters as get_tasks_for_user, per status, without loading them.
+    Returns {"pending": int, "completed": int, "total": int}.
+    """
+    _materialize_for_listing(db_session, user_id, due_date)
+    shape, params = _task_filter_params(user_id, status, description, creation_date, due_date, completion_date)
+    models = [Task]
+    if _reads_archive(db_session, status, completion_date, include_archived):
+        models.append(TaskArchive)
+
+    def count():
+        counts = {TaskStatus.PENDING: 0, TaskStatus.COMPLETED: 0}
+        for model in models:
+            statement = cached_statement(
+                ("count_tasks_by_status", model.__tablename__, shape),
+                lambda: select(model.status, func.count()).where(*_task_filter_criteria(model, shape)).group_by(model.status)
+            )
+            for task_status, count in db_session.execute(statement, params):
+                counts[task_status] += count
+        pending, completed = counts[TaskStatus.PENDING], counts[TaskStatus.COMPLETED]
+        return {"pending": pending, "completed": completed, "total": pending + completed}
+
+    if "description" not in shape:
+        return count()
+    # A substring search reads every task of the user; identical ones running at once (reloads,
+    # several tabs) share one query. The result is a new dict per caller.
+    bind = db_session.get_bind()
+    key = (id(getattr(bind, "engine", bind)), shape, tuple(sorted(params.items())), len(models))
+    return dict(_filter_counts.do(key, count))
+
+def get_tasks_due_between(
+    db_session: Session,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    limit: Optional[int] = None
+) -> List[Task]:
+    """
+    Retrieves pending tasks of all users whose due date falls in [start, end), ordered by due date.
+    Served by the partial index ix_tasks_pending_due_date, so the cost is proportional
+    to the number of matching tasks rather than the size of the tasks table.
+    """
+    query = (
+        db_session.query(Task)
+        .filter(
+            Task.status == TaskStatus.PENDING,
+            Task.due_date >= start,
+            Task.due_date < end,
+        )
+        .order_by(Task.due_date.asc(), Task.id.asc())
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    if is_sharded(db_session):
+        rows = execute_ordered(db_session, query.statement, None, key=lambda row: (row[0].due_date, row[0].id), limit=limit)
+        return [row[0] for row in rows]
     return query.all()
 
 # Removed get_pending_tasks_for_user as get_tasks_for_user covers its functionality by passing status=TaskStatus.PENDING
@@ -210,10 +575,13 @@ def get_tasks_for_user(
 def complete_task(db_session: Session, task_id: int, user_id: int) -> Task:
     """Marks a task as completed and awards points to the user."""
     # Ensure task is fetched for update, preventing race conditions if points were critical
-    task = db_session.query(Task).filter(
-        Task.id == task_id,
-        Task.user_id == user_id
-    ).first()
+    task = db_session.execute(
+        cached_statement("complete_task.task", lambda: select(Task).where(
+            Task.id == bindparam("task_id"),
+            Task.user_id == bindparam("user_id")
+        )),
+        {"task_id": task_id, "user_id": user_id}
+    ).scalars().first()
 
     if not task:
         raise TaskNotFoundError(f"Task with ID {task_id} not found or does not belong to you.")
@@ -226,20 +594,26 @@ def complete_task(db_session: Session, task_id: int, user_id: int) -> Task:
     task.completion_date = datetime.datetime.utcnow()
 
     # Award points to the user
-    user = db_session.query(User).filter(User.id == user_id).first()
+    user = db_session.execute(
+        cached_statement("complete_task.user", lambda: select(User).where(User.id == bindparam("user_id"))),
+        {"user_id": user_id}
+    ).scalars().first()
     if user:
         user.points += POINTS_PER_TASK
     
+    invalidate_user_snapshot_on_commit(db_session, user_id)
     try:
+        stats.record_task_completed(db_session, task)
         db_session.commit()
         db_session.refresh(task)
+        # Anything else that reacts to a completion subscribes to this event rather than growing the transaction above.
+        publish(TaskCompleted(task_id=task.id, user_id=user_id, points_awarded=POINTS_PER_TASK if user else 0,
+                              completion_date=task.completion_date), db_session)
         return task
     except SQLAlchemyError as e:
         db_session.rollback()
         raise TaskCompletionError(f"Database error occurred while completing task: {e}")
 
-from sqlalchemy import func # For aggregate functions like count and rank
-
 # Structure for leaderboard entry (conceptual, actual return is list of dicts/rows)
 # class LeaderboardEntry:
 #     user_id: int
@@ -248,32 +622,33 @@ from sqlalchemy import func # For aggregate functions like count and rank
 #     rank: int
 #     completed_tasks_count: int
 
-def get_leaderboard_users_paginated(db_session: Session, page: int = 1, per_page: int = 10) -> tuple[List[dict], int]:
-    """
-    Retrieves users for the leaderboard with rank and completed task count, paginated.
-    Returns a list of dictionaries (each representing a leaderboard entry) and the total number of users.
-    """
-    offset = (page - 1) * per_page
-
-    # Subquery to count completed tasks for each user
-    completed_tasks_subquery = (
-        db_session.query(
-            Task.user_id,
-            func.count(Task.id).label("completed_tasks_count")
+def _completed_tasks_subquery():
+    # Subquery to count completed tasks for each user, including the ones moved to the archive
+    completed_tasks = union_all(
+        select(Task.user_id).where(Task.status == TaskStatus.COMPLETED),
+        select(TaskArchive.user_id)
+    ).subquery('completed_tasks')
+    return (
+        select(
+            completed_tasks.c.user_id,
+            func.count().label("completed_tasks_count")
         )
-        .filter(Task.status == TaskStatus.COMPLETED)
-        .group_by(Task.user_id)
+        .group_by(completed_tasks.c.user_id)
         .subquery('completed_tasks_sq') # Alias for the subquery
     )
 
+def _leaderboard_page_statement():
+    completed_tasks_subquery = _completed_tasks_subquery()
+
     # Main query to join User details with rank and completed tasks count
     # Using DENSE_RANK() window function to assign ranks based on points
-    query = (
-        db_session.query(
+    rank = func.dense_rank().over(order_by=User.points.desc())
+    return (
+        select(
             User.id.label("user_id"),
             User.username,
             User.points,
-            func.dense_rank().over(order_by=User.points.desc()).label("rank"),
+            rank.label("rank"),
             func.coalesce(completed_tasks_subquery.c.completed_tasks_count, 0).label("completed_tasks_count")
         )
         .select_from(User) # Explicitly select from User table first
@@ -281,22 +656,110 @@ def get_leaderboard_users_paginated(db_session: Session, page: int = 1, per_page
             completed_tasks_subquery,
             User.id == completed_tasks_subquery.c.user_id
         )
-        .order_by(func.dense_rank().over(order_by=User.points.desc()).asc(), User.id.asc()) # Order by rank, then by ID for tie-breaking
+        .order_by(rank.asc(), User.id.asc()) # Order by rank, then by ID for tie-breaking
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+
+# Leaderboard pages are cached per database, page and page size. A completed or deleted task or
+# a renamed or new user marks them stale: the next request recomputes its page while concurrent
+# viewers get the previous one, and viewers of a page nobody has cached share one query.
+# Writes from other processes show up within LEADERBOARD_FRESH_SECONDS.
+LEADERBOARD_FRESH_SECONDS = 2
+LEADERBOARD_STALE_SECONDS = 60 # Older pages are not served while their refresh runs; viewers wait for it
+_leaderboard_pages = StaleWhileRevalidateCache(maxsize=64, fresh_ttl=LEADERBOARD_FRESH_SECONDS,
+                                               stale_ttl=LEADERBOARD_STALE_SECONDS)
+
+def _leaderboard_changed(event):
+    _leaderboard_pages.mark_stale()
+
+for _event_type in (TaskCompleted, TaskDeleted, UserUpdated):
+    subscribe(_event_type, _leaderboard_changed, name="leaderboard_cache")
+
+def clear_leaderboard_cache() -> None:
+    _leaderboard_pages.clear()
+
+def leaderboard_cache_stats() -> dict:
+    return _leaderboard_pages.stats()
+
+def _leaderboard_shard_statement():
+    # One shard's users in leaderboard order, without ranks: those depend on the other shards.
+    completed_tasks_subquery = _completed_tasks_subquery()
+    return (
+        select(
+            User.id.label("user_id"),
+            User.username,
+            User.points,
+            func.coalesce(completed_tasks_subquery.c.completed_tasks_count, 0).label("completed_tasks_count")
+        )
+        .select_from(User)
+        .outerjoin(completed_tasks_subquery, User.id == completed_tasks_subquery.c.user_id)
+        .order_by(User.points.desc(), User.id.asc())
+        .limit(bindparam("limit"))
+    )
+
+def _merged_leaderboard_page(db_session: Session, offset: int, per_page: int) -> list:
+    """
+    The page of a sharded leaderboard as (row, rank) pairs: a k-way merge of every shard's users
+    by (points DESC, id), ranked as it streams by. Each shard reads at most offset + per_page users.
+    """
+    rows = execute_ordered(
+        db_session,
+        cached_statement("leaderboard.shard", _leaderboard_shard_statement),
+        {"limit": offset + per_page},
+        key=lambda row: (-row.points, row.user_id),
+        limit=offset + per_page,
+    )
+    page, rank, previous_points = [], 0, None
+    for position, row in enumerate(rows):
+        if row.points != previous_points: # DENSE_RANK
+            rank, previous_points = rank + 1, row.points
+        if position >= offset:
+            page.append((row, rank))
+    return page
+
+def get_leaderboard_users_paginated(db_session: Session, page: int = 1, per_page: int = 10,
+                                    cached: bool = True) -> tuple[List[dict], int]:
+    """
+    Retrieves users for the leaderboard with rank and completed task count, paginated.
+    Returns a list of dictionaries (each representing a leaderboard entry) and the total number of users.
+    Both statements are built once and cached; the page and page size are bound parameters.
+    Pages are cached with stale-while-revalidate (see _leaderboard_pages); the result is shared
+    between callers and must not be modified. `cached=False` always computes a new page.
+    """
+    if not cached:
+        return _leaderboard_page(db_session, page, per_page)
+    bind = db_session.get_bind()
+    return _leaderboard_pages.get_or_compute(
+        (id(getattr(bind, "engine", bind)), page, per_page),
+        lambda: _leaderboard_page(db_session, page, per_page)
     )
 
-    total_users_count = query.count() # Get total count before applying limit/offset
+def _leaderboard_page(db_session: Session, page: int, per_page: int) -> tuple[List[dict], int]:
+    offset = (page - 1) * per_page
 
-    paginated_results = query.limit(per_page).offset(offset).all()
+    if is_sharded(db_session):
+        ranked_rows = _merged_leaderboard_page(db_session, offset, per_page)
+    else:
+        paginated_results = db_session.execute(
+            cached_statement("leaderboard.page", _leaderboard_page_statement),
+            {"limit": per_page, "offset": offset}
+        ).all()
+        ranked_rows = [(row, row.rank) for row in paginated_results]
+    # The outer join yields exactly one row per user, so the total is simply the number of users.
+    total_users_count = sum_over_shards(
+        db_session, cached_statement("leaderboard.count", lambda: select(func.count(User.id)))
+    )
 
     leaderboard_entries = [
         {
             "user_id": row.user_id,
             "username": row.username,
             "points": row.points,
-            "rank": row.rank,
+            "rank": rank,
             "completed_tasks_count": row.completed_tasks_count
         }
-        for row in paginated_results
+        for row, rank in ranked_rows
     ]
 
     return leaderboard_entries, total_users_count
@@ -307,6 +770,111 @@ def get_leaderboard_users_paginated(db_session: Session, page: int = 1, per_page
 #     """Retrieves users for the leaderboard, sorted by points."""
 #     return db_session.query(User).order_by(User.points.desc()).limit(limit).all()
 
+# --- Global activity feed ---
+# Completed tasks of everyone, newest first, ordered by (completion_date DESC, id DESC) and
+# served from the partial index ix_tasks_completed_recent, so a page reads `limit` index
+# entries whatever the size of `tasks`. Cursors are get_tasks_page's, on completion_date.
+# The feed covers the hot table only: archived completions (see app/archive.py) are old.
+# On a sharded database each shard returns its own first `limit` rows and they are merged.
+
+ACTIVITY_FIRST_PAGE_TTL_SECONDS = 5 # Everyone opens the feed at the top; that page may be this stale
+_activity_first_pages = LRUCache(maxsize=16, ttl=ACTIVITY_FIRST_PAGE_TTL_SECONDS)
+
+def _activity_statement(position: str):
+    def build():
+        criteria = [Task.status == TaskStatus.COMPLETED, Task.completion_date.isnot(None)]
+        if position == "after":
+            after_value = bindparam("after_value", type_=Task.completion_date.type)
+            criteria.append(or_(Task.completion_date < after_value,
+                                and_(Task.completion_date == after_value, Task.id < bindparam("after_id"))))
+        return (
+            select(Task.id, Task.description, Task.completion_date, Task.user_id, User.username)
+            .join(User, User.id == Task.user_id)
+            .where(*criteria)
+            .order_by(Task.completion_date.desc(), Task.id.desc())
+            .limit(bindparam("limit"))
+        )
+    return cached_statement(("get_recent_activity", position), build)
+
+def _activity_page(db_session: Session, cursor: Optional[str], limit: int) -> tuple:
+    params = {"limit": limit + 1} # One extra row tells whether there is a next page
+    position = "first"
+    if cursor:
+        params["after_value"], params["after_id"] = decode_task_cursor(cursor, "completion_date")
+        position = "after"
+    rows = execute_ordered(db_session, _activity_statement(position), params,
+                           key=lambda row: (row.completion_date, row.id), reverse=True, limit=limit + 1)
+    entries = [
+        {
+            "task_id": row.id,
+            "description": row.description,
+            "completion_date": row.completion_date,
+            "user_id": row.user_id,
+            "username": row.username,
+            "points": POINTS_PER_TASK,
+        }
+        for row in rows[:limit]
+    ]
+    if len(rows) <= limit:
+        return entries, None
+    last = rows[limit - 1]
+    return entries, encode_task_cursor("completion_date", last)
+
+def get_recent_activity(db_session: Session, cursor: Optional[str] = None, limit: int = 20) -> tuple:
+    """
+    Returns one page of recent task completions across all users as (entries, next_cursor).
+    Each entry is a dict with task_id, description, completion_date, user_id, username and points.
+    The first page (no cursor) is cached for ACTIVITY_FIRST_PAGE_TTL_SECONDS.
+    Raises InvalidCursorError for a bad cursor.
+    """
+    if cursor is None:
+        bind = db_session.get_bind()
+        cache_key = (id(getattr(bind, "engine", bind)), limit)
+        page = _activity_first_pages.get(cache_key)
+        if page is None:
+            page = _activity_page(db_session, None, limit)
+            _activity_first_pages.set(cache_key, page)
+        return page
+    return _activity_page(db_session, cursor, limit)
+
+def clear_activity_cache() -> None:
+    _activity_first_pages.clear()
+
+def get_user_stats(db_session: Session, user_id: int, now: Optional[datetime.datetime] = None) -> dict:
+    """
+    Returns task statistics for a user: pending, completed and overdue counts, the current
+    completion streak in days, and the average time-to-complete in seconds (None if nothing is completed).
+    Reads the incrementally maintained user_stats row plus one indexed count for overdue tasks.
+    """
+    now = now or datetime.datetime.utcnow()
+    row = stats.get_stats_row(db_session, user_id)
+    if row is None:
+        # First look at a user that predates user_stats: build the row once.
+        stats.rebuild_user_stats(db_session, user_ids=[user_id])
+        db_session.commit()
+        row = stats.get_stats_row(db_session, user_id)
+        if row is None:
+            raise ServiceError(f"User with ID {user_id} not found.")
+
+    overdue_count = db_session.query(func.count(Task.id)).filter(
+        Task.user_id == user_id,
+        Task.status == TaskStatus.PENDING,
+        Task.due_date < now
+    ).scalar()
+
+    # The stored streak is only current if the last completion was today or yesterday.
+    current_streak = row.current_streak
+    if row.last_completion_day is None or row.last_completion_day < now.date() - datetime.timedelta(days=1):
+        current_streak = 0
+
+    return {
+        "pending_count": row.pending_count,
+        "completed_count": row.completed_count,
+        "overdue_count": overdue_count,
+        "current_streak": current_streak,
+        "average_completion_seconds": (row.total_completion_seconds / row.completed_count) if row.completed_count else None,
+    }
+
 def get_password_reset_token(user_id: int) -> str:
     """Generates a password reset token for a user."""
     serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
@@ -337,6 +905,7 @@ def reset_password(db_session: Session, user_id: int, password: str) -> bool:
     if not user:
         return False
     user.set_password(password)
+    invalidate_user_snapshot_on_commit(db_session, user_id)
     try:
         db_session.commit()
         return True
@@ -0,0 +1,317 @@
+"""
+Horizontal sharding of users and their rows across several SQLite files (opt-in).
+
+A SQLite file has one writer at a time. With DATABASE_SHARDS=N (N > 1, see app/db.py)
+the application keeps N shard files, each with the full schema, plus a small
+directory file:
+
+- A user and every row keyed by their id (tasks, archived tasks, recurring tasks,
+  stats) live on the shard `shard_for_user` picks from a hash of the id, so writes
+  of users on different shards do not wait for each other.
+- Task and recurring-task ids carry their shard in the bits above SHARD_KEY_BITS:
+  each shard's tables use AUTOINCREMENT, seeded at `index << SHARD_KEY_BITS`. Ids are
+  therefore unique across shards and `shard_for_key` finds a row from its id alone.
+- The directory (`user_directory`) hands out user ids and owns username and email
+  uniqueness, which per-shard unique indexes cannot enforce.
+- ShardedTaskSession routes each statement by the user or row ids in its WHERE
+  clause or parameters (see `_route`). Statements without one run on every shard
+  and the results are concatenated. That is right for per-user reads and for
+  set-based writes, since every shard applies them to its own users. It is wrong
+  for global orderings and aggregates. Those go through `execute_ordered`, a k-way
+  merge of the per-shard ordered streams, as the leaderboard, activity feed and
+  due-date scans do.
+- Rows that belong to no user (job watermarks, data-migration checkpoints) live on
+  the first shard, the "home" shard.
+
+Services keep taking a `db_session`; only user creation and renames (directory) and
+the global orderings check `is_sharded`. Background jobs that scan a whole database
+by key (archive, maintenance, backups) run on one shard file at a time.
+"""
+import heapq
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.dml import Insert
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+from .models import Base, RecurringTask, Task, TaskArchive, User
+
+SHARD_KEY_BITS = 40 # Room for 10^12 ids per shard
+HOME_SHARD = "shard0"
+
+# Tables whose ids are allocated per shard (AUTOINCREMENT, seeded at the shard's base).
+_SHARD_KEYED_TABLES = ("tasks", "recurring_tasks")
+# Columns that name the owning user, and columns holding shard-keyed ids (tasks_archive keeps its task's id).
+_USER_COLUMNS = {("users", "id"), ("tasks", "user_id"), ("tasks_archive", "user_id"),
+                 ("recurring_tasks", "user_id"), ("user_stats", "user_id")}
+_KEY_COLUMNS = {("tasks", "id"), ("tasks_archive", "id"), ("recurring_tasks", "id"), ("tasks", "recurring_task_id")}
+# Tables of rows that belong to no user, kept on the home shard only.
+_HOME_TABLES = {"job_watermarks", "data_migration_checkpoints"}
+
+directory_metadata = MetaData()
+
+user_directory = Table(
+    "user_directory",
+    directory_metadata,
+    Column("id", Integer, primary_key=True), # The user's id on their shard
+    Column("username", String, nullable=False, unique=True),
+    Column("email", String, nullable=False, unique=True),
+    sqlite_autoincrement=True, # Ids of deleted reservations are not handed out again
+)
+
+shard_layout = Table(
+    "shard_layout",
+    directory_metadata,
+    Column("shard_count", Integer, primary_key=True),
+)
+
+
+def _mix(user_id: int) -> int:
+    # Fibonacci hashing to 32 bits: consecutive ids are spread evenly over the range.
+    return ((user_id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 32
+
+
+def shard_metadata() -> MetaData:
+    """The application schema as created on a shard: shard-keyed tables use AUTOINCREMENT."""
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        if table.name in _SHARD_KEYED_TABLES:
+            copy.dialect_kwargs["sqlite_autoincrement"] = True
+    return metadata
+
+
+class ShardSet:
+    """The engines of the shard files and of the directory, and the rules that map users and ids to shards."""
+
+    def __init__(self, shard_urls: List[str], directory_url: str):
+        self.engines: Dict[str, Engine] = {f"shard{index}": create_engine(url) for index, url in enumerate(shard_urls)}
+        self.shard_ids = list(self.engines)
+        self.directory = create_engine(directory_url)
+
+    @classmethod
+    def for_files(cls, prefix: str, count: int) -> "ShardSet":
+        """`{prefix}.shard0.db` ... `{prefix}.shard{count-1}.db` and `{prefix}.directory.db`."""
+        return cls([f"sqlite:///{prefix}.shard{index}.db" for index in range(count)], f"sqlite:///{prefix}.directory.db")
+
+    def shard_for_user(self, user_id: int) -> str:
+        return self.shard_ids[(_mix(user_id) * len(self.shard_ids)) >> 32]
+
+    def shard_for_key(self, key: int) -> str:
+        """The shard of a task or recurring-task id."""
+        return f"shard{key >> SHARD_KEY_BITS}"
+
+    def create_all(self):
+        """Creates missing tables on every shard and in the directory, then `prepare`s the shards."""
+        metadata = shard_metadata()
+        for engine in self.engines.values():
+            with engine.begin() as connection:
+                # As in init_db: only takes effect on a brand-new file, before its first table.
+                connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                metadata.create_all(bind=connection)
+        directory_metadata.create_all(self.directory)
+        self.prepare()
+
+    def prepare(self):
+        """
+        Checks that the directory was set up for this many shards and seeds each shard's id
+        sequences at its base (again after a table rebuild, e.g. convert-task-storage).
+        Raises RuntimeError on a shard count mismatch: users would be looked up on the wrong shards.
+        """
+        with self.directory.begin() as connection:
+            counts = connection.execute(select(shard_layout.c.shard_count)).scalars().all()
+            if not counts:
+                connection.execute(insert(shard_layout).values(shard_count=len(self.shard_ids)))
+            elif counts != [len(self.shard_ids)]:
+                raise RuntimeError(f"The directory was created for {counts[0]} shard(s), not {len(self.shard_ids)}. "
+                                   "Changing the number of shards needs the data to be redistributed.")
+        for index, engine in enumerate(self.engines.values()):
+            base = index << SHARD_KEY_BITS
+            with engine.begin() as connection:
+                for table_name in _SHARD_KEYED_TABLES:
+                    seeded = connection.exec_driver_sql(
+                        "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?", (base, table_name)).rowcount
+                    if not seeded:
+                        connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table_name, base))
+
+    def sessionmaker(self, **kwargs) -> sessionmaker:
+        return sessionmaker(class_=ShardedTaskSession, shard_set=self, **kwargs)
+
+    # --- The directory ---
+
+    def reserve_user(self, username: str, email: str) -> int:
+        """
+        Claims `username` and `email` and returns the new user's id. Raises IntegrityError
+        ("UNIQUE constraint failed: user_directory.username" / ".email") if either is taken.
+        """
+        with self.directory.begin() as connection:
+            return connection.execute(insert(user_directory).values(username=username, email=email)).inserted_primary_key[0]
+
+    def release_user(self, user_id: int):
+        """Gives up a reservation whose user could not be created on its shard."""
+        with self.directory.begin() as connection:
+            connection.execute(user_directory.delete().where(user_directory.c.id == user_id))
+
+    def rename_user(self, user_id: int, username: str, email: str):
+        """Moves a user's directory entry to a new username/email; raises IntegrityError if one is taken."""
+        with self.directory.begin() as connection:
+            connection.execute(update(user_directory).where(user_directory.c.id == user_id)
+                               .values(username=username, email=email))
+
+    def dispose(self):
+        for engine in self.engines.values():
+            engine.dispose()
+        self.directory.dispose()
+
+
+# --- Routing ---
+
+def _conjuncts(clause) -> list:
+    """The terms of a WHERE clause that must all hold (its top-level ANDs)."""
+    if clause is None:
+        return []
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        return [term for sub in clause.clauses for term in _conjuncts(sub)]
+    return [clause]
+
+
+def _bound_values(bind: BindParameter, params: List[dict]) -> Optional[list]:
+    values = []
+    for row in params:
+        value = row.get(bind.key, bind.value) if bind.callable is None else bind.effective_value
+        if value is None:
+            return None
+        values.extend(value if bind.expanding else [value])
+    return values
+
+
+class ShardedTaskSession(ShardedSession):
+    """A Session over a ShardSet that picks the shard(s) of each statement and flushed object."""
+
+    def __init__(self, shard_set: ShardSet, **kwargs):
+        self.shard_set = shard_set
+        super().__init__(
+            shard_chooser=self._shard_for_instance,
+            id_chooser=self._shards_for_identity,
+            execute_chooser=self._shards_for_execution,
+            shards=shard_set.engines,
+            **kwargs,
+        )
+
+    def _shard_for_column(self, column, value: int) -> Optional[str]:
+        name = (getattr(getattr(column, "table", None), "name", None), getattr(column, "name", None))
+        if name in _USER_COLUMNS:
+            return self.shard_set.shard_for_user(value)
+        if name in _KEY_COLUMNS:
+            return self.shard_set.shard_for_key(value)
+        return None
+
+    def _route(self, clause, params: List[dict]) -> Optional[Set[str]]:
+        """
+        The shards that can hold rows matching `clause`, from its `column == value` and
+        `column IN (...)` terms on user ids and shard-keyed ids; None if it names none.
+        """
+        shards = None
+        for term in _conjuncts(clause):
+            if not isinstance(term, BinaryExpression) or term.operator not in (operators.eq, operators.in_op):
+                continue
+            column, bind = term.left, term.right
+            if isinstance(column, BindParameter):
+                column, bind = bind, column
+            if not isinstance(bind, BindParameter):
+                continue
+            values = _bound_values(bind, params)
+            if values is None:
+                continue
+            term_shards = {self._shard_for_column(column, value) for value in values}
+            if None in term_shards:
+                continue
+            shards = term_shards if shards is None else shards & term_shards
+        return shards
+
+    def _route_statement(self, statement, params: List[dict]) -> Optional[Set[str]]:
+        if isinstance(statement, Insert):
+            if statement.select is not None:
+                return self._route(statement.select.whereclause, params)
+            column = statement.table.c.get("user_id") if statement.table.name != "users" else statement.table.c.id
+            if column is None or not params or any(column.key not in row for row in params):
+                return None
+            return {self._shard_for_column(column, row[column.key]) for row in params}
+        return self._route(getattr(statement, "whereclause", None), params) # SELECT, UPDATE and DELETE
+
+    def _shards_for_execution(self, orm_context) -> List[str]:
+        if orm_context.bind_mapper is not None and orm_context.bind_mapper.local_table.name in _HOME_TABLES:
+            return [HOME_SHARD]
+        params = orm_context.parameters
+        params = params if isinstance(params, list) else [params or {}]
+        shards = self._route_statement(orm_context.statement, params)
+        if shards is None:
+            if isinstance(orm_context.statement, Insert) and orm_context.statement.select is None:
+                raise ValueError("Rows inserted on a sharded session need a user_id, and all of one shard.")
+            return self.shard_set.shard_ids
+        if isinstance(orm_context.statement, Insert) and orm_context.statement.select is None and len(shards) > 1:
+            raise ValueError("Rows inserted in one statement must all belong to the same shard.")
+        # No shard can match (e.g. contradictory ids): any single one returns the empty result.
+        return sorted(shards) or [HOME_SHARD]
+
+    def _shards_for_identity(self, query, ident) -> List[str]:
+        entity = query.column_descriptions[0]["entity"]
+        if entity is User:
+            return [self.shard_set.shard_for_user(ident[0])]
+        if entity in (Task, TaskArchive, RecurringTask):
+            return [self.shard_set.shard_for_key(ident[0])]
+        if "user_id" in entity.__table__.c and len(ident) == 1: # Keyed by its user (user_stats)
+            return [self.shard_set.shard_for_user(ident[0])]
+        return self.shard_set.shard_ids
+
+    def _shard_for_instance(self, mapper, instance, clause=None) -> str:
+        if instance is None:
+            shards = self._route_statement(clause, [{}]) if clause is not None else None
+            return min(shards) if shards and len(shards) == 1 else HOME_SHARD
+        if isinstance(instance, User):
+            if instance.id is None:
+                raise ValueError("Users on a sharded database get their id from the directory; use create_user.")
+            return self.shard_set.shard_for_user(instance.id)
+        user_id = getattr(instance, "user_id", None)
+        if user_id is not None:
+            return self.shard_set.shard_for_user(user_id)
+        return HOME_SHARD
+
+
+def is_sharded(db_session) -> bool:
+    return isinstance(db_session, ShardedTaskSession)
+
+
+def merge_ordered(db_session: ShardedTaskSession, statement, params: Optional[dict], key: Callable,
+                  reverse: bool = False) -> Iterator:
+    """
+    Runs `statement`, which must be ordered by `key` (descending with `reverse`), on every shard,
+    and lazily k-way merges the result streams into one ordered stream of rows.
+    """
+    streams = [db_session.execute(statement, params, bind_arguments={"shard_id": shard_id})
+               for shard_id in db_session.shard_set.shard_ids]
+    return heapq.merge(*streams, key=key, reverse=reverse)
+
+
+def execute_ordered(db_session, statement, params: Optional[dict], key: Callable, reverse: bool = False,
+                    limit: Optional[int] = None) -> list:
+    """
+    `db_session.execute(statement, params).all()` for an ordered (and usually limited) statement;
+    on a sharded session, the first `limit` rows of the merge of every shard's result.
+    """
+    if not is_sharded(db_session):
+        return db_session.execute(statement, params).all()
+    return list(islice(merge_ordered(db_session, statement, params, key, reverse), limit))
+
+
+def sum_over_shards(db_session, statement, params: Optional[dict] = None) -> int:
+    """The scalar result of an aggregate such as COUNT, summed over the shards of a sharded session."""
+    if not is_sharded(db_session):
+        return db_session.execute(statement, params).scalar()
+    return sum(db_session.execute(statement, params, bind_arguments={"shard_id": shard_id}).scalar() or 0
+               for shard_id in db_session.shard_set.shard_ids)
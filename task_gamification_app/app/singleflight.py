@@ -0,0 +1,131 @@
+"""
+Coalescing of concurrent, identical computations.
+
+When a cached result expires, or a burst of writes invalidates it, every request
+that arrives before it is recomputed would otherwise run the same expensive query
+at once. `SingleFlight` lets the first caller run it while callers with the same key
+wait and share its result (or its exception). `StaleWhileRevalidateCache` adds a
+cache in front: during a refresh, concurrent callers get the previous value
+immediately instead of waiting, so only one query runs and nobody blocks.
+
+Shared results are handed to several callers: treat them as read-only.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .cache import LRUCache
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time; concurrent callers of the key share it."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Returns compute(), or the result of the compute() another thread is running for `key`.
+        Exceptions are shared the same way; nothing is remembered once the computation ends.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                self.computed += 1
+            flight.done.set()
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._flights
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._flights), "computed": self.computed, "shared": self.shared}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.computed = 0
+            self.shared = 0
+
+
+class StaleWhileRevalidateCache:
+    """
+    A cache of computed values that may be served slightly out of date.
+
+    An entry is fresh for `fresh_ttl` seconds after it was computed, or until `mark_stale()`.
+    A stale entry is recomputed by the next caller; callers that arrive meanwhile get the
+    stale value at once. Entries older than `stale_ttl` are not served: callers wait for
+    the one computation instead. A caller that finds no fresh entry and no refresh running
+    computes it itself, so sequential callers always see changes made before mark_stale().
+    """
+
+    def __init__(self, maxsize: int = 256, fresh_ttl: float = 1.0, stale_ttl: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.fresh_ttl = fresh_ttl
+        self.clock = clock
+        self._entries = LRUCache(maxsize=maxsize, ttl=stale_ttl, clock=clock) # key -> (value, generation, fresh_until)
+        self._flights = SingleFlight()
+        self._generation = 0
+        self.fresh_hits = 0
+        self.stale_hits = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, generation, fresh_until = entry
+            if generation == self._generation and self.clock() < fresh_until:
+                self.fresh_hits += 1
+                return value
+            if self._flights.in_flight(key):
+                self.stale_hits += 1
+                return value
+        return self._flights.do(key, lambda: self._compute(key, compute))
+
+    def _compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        generation = self._generation # A mark_stale() during the computation leaves the result stale
+        value = compute()
+        self._entries.set(key, (value, generation, self.clock() + self.fresh_ttl))
+        return value
+
+    def mark_stale(self) -> None:
+        """Ends the freshness of every entry, keeping them to serve during their refresh."""
+        self._generation += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._flights.reset_stats()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+
+    def stats(self) -> dict:
+        return dict(self._flights.stats(), size=len(self._entries),
+                    fresh_hits=self.fresh_hits, stale_hits=self.stale_hits)
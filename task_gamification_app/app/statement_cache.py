@@ -0,0 +1,83 @@
+"""
+Prebuilt SQL statements for the hot read paths.
+
+Building a Query/select and deriving its cache key costs about as much as running a
+small indexed query. The hot services therefore build each statement once per
+"shape" (which filters are present, which sort order), with every value left as a
+bound parameter, and keep it here. A reused statement object keeps its memoized
+cache key, so SQLAlchemy's compiled cache serves the SQL string without compiling.
+
+`statement_cache_stats()` reports hits and misses of this cache and of SQLAlchemy's
+compiled cache (observed per execution), so it can be confirmed that steady-state
+traffic compiles nothing.
+"""
+import threading
+from typing import Callable, Dict, Hashable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+
+class StatementCache:
+    """A dict of statements keyed by shape, with hit/miss counters."""
+
+    def __init__(self):
+        self._statements: Dict[Hashable, object] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], object]):
+        statement = self._statements.get(key)
+        if statement is not None:
+            self.hits += 1
+            return statement
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is None:
+                self.misses += 1
+                statement = self._statements[key] = build()
+            else:
+                self.hits += 1
+        return statement
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        return {"size": len(self._statements), "hits": self.hits, "misses": self.misses}
+
+
+_statements = StatementCache()
+_compiled = {"hits": 0, "misses": 0, "uncached": 0}
+
+
+def cached_statement(key: Hashable, build: Callable[[], object]):
+    """Returns the statement stored under `key`, calling `build()` to create it the first time."""
+    return _statements.get(key, build)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_compiled_cache(conn, cursor, statement, parameters, context, executemany):
+    cache_hit = getattr(context, "cache_hit", None)
+    if cache_hit is CACHE_HIT:
+        _compiled["hits"] += 1
+    elif cache_hit is CACHE_MISS:
+        _compiled["misses"] += 1
+    else:
+        _compiled["uncached"] += 1 # Raw SQL, DDL, or caching disabled
+
+
+def statement_cache_stats() -> dict:
+    """{"statements": {size, hits, misses}, "compiled": {hits, misses, uncached}} since start (or reset)."""
+    return {"statements": _statements.stats(), "compiled": dict(_compiled)}
+
+
+def reset_statement_cache():
+    _statements.clear()
+    for name in _compiled:
+        _compiled[name] = 0
@@ -0,0 +1,178 @@
+"""
+Incremental maintenance of the user_stats table.
+
+The task services call the `record_*` helpers inside their own transaction, so the
+statistics commit (or roll back) together with the task change. Each helper issues
+a single atomic `UPDATE ... SET col = col + :delta` against the user's row, which
+is O(1) regardless of how many tasks the user has and safe under concurrent writers.
+
+If a user has no stats row yet (e.g. a database created before user_stats existed),
+the row is rebuilt from the tasks table for that user instead. `rebuild_user_stats`
+recomputes all rows set-based (over both `tasks` and `tasks_archive`) and is
+exposed as `manage.py rebuild-stats`.
+"""
+import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, func, insert, literal, select, union_all, update, bindparam
+from sqlalchemy.orm import Session
+
+from .compact_storage import day_of, seconds_between
+from .models import Task, TaskArchive, TaskStatus, User, UserStats
+
+
+def _today() -> datetime.date:
+    # Completion dates are stored in UTC (datetime.utcnow), so streak days are UTC days too.
+    return datetime.datetime.utcnow().date()
+
+
+def _completion_seconds(task: Task) -> float:
+    if task.completion_date is None or task.creation_date is None:
+        return 0.0
+    return (task.completion_date - task.creation_date).total_seconds()
+
+
+def _apply(db_session: Session, user_id: int, values: dict):
+    """Runs one UPDATE on the user's stats row, falling back to a per-user rebuild if the row is missing."""
+    # The task change must reach the database first, both for atomicity and for the rebuild fallback.
+    db_session.flush()
+    # No UserStats objects are loaded on the write paths, so the ORM need not look for any to synchronise.
+    result = db_session.execute(
+        update(UserStats).where(UserStats.user_id == user_id).values(**values),
+        execution_options={"synchronize_session": False},
+    )
+    if result.rowcount == 0:
+        rebuild_user_stats(db_session, user_ids=[user_id])
+
+
+def record_task_created(db_session: Session, user_id: int, count: int = 1):
+    _apply(db_session, user_id, {"pending_count": UserStats.pending_count + count})
+
+
+def record_task_completed(db_session: Session, task: Task):
+    today = _today()
+    yesterday = today - datetime.timedelta(days=1)
+    _apply(db_session, task.user_id, {
+        "pending_count": UserStats.pending_count - 1,
+        "completed_count": UserStats.completed_count + 1,
+        "total_completion_seconds": UserStats.total_completion_seconds + _completion_seconds(task),
+        "current_streak": case(
+            (UserStats.last_completion_day == today, UserStats.current_streak),
+            (UserStats.last_completion_day == yesterday, UserStats.current_streak + 1),
+            else_=1,
+        ),
+        "last_completion_day": today,
+    })
+
+
+def record_task_deleted(db_session: Session, task: Task):
+    """
+    Must be called with the task's state as it was before deletion.
+    The streak is left alone (a deleted completion does not un-happen); rebuild_user_stats recomputes it.
+    """
+    if task.status == TaskStatus.COMPLETED:
+        values = {
+            "completed_count": UserStats.completed_count - 1,
+            "total_completion_seconds": UserStats.total_completion_seconds - _completion_seconds(task),
+        }
+    else:
+        values = {"pending_count": UserStats.pending_count - 1}
+    _apply(db_session, task.user_id, values)
+
+
+def _all_tasks(user_ids: Optional[list]):
+    """Union of the hot and archived task rows, restricted to `user_ids` when given."""
+    parts = []
+    for model in (Task, TaskArchive):
+        part = select(model.user_id, model.status, model.creation_date, model.completion_date)
+        if user_ids is not None:
+            part = part.where(model.user_id.in_(user_ids))
+        parts.append(part)
+    return union_all(*parts).subquery("all_tasks")
+
+
+def _completion_seconds_expr(tasks):
+    return seconds_between(tasks.c.completion_date, tasks.c.creation_date)
+
+
+def _streaks(db_session: Session, user_ids: Optional[list]) -> Dict[int, tuple]:
+    """
+    Returns {user_id: (current_streak, last_completion_day)} from the distinct completion days,
+    streamed in one ordered pass.
+    """
+    tasks = _all_tasks(user_ids)
+    day = day_of(tasks.c.completion_date).label("day")
+    query = (
+        select(tasks.c.user_id, day)
+        .where(tasks.c.status == TaskStatus.COMPLETED, tasks.c.completion_date.isnot(None))
+        .group_by(tasks.c.user_id, day)
+        .order_by(tasks.c.user_id, day.desc())
+    )
+
+    streaks: Dict[int, list] = {}
+    current_user, previous_day, counting = None, None, False
+    for user_id, day_value in db_session.execute(query):
+        if isinstance(day_value, str):
+            day_value = datetime.date.fromisoformat(day_value)
+        if user_id != current_user:
+            # Most recent completion day of a new user starts the streak.
+            current_user, previous_day, counting = user_id, day_value, True
+            streaks[user_id] = [1, day_value]
+        elif counting and previous_day - day_value == datetime.timedelta(days=1):
+            streaks[user_id][0] += 1
+            previous_day = day_value
+        else:
+            counting = False # First gap ends the current streak
+    return {user_id: (streak, day) for user_id, (streak, day) in streaks.items()}
+
+
+def rebuild_user_stats(db_session: Session, user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recomputes user_stats from the tasks table, for the given users or for everyone.
+    Counts and latency are computed set-based with one INSERT ... SELECT; streaks with one ordered scan.
+    Does not commit; returns the number of rows written.
+    """
+    user_ids = list(user_ids) if user_ids is not None else None
+
+    delete_stmt = UserStats.__table__.delete()
+    if user_ids is not None:
+        delete_stmt = delete_stmt.where(UserStats.user_id.in_(user_ids))
+    db_session.execute(delete_stmt)
+
+    tasks = _all_tasks(user_ids)
+    is_pending = tasks.c.status == TaskStatus.PENDING
+    is_completed = tasks.c.status == TaskStatus.COMPLETED
+    aggregates = (
+        select(
+            User.id,
+            func.coalesce(func.sum(case((is_pending, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((is_completed, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((is_completed, _completion_seconds_expr(tasks)), else_=0.0)), 0.0),
+            literal(0),
+        )
+        .select_from(User)
+        .outerjoin(tasks, tasks.c.user_id == User.id)
+        .group_by(User.id)
+    )
+    if user_ids is not None:
+        aggregates = aggregates.where(User.id.in_(user_ids))
+    result = db_session.execute(
+        insert(UserStats).from_select(
+            ["user_id", "pending_count", "completed_count", "total_completion_seconds", "current_streak"],
+            aggregates,
+        )
+    )
+
+    streaks = _streaks(db_session, user_ids)
+    if streaks:
+        db_session.execute(
+            update(UserStats.__table__)
+            .where(UserStats.__table__.c.user_id == bindparam("uid"))
+            .values(current_streak=bindparam("streak"), last_completion_day=bindparam("day")),
+            [{"uid": uid, "streak": streak, "day": day} for uid, (streak, day) in streaks.items()],
+        )
+    return result.rowcount
+
+
+def get_stats_row(db_session: Session, user_id: int) -> Optional[UserStats]:
+    return db_session.query(UserStats).filter(UserStats.user_id == user_id).first()
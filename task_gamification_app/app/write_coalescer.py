@@ -0,0 +1,246 @@
+"""
+Group commit for task mutations under SQLite.
+
+SQLite has a single writer, and every `complete_task` / `create_task_for_user` call
+normally pays for its own transaction -- a lock round trip and an fsync -- so write
+throughput is bounded by the commit rate. A `WriteCoalescer` funnels mutations
+through one writer thread instead. Callers submit a service call and get a Future;
+the writer takes everything that queued up while the previous batch was committing
+(waiting up to `linger` seconds for more), runs the calls one after another inside
+a single `BEGIN IMMEDIATE` transaction and commits once.
+
+The service functions are used unchanged. They run on a `BatchSession` whose
+`commit()` only flushes and whose `rollback()` undoes just the current call: each
+call runs in its own SAVEPOINT, so a failing call gets its own exception without
+affecting the others in the batch. Work that must only happen once the data is
+really committed -- cache invalidation, event publication -- is registered with
+`events.after_commit` and runs after the batch's commit. If that commit fails,
+every call of the batch gets the error.
+
+Results are detached from the writer's session with their attributes loaded.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from .events import AFTER_COMMIT_KEY
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchSession(Session):
+    """Session of a write batch: `commit()` only flushes, `rollback()` rolls back the current call's savepoint."""
+    current_savepoint = None
+
+    def commit(self):
+        self.flush()
+
+    def rollback(self):
+        if self.current_savepoint is not None and self.current_savepoint.is_active:
+            self.current_savepoint.rollback()
+
+    def commit_batch(self):
+        Session.commit(self)
+
+    def rollback_batch(self):
+        Session.rollback(self)
+
+
+class _Operation:
+    __slots__ = ("func", "args", "kwargs", "future")
+
+    def __init__(self, func: Callable, args: tuple, kwargs: dict):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class WriteCoalescer:
+    """
+    Runs submitted `func(db_session, *args, **kwargs)` calls in batches of up to `max_batch`,
+    one transaction per batch. At most `max_queue` calls wait; `submit` blocks beyond that.
+    """
+
+    def __init__(self, engine, max_batch: int = 256, linger: float = 0.002, max_queue: int = 10_000):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.linger = linger
+        self._session_factory = sessionmaker(bind=engine, class_=BatchSession, autoflush=False, expire_on_commit=False)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+        self.failed_callbacks = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10):
+        """Finishes the queued calls and stops the writer thread."""
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        self.start()
+        operation = _Operation(func, args, kwargs)
+        self._queue.put(operation)
+        return operation.future
+
+    def call(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """Submits the call and waits for its result (or re-raises its exception)."""
+        return self.submit(func, *args, **kwargs).result(timeout)
+
+    def _run(self):
+        while True:
+            operation = self._queue.get()
+            if operation is _STOP:
+                return
+            batch = [operation]
+            deadline = time.monotonic() + self.linger
+            stopping = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    operation = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if operation is _STOP:
+                    stopping = True
+                    break
+                batch.append(operation)
+            self._run_batch(batch)
+            if stopping:
+                return
+
+    def _run_batch(self, batch: List[_Operation]):
+        db_session = self._session_factory()
+        outcomes = []
+        try:
+            if self.engine.dialect.name == "sqlite":
+                # Take the write lock up front, so no other process can make the batch fail half-way with SQLITE_BUSY.
+                db_session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            for operation in batch:
+                callbacks = db_session.info[AFTER_COMMIT_KEY] = []
+                db_session.current_savepoint = savepoint = db_session.begin_nested()
+                try:
+                    result = operation.func(db_session, *operation.args, **operation.kwargs)
+                except Exception as e:
+                    if savepoint.is_active:
+                        savepoint.rollback()
+                    outcomes.append((operation, None, e, []))
+                    continue
+                if savepoint.is_active:
+                    savepoint.commit()
+                outcomes.append((operation, result, None, callbacks))
+            db_session.current_savepoint = None
+            db_session.info.pop(AFTER_COMMIT_KEY, None)
+            db_session.commit_batch()
+        except Exception as e:
+            self.failed_batches += 1
+            db_session.rollback_batch()
+            db_session.close()
+            for operation in batch:
+                if not operation.future.done():
+                    operation.future.set_exception(e)
+            return
+
+        db_session.expunge_all()
+        self.batches += 1
+        self.operations += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for operation, result, error, callbacks in outcomes:
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception: # A side effect must not turn a committed write into an error
+                    self.failed_callbacks += 1
+                    logger.exception("After-commit callback of %r failed", operation.func)
+            if error is not None:
+                operation.future.set_exception(error)
+            else:
+                operation.future.set_result(result)
+        db_session.close()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "operations": self.operations,
+            "average_batch": round(self.operations / self.batches, 2) if self.batches else None,
+            "largest_batch": self.largest_batch,
+            "failed_batches": self.failed_batches,
+            "failed_callbacks": self.failed_callbacks,
+            "queued": self._queue.qsize(),
+        }
+
+
+def benchmark_writes(database_path: str, operations: int = 2000, threads: int = 16, coalesced: bool = True,
+                     max_batch: int = 256) -> dict:
+    """
+    Completes `operations` freshly created tasks from `threads` threads on a scratch SQLite file,
+    directly (one transaction per call) or through a WriteCoalescer. Returns throughput figures.
+    """
+    from sqlalchemy import create_engine
+    from .models import Base
+    from .services import complete_task, create_task_for_user, create_user
+
+    engine = create_engine(f"sqlite:///{database_path}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    setup = Session()
+    user_id = create_user(setup, "Bench", "User", f"bench{time.time_ns()}", f"bench{time.time_ns()}@example.com", "benchmark").id
+    task_ids = [create_task_for_user(setup, user_id, f"Bench task {i}").id for i in range(operations)]
+    setup.close()
+
+    coalescer = WriteCoalescer(engine, max_batch=max_batch) if coalesced else None
+    errors = []
+
+    def worker(ids):
+        db_session = None if coalescer else Session()
+        for task_id in ids:
+            try:
+                if coalescer:
+                    coalescer.call(complete_task, task_id=task_id, user_id=user_id)
+                else:
+                    complete_task(db_session, task_id=task_id, user_id=user_id)
+            except Exception as e:
+                errors.append(e)
+        if db_session is not None:
+            db_session.close()
+
+    workers = [threading.Thread(target=worker, args=(task_ids[i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    summary = {
+        "mode": "coalesced" if coalesced else "direct",
+        "operations": operations,
+        "threads": threads,
+        "seconds": round(elapsed, 3),
+        "per_second": round(operations / elapsed, 1),
+        "errors": len(errors),
+    }
+    if coalescer:
+        coalescer.stop()
+        summary["coalescer"] = coalescer.stats()
+    engine.dispose()
+    return summary
@@ -0,0 +1,372 @@
+"""
+HTTP load generator for the web app.
+
+Each worker thread plays one virtual user with its own cookie jar: it registers,
+logs in, then loops over a weighted mix of scenarios (task list with and without
+filters, creating and completing tasks, leaderboard pages, logging in again) until
+the run ends. Latencies are recorded per route and reported as p50/p95/p99 along
+with status codes and error rates.
+
+Only the standard library is used on the client side. Redirects are not followed,
+so every request is measured on its own (a POST answered with 302 is a success).
+
+Run it through manage.py, against a running server or one spawned in-process (on a
+scratch database, or a copy made with generate-data):
+
+    python -m task_gamification_app.manage loadtest --spawn --concurrency 8 --duration 30
+    python -m task_gamification_app.manage loadtest --spawn --database bench.db
+    python -m task_gamification_app.manage loadtest --base-url http://127.0.0.1:5000 --mix my_tasks=5,leaderboard=1
+"""
+import datetime
+import http.cookiejar
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+_CSRF_TOKEN_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+_COMPLETE_TASK_RE = re.compile(r'/task/(\d+)/complete')
+_LEADERBOARD_PAGE_RE = re.compile(r'/leaderboard\?page=(\d+)')
+
+LOADTEST_PASSWORD = "loadtest-password"
+
+DEFAULT_MIX = {
+    "my_tasks": 30,
+    "my_tasks_filtered": 20,
+    "create_task": 15,
+    "complete_task": 15,
+    "leaderboard": 15,
+    "login": 5,
+}
+
+
+class LoadTestError(Exception):
+    """Raised when a virtual user cannot get into a state where it can run scenarios."""
+    pass
+
+
+def extract_csrf_token(html: str) -> Optional[str]:
+    match = _CSRF_TOKEN_RE.search(html)
+    return match.group(1) if match else None
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 for an empty list)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """Parses "my_tasks=5,leaderboard=1" into a scenario weight dict."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}'. Choose from: {', '.join(sorted(SCENARIOS))}.")
+        mix[name] = int(weight or 1)
+    if not mix or not any(mix.values()):
+        raise ValueError("The scenario mix needs at least one scenario with a positive weight.")
+    return mix
+
+
+class RouteStats:
+    """Latencies and status codes of one route; safe to update from several threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, latency: float, status: str, ok: bool):
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if not ok:
+                self.errors += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            count = len(latencies)
+            return {
+                "requests": count,
+                "errors": self.errors,
+                "error_rate": self.errors / count if count else 0.0,
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1] if latencies else 0.0,
+                "statuses": dict(self.statuses),
+            }
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None # Surfaces the 3xx as an HTTPError, which VirtualUser.request handles
+
+
+class VirtualUser:
+    """One simulated user with its own cookies, recording into the shared per-route stats."""
+
+    def __init__(self, base_url: str, stats: Dict[str, RouteStats], stats_lock: threading.Lock, rng: random.Random,
+                 timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.stats_lock = stats_lock
+        self.rng = rng
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+        self.username = f"lt{uuid.uuid4().hex[:12]}"
+        self.csrf_token: Optional[str] = None
+        self.pending_task_ids: List[int] = []
+        self.leaderboard_pages = 1
+
+    def _route_stats(self, route: str) -> RouteStats:
+        with self.stats_lock:
+            return self.stats.setdefault(route, RouteStats())
+
+    def request(self, route: str, method: str, path: str, form: Optional[dict] = None,
+                expect: Tuple[int, ...] = (200,)) -> Tuple[int, str]:
+        """
+        Sends one request and records it under `route`. Returns (status, body); status 0 means
+        the request failed below HTTP (connection refused, timeout, ...).
+        """
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                status, body = response.status, response.read().decode("utf-8", "replace")
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read().decode("utf-8", "replace")
+        except (urllib.error.URLError, OSError) as e:
+            self._route_stats(route).record(time.perf_counter() - started, type(e).__name__, ok=False)
+            return 0, ""
+        self._route_stats(route).record(time.perf_counter() - started, str(status), ok=status in expect)
+        return status, body
+
+    def _remember_page(self, html: str):
+        token = extract_csrf_token(html)
+        if token:
+            self.csrf_token = token
+        task_ids = [int(task_id) for task_id in _COMPLETE_TASK_RE.findall(html)]
+        if task_ids:
+            self.pending_task_ids = task_ids
+
+    # --- Setup ---
+
+    def register(self):
+        _, html = self.request("GET /register", "GET", "/register")
+        status, _ = self.request("POST /register", "POST", "/register", {
+            "csrf_token": extract_csrf_token(html) or "",
+            "first_name": "Load",
+            "last_name": "Test",
+            "username": self.username,
+            "email": f"{self.username}@loadtest.example.com",
+            "password": LOADTEST_PASSWORD,
+            "confirm_password": LOADTEST_PASSWORD,
+        }, expect=(302,))
+        if status != 302:
+            raise LoadTestError(f"Registering {self.username} failed with HTTP {status}.")
+
+    def login(self):
+        _, html = self.request("GET /login", "GET", "/login")
+        status, _ = self.request("POST /login", "POST", "/login", {
+            "csrf_token": extract_csrf_token(html) or "",
+            "username_or_email": self.username,
+            "password": LOADTEST_PASSWORD,
+        }, expect=(302,))
+        if status != 302:
+            raise LoadTestError(f"Logging in {self.username} failed with HTTP {status}.")
+
+    # --- Scenarios ---
+
+    def my_tasks(self):
+        _, html = self.request("GET /my_tasks", "GET", "/my_tasks")
+        self._remember_page(html)
+
+    def my_tasks_filtered(self):
+        day = (datetime.date.today() + datetime.timedelta(days=self.rng.randint(-3, 7))).isoformat()
+        params = self.rng.choice([
+            {"status": "Pending"},
+            {"status": "Completed"},
+            {"status": "All", "description": "report"},
+            {"status": "Pending", "due_date": day},
+            {"status": "Completed", "completion_date": datetime.date.today().isoformat()},
+        ])
+        _, html = self.request("GET /my_tasks?filters", "GET", "/my_tasks?" + urllib.parse.urlencode(params))
+        self._remember_page(html)
+
+    def create_task(self):
+        if not self.csrf_token:
+            self.my_tasks()
+        due = datetime.date.today() + datetime.timedelta(days=self.rng.randint(0, 14))
+        self.request("POST /my_tasks", "POST", "/my_tasks", {
+            "csrf_token": self.csrf_token or "",
+            "description": self.rng.choice(["Write report", "Review PR", "Plan sprint", "Water plants"]),
+            "due_date": due.isoformat(),
+            "create_submit": "Create Task",
+        }, expect=(302,))
+
+    def complete_task(self):
+        if not self.pending_task_ids:
+            self.create_task()
+            self.my_tasks_pending()
+        if not self.pending_task_ids:
+            return
+        task_id = self.pending_task_ids.pop(self.rng.randrange(len(self.pending_task_ids)))
+        self.request("POST /task/<id>/complete", "POST", f"/task/{task_id}/complete", {}, expect=(302,))
+
+    def my_tasks_pending(self):
+        _, html = self.request("GET /my_tasks?filters", "GET", "/my_tasks?status=Pending")
+        self._remember_page(html)
+
+    def leaderboard(self):
+        page = self.rng.randint(1, self.leaderboard_pages)
+        _, html = self.request("GET /leaderboard", "GET", f"/leaderboard?page={page}")
+        pages = [int(p) for p in _LEADERBOARD_PAGE_RE.findall(html)]
+        if pages:
+            self.leaderboard_pages = max(pages)
+
+    def relogin(self):
+        self.request("GET /logout", "GET", "/logout", expect=(302,))
+        self.login()
+        self.csrf_token = None # The session, and with it the CSRF secret, is new
+
+
+SCENARIOS: Dict[str, Callable[[VirtualUser], None]] = {
+    "my_tasks": VirtualUser.my_tasks,
+    "my_tasks_filtered": VirtualUser.my_tasks_filtered,
+    "create_task": VirtualUser.create_task,
+    "complete_task": VirtualUser.complete_task,
+    "leaderboard": VirtualUser.leaderboard,
+    "login": VirtualUser.relogin,
+}
+
+
+def run_load_test(
+    base_url: str,
+    concurrency: int = 4,
+    duration: float = 30.0,
+    mix: Optional[Dict[str, int]] = None,
+    ramp_up: float = 0.0,
+    seed: Optional[int] = None,
+) -> dict:
+    """
+    Runs `concurrency` virtual users against `base_url` for `duration` seconds (after setup)
+    and returns {"routes": {route: summary}, "seconds", "requests", "requests_per_second",
+    "setup_failures", "scenario_failures"}.
+    """
+    mix = mix or DEFAULT_MIX
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    stats: Dict[str, RouteStats] = {}
+    stats_lock = threading.Lock()
+    failures = {"setup": 0, "scenario": 0}
+    failures_lock = threading.Lock()
+    master_rng = random.Random(seed)
+    ready = threading.Barrier(concurrency + 1)
+    go = threading.Event()
+    deadline = [0.0]
+
+    def worker(index: int, rng: random.Random):
+        user = VirtualUser(base_url, stats, stats_lock, rng)
+        try:
+            time.sleep(ramp_up * index / concurrency)
+            user.register()
+            user.login()
+        except Exception:
+            with failures_lock:
+                failures["setup"] += 1
+            ready.wait()
+            return
+        ready.wait()
+        go.wait()
+        while time.monotonic() < deadline[0]:
+            scenario = SCENARIOS[rng.choices(names, weights)[0]]
+            try:
+                scenario(user)
+            except LoadTestError:
+                with failures_lock:
+                    failures["scenario"] += 1
+
+    threads = [
+        threading.Thread(target=worker, args=(i, random.Random(master_rng.random())), daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    ready.wait() # Setup requests (register, first login) are reported but not timed into the run
+    with stats_lock:
+        setup_requests = sum(len(s.latencies) for s in stats.values())
+    started = time.monotonic()
+    deadline[0] = started + duration
+    go.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    routes = {route: route_stats.summary() for route, route_stats in sorted(stats.items())}
+    total = sum(summary["requests"] for summary in routes.values()) - setup_requests
+    return {
+        "routes": routes,
+        "seconds": elapsed,
+        "requests": total,
+        "requests_per_second": total / elapsed if elapsed else 0.0,
+        "setup_failures": failures["setup"],
+        "scenario_failures": failures["scenario"],
+    }
+
+
+def print_results(results: dict):
+    print(f"\n{'Route':<28} {'reqs':>7} {'err%':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+    for route, s in results["routes"].items():
+        statuses = " ".join(f"{code}:{count}" for code, count in sorted(s["statuses"].items()))
+        print(f"{route:<28} {s['requests']:>7} {100 * s['error_rate']:>5.1f}% {1000 * s['p50']:>8.1f} "
+              f"{1000 * s['p95']:>8.1f} {1000 * s['p99']:>8.1f} {1000 * s['max']:>8.1f}  {statuses}")
+    print(f"\n{results['requests']} request(s) in {results['seconds']:.1f}s = "
+          f"{results['requests_per_second']:.1f} req/s "
+          f"({results['setup_failures']} setup failure(s), {results['scenario_failures']} scenario failure(s)).")
+
+
+def spawn_server(database: str, host: str = "127.0.0.1", port: int = 0):
+    """
+    Serves the Flask app from a background thread in this process and returns (server, base_url).
+    The app's sessions are bound to the SQLite file `database` (created and initialised if needed)
+    instead of the app database, since every run registers users and creates tasks that nothing
+    removes. The login/reset rate limits are raised unless they were configured explicitly, since
+    every virtual user comes from 127.0.0.1. Call server.shutdown() when done.
+    """
+    for name in ("LOGIN_RATE_LIMIT_BURST", "LOGIN_RATE_LIMIT_PER_MINUTE"):
+        os.environ.setdefault(name, "1000000")
+    from sqlalchemy import create_engine
+    from werkzeug.serving import make_server
+    from task_gamification_app.app import db
+    from task_gamification_app.app.write_coalescer import WriteCoalescer
+    from task_gamification_app.webapp import app, routes
+
+    if db.shard_set is not None:
+        raise LoadTestError("A spawned server uses one scratch database; unset DATABASE_SHARDS.")
+    scratch = create_engine(f"sqlite:///{database}")
+    db.init_db(scratch)
+    # Routes, forms and the leaderboard stream all open their sessions through this sessionmaker.
+    db.SessionLocal.configure(bind=scratch)
+    if routes.write_coalescer is not None:
+        routes.write_coalescer.stop()
+        routes.write_coalescer = WriteCoalescer(scratch, max_batch=routes.write_coalescer.max_batch,
+                                                linger=routes.write_coalescer.linger)
+
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
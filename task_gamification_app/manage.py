@@ -0,0 +1,469 @@
+"""
+Maintenance and background-job commands for the Task Gamification App.
+
+Run from the project root (the directory containing task_gamification_app), e.g.:
+
+    python -m task_gamification_app.manage reminders --loop --interval 300
+    python -m task_gamification_app.manage backup --keep 48 --verify
+    python -m task_gamification_app.manage generate-data --users 10000 --tasks-per-user 100 --database bench.db
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from task_gamification_app.app.db import SessionLocal, engine, init_db, shard_set
+from task_gamification_app.app.compact_storage import check_task_storage
+
+
+def _databases():
+    """(name, engine) of every database holding application tables: the one database, or each shard."""
+    if shard_set is None:
+        return [("database", engine)]
+    return list(shard_set.engines.items())
+
+
+def cmd_reminders(args):
+    from task_gamification_app.app.reminders import ReminderScanner
+
+    scanner = ReminderScanner(SessionLocal, lead_time=datetime.timedelta(hours=args.lead_hours))
+    if args.loop:
+        scanner.run_forever(interval_seconds=args.interval)
+    else:
+        summary = scanner.run_once()
+        print(f"Scanned {summary['start']:%Y-%m-%d %H:%M} -> {summary['end']:%Y-%m-%d %H:%M}: "
+              f"{summary['tasks']} task(s) for {summary['users']} user(s).")
+
+
+def cmd_rebuild_stats(args):
+    from task_gamification_app.app.stats import rebuild_user_stats
+
+    db_session = SessionLocal()
+    try:
+        rows = rebuild_user_stats(db_session)
+        db_session.commit()
+        print(f"Rebuilt stats for {rows} user(s).")
+    finally:
+        db_session.close()
+
+
+def cmd_archive(args):
+    from sqlalchemy.orm import Session
+    from task_gamification_app.app.archive import archive_completed_tasks
+
+    # The archive walks the tasks table by id, so each shard is archived on its own.
+    for name, target in _databases():
+        db_session = Session(bind=target)
+        try:
+            total = archive_completed_tasks(
+                db_session,
+                older_than=datetime.timedelta(days=args.older_than_days),
+                batch_size=args.batch_size,
+                max_batches=args.max_batches,
+                progress=lambda batch, total: print(f"  archived {batch} task(s), {total} so far"),
+            )
+            print(f"Archived {total} completed task(s) older than {args.older_than_days} day(s)"
+                  + (f" on {name}." if shard_set is not None else "."))
+        finally:
+            db_session.close()
+
+
+def _run_maintenance_pass(args, run_integrity_check: bool):
+    for name, target in _databases():
+        if shard_set is not None:
+            print(f"{name}:")
+        _run_maintenance_pass_on(target, args, run_integrity_check)
+
+
+def _run_maintenance_pass_on(engine, args, run_integrity_check: bool):
+    from task_gamification_app.app import maintenance
+
+    started = time.perf_counter()
+    if not args.skip_analyze:
+        maintenance.analyze(engine)
+        print("ANALYZE / PRAGMA optimize done.")
+    if not args.skip_vacuum:
+        result = maintenance.incremental_vacuum(engine, max_pages=args.vacuum_pages)
+        print(f"Incremental vacuum (auto_vacuum={result['auto_vacuum']}): freed {result['freed_pages']} page(s) "
+              f"({result['freed_bytes'] / 1024:.1f} KiB), {result['free_pages_left']} free page(s) left.")
+    if run_integrity_check:
+        messages = maintenance.integrity_check(engine)
+        print("Integrity check: " + ("ok" if messages == ["ok"] else "FAILED"))
+        for message in messages if messages != ["ok"] else []:
+            print(f"  {message}")
+    if args.report:
+        maintenance.print_report(engine)
+    print(f"Maintenance pass finished in {time.perf_counter() - started:.2f}s.")
+
+
+def cmd_maintenance(args):
+    if not args.loop:
+        _run_maintenance_pass(args, run_integrity_check=args.integrity)
+        return
+    last_integrity_check = None
+    while True:
+        due = last_integrity_check is None or time.monotonic() - last_integrity_check >= args.integrity_interval
+        _run_maintenance_pass(args, run_integrity_check=due)
+        if due:
+            last_integrity_check = time.monotonic()
+        time.sleep(args.interval)
+
+
+def _print_copy_progress(done, total):
+    print(f"\r  {done}/{total} page(s) ({100.0 * done / total if total else 100:.0f}%)", end="", flush=True)
+
+
+def _print_copy_summary(verb, summary):
+    print(f"\n{verb} {summary['bytes'] / 1024:.1f} KiB in {summary['seconds']:.2f}s "
+          f"({summary['bytes_per_second'] / 1024 / 1024:.1f} MiB/s, {summary['steps']} step(s), "
+          f"{summary['restarts']} restart(s)) -> {summary['path']}")
+
+
+def cmd_backup(args):
+    from task_gamification_app.app import backup
+
+    if args.keep < 0:
+        print("--keep must be 0 (keep all backups) or more.")
+        sys.exit(2)
+    destination = args.output or backup.default_backup_path(args.directory)
+    summary = backup.backup_database(
+        backup.database_path(engine),
+        destination,
+        pages_per_step=args.pages_per_step,
+        sleep=args.sleep,
+        progress=None if args.quiet else _print_copy_progress,
+    )
+    _print_copy_summary("Backed up", summary)
+    if args.verify:
+        _print_verification(backup.verify_backup(destination))
+    if args.keep and not args.output:
+        for path in backup.prune_backups(args.directory, args.keep):
+            print(f"Removed old backup {path}")
+
+
+def _print_verification(result):
+    if result["problems"]:
+        print("Integrity check: FAILED")
+        for message in result["problems"]:
+            print(f"  {message}")
+        sys.exit(1)
+    print("Integrity check: ok")
+    source_counts = result["source_row_counts"]
+    for table, count in result["row_counts"].items():
+        line = f"  {table:<24} {count:>10}"
+        if source_counts is not None:
+            line += f"   (live: {source_counts.get(table, 0)})"
+        print(line)
+
+
+def cmd_verify_backup(args):
+    from task_gamification_app.app import backup
+
+    _print_verification(backup.verify_backup(args.backup, source_path=backup.database_path(engine)))
+
+
+def cmd_restore(args):
+    from task_gamification_app.app import backup
+
+    target = backup.database_path(engine)
+    if not args.yes:
+        answer = input(f"Overwrite {target} with {args.backup}? Stop the app first. [y/N] ")
+        if answer.strip().lower() != "y":
+            print("Restore cancelled.")
+            return
+    engine.dispose() # Drop pooled connections to the database being replaced
+    summary = backup.restore_database(args.backup, target, progress=_print_copy_progress)
+    _print_copy_summary("Restored", summary)
+
+
+def cmd_loadtest(args):
+    import tempfile
+    from task_gamification_app import loadtest
+
+    if args.database and not args.spawn:
+        print("--database only applies to a server spawned with --spawn.")
+        sys.exit(2)
+    server = None
+    base_url = args.base_url
+    with tempfile.TemporaryDirectory() as directory:
+        if args.spawn:
+            database = args.database or os.path.join(directory, "loadtest.db")
+            server, base_url = loadtest.spawn_server(database)
+            print(f"Serving the app in-process at {base_url} (database: {database}).")
+        try:
+            print(f"Running {args.concurrency} virtual user(s) against {base_url} for {args.duration:.0f}s...")
+            results = loadtest.run_load_test(
+                base_url,
+                concurrency=args.concurrency,
+                duration=args.duration,
+                mix=loadtest.parse_mix(args.mix) if args.mix else None,
+                ramp_up=args.ramp_up,
+                seed=args.seed,
+            )
+            loadtest.print_results(results)
+        finally:
+            if server:
+                server.shutdown()
+
+
+def cmd_bench_writes(args):
+    import tempfile
+    from task_gamification_app.app.write_coalescer import benchmark_writes
+
+    with tempfile.TemporaryDirectory() as directory:
+        for coalesced in (False, True):
+            path = os.path.join(directory, f"bench-{'coalesced' if coalesced else 'direct'}.db")
+            summary = benchmark_writes(path, operations=args.operations, threads=args.threads,
+                                       coalesced=coalesced, max_batch=args.max_batch)
+            line = (f"{summary['mode']:>9}: {summary['operations']} completions from {summary['threads']} threads "
+                    f"in {summary['seconds']:.2f}s = {summary['per_second']:.0f}/s, {summary['errors']} error(s)")
+            if coalesced:
+                line += f", {summary['coalescer']['batches']} batches (average {summary['coalescer']['average_batch']})"
+            print(line)
+
+
+def cmd_generate_data(args):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from task_gamification_app.app.datagen import generate_dataset
+    from task_gamification_app.app.models import Base
+
+    if shard_set is not None and not args.database:
+        print("generate-data writes ids directly and needs --database when DATABASE_SHARDS is set.")
+        sys.exit(2)
+    target = create_engine(f"sqlite:///{args.database}") if args.database else engine
+    if args.database:
+        Base.metadata.create_all(target)
+    db_session = Session(bind=target)
+    try:
+        summary = generate_dataset(
+            db_session,
+            users=args.users,
+            tasks_per_user=args.tasks_per_user,
+            seed=args.seed,
+            password=args.password,
+            now=datetime.datetime.fromisoformat(args.now) if args.now else None,
+            progress=lambda done, total: print(f"\r  {done}/{total} user(s)", end="", flush=True),
+        )
+        db_session.commit()
+    finally:
+        db_session.close()
+    print(f"\nGenerated {summary['users']} user(s) (ids from {summary['first_user_id']}) and {summary['tasks']} task(s), "
+          f"{summary['completed']} completed, in {summary['seconds']:.1f}s ({summary['stats_seconds']:.1f}s of it "
+          f"rebuilding stats). Password for all of them: {args.password}")
+
+
+def cmd_convert_task_storage(args):
+    from sqlalchemy import create_engine
+    from task_gamification_app.app import compact_storage
+
+    targets = [(args.database, create_engine(f"sqlite:///{args.database}"))] if args.database else _databases()
+    encoding = "compact" if compact_storage.COMPACT_TASK_STORAGE else "text"
+    for name, target in targets:
+        if len(targets) > 1:
+            print(f"{name}:")
+        started = time.perf_counter()
+        with target.begin() as conn:
+            converted = compact_storage.convert_task_tables(conn)
+        if not converted:
+            print(f"The task tables are already in the {encoding} encoding (COMPACT_TASK_STORAGE decides which).")
+            continue
+        for table, rows in converted.items():
+            print(f"Converted {rows} row(s) of {table} to the {encoding} encoding.")
+        print(f"Done in {time.perf_counter() - started:.1f}s.")
+        if args.vacuum:
+            with target.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            print("VACUUM done.")
+    if shard_set is not None and not args.database:
+        shard_set.prepare() # The rebuilt tables start their id sequences afresh
+
+
+def cmd_bench_storage(args):
+    import shutil
+    import subprocess
+    import tempfile
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from task_gamification_app.app import compact_storage
+    from task_gamification_app.app.datagen import generate_dataset
+    from task_gamification_app.app.models import Base
+
+    now = datetime.datetime(2026, 1, 1)
+    current = "compact" if compact_storage.COMPACT_TASK_STORAGE else "text"
+    other = "text" if current == "compact" else "compact"
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {current: os.path.join(directory, f"{current}.db"), other: os.path.join(directory, f"{other}.db")}
+        target = create_engine(f"sqlite:///{paths[current]}")
+        Base.metadata.create_all(target)
+        db_session = Session(bind=target)
+        generate_dataset(db_session, users=args.users, tasks_per_user=args.tasks_per_user, seed=args.seed, now=now)
+        db_session.commit()
+        db_session.close()
+        target.dispose()
+        print(f"Generated {args.users * args.tasks_per_user} task(s) in the {current} encoding; converting a copy...")
+
+        # The encoding is fixed per process, so the copy is converted by a child process with the other setting.
+        shutil.copyfile(paths[current], paths[other])
+        env = dict(os.environ, COMPACT_TASK_STORAGE="true" if other == "compact" else "false")
+        subprocess.run([sys.executable, "-m", "task_gamification_app.app.compact_storage", paths[other]],
+                       env=env, check=True, stdout=subprocess.DEVNULL)
+
+        results = compact_storage.benchmark_storage(paths, now=now, repeat=args.repeat)
+    text, compact = results["text"], results["compact"]
+    print(f"\n{'':48} {'text':>12} {'compact':>12} {'change':>8}")
+    rows = [("database file (MiB)", text["file_bytes"] / 2**20, compact["file_bytes"] / 2**20)]
+    if text["objects"]:
+        rows.append(("tasks table + indexes (MiB)", text["tasks_bytes"] / 2**20, compact["tasks_bytes"] / 2**20))
+        rows += [(f"  {name} (MiB)", size / 2**20, compact["objects"].get(name, 0) / 2**20)
+                 for name, size in sorted(text["objects"].items())]
+    rows += [(f"{name} (ms)", ms, compact["query_ms"][name]) for name, ms in text["query_ms"].items()]
+    for label, before, after in rows:
+        change = f"{(after - before) / before * 100:+.0f}%" if before else ""
+        print(f"{label:48} {before:>12.2f} {after:>12.2f} {change:>8}")
+
+
+def cmd_profile_token(args):
+    from task_gamification_app.webapp import app
+    from task_gamification_app.webapp.profiling import PROFILE_HEADER, make_profile_token
+
+    print(f"{PROFILE_HEADER}: {make_profile_token(app.config['SECRET_KEY'])}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="manage", description="Task Gamification App management commands.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reminders = subparsers.add_parser("reminders", help="Send reminders for tasks that are due soon or overdue.")
+    reminders.add_argument("--lead-hours", type=float, default=24, help="Remind this many hours before the due date.")
+    reminders.add_argument("--loop", action="store_true", help="Keep running, scanning every --interval seconds.")
+    reminders.add_argument("--interval", type=float, default=300, help="Seconds between scans with --loop.")
+    reminders.set_defaults(func=cmd_reminders)
+
+    rebuild_stats = subparsers.add_parser("rebuild-stats", help="Recompute the user_stats table from the tasks table.")
+    rebuild_stats.set_defaults(func=cmd_rebuild_stats)
+
+    archive = subparsers.add_parser("archive", help="Move old completed tasks into tasks_archive.")
+    archive.add_argument("--older-than-days", type=float, default=float(os.environ.get("ARCHIVE_AFTER_DAYS", 90)),
+                         help="Archive tasks completed more than this many days ago (default: $ARCHIVE_AFTER_DAYS or 90).")
+    archive.add_argument("--batch-size", type=int, default=1000, help="Tasks moved per transaction.")
+    archive.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches (run again to resume).")
+    archive.set_defaults(func=cmd_archive)
+
+    maintenance = subparsers.add_parser(
+        "maintenance", help="ANALYZE, incremental vacuum, integrity check and a size/query-plan report.")
+    maintenance.add_argument("--skip-analyze", action="store_true", help="Do not refresh planner statistics.")
+    maintenance.add_argument("--skip-vacuum", action="store_true", help="Do not run the incremental vacuum.")
+    maintenance.add_argument("--vacuum-pages", type=int, default=None,
+                             help="Free at most this many pages per pass (default: all).")
+    maintenance.add_argument("--integrity", action="store_true", help="Run PRAGMA integrity_check (single run).")
+    maintenance.add_argument("--report", action="store_true", help="Print table/index sizes and service query plans.")
+    maintenance.add_argument("--loop", action="store_true", help="Keep running every --interval seconds.")
+    maintenance.add_argument("--interval", type=float, default=3600, help="Seconds between passes with --loop.")
+    maintenance.add_argument("--integrity-interval", type=float, default=86400,
+                             help="With --loop, run the integrity check at most this often (seconds).")
+    maintenance.set_defaults(func=cmd_maintenance)
+
+    backup = subparsers.add_parser("backup", help="Copy the live database without blocking writers.")
+    backup.add_argument("--directory", default=os.environ.get("BACKUP_DIR", "backups"),
+                        help="Where timestamped backups go (default: $BACKUP_DIR or ./backups).")
+    backup.add_argument("--output", default=None, help="Write the backup to this exact path instead.")
+    backup.add_argument("--pages-per-step", type=int, default=1024, help="Pages copied per step of the backup.")
+    backup.add_argument("--sleep", type=float, default=0.01, help="Seconds to pause between steps.")
+    backup.add_argument("--keep", type=int, default=0,
+                        help="Keep only the newest N timestamped backups in --directory (0 keeps all).")
+    backup.add_argument("--verify", action="store_true", help="Integrity-check the backup afterwards.")
+    backup.add_argument("--quiet", action="store_true", help="Do not print per-step progress.")
+    backup.set_defaults(func=cmd_backup)
+
+    verify_backup = subparsers.add_parser(
+        "verify-backup", help="Integrity-check a backup and compare its row counts with the live database.")
+    verify_backup.add_argument("backup", help="Path of the backup file.")
+    verify_backup.set_defaults(func=cmd_verify_backup)
+
+    restore = subparsers.add_parser("restore", help="Replace the live database with a (verified) backup.")
+    restore.add_argument("backup", help="Path of the backup file.")
+    restore.add_argument("--yes", action="store_true", help="Do not ask for confirmation.")
+    restore.set_defaults(func=cmd_restore)
+
+    loadtest = subparsers.add_parser("loadtest", help="Drive the web routes with concurrent virtual users.")
+    target = loadtest.add_mutually_exclusive_group()
+    target.add_argument("--base-url", default="http://127.0.0.1:5000", help="Server to test (default: %(default)s).")
+    target.add_argument("--spawn", action="store_true",
+                        help="Serve the app from this process on a free port, on a scratch database.")
+    loadtest.add_argument("--database", default=None,
+                          help="With --spawn, serve this SQLite file (e.g. made by generate-data) instead of a "
+                               "temporary one. The run adds users and tasks to it.")
+    loadtest.add_argument("--concurrency", type=int, default=4, help="Number of virtual users.")
+    loadtest.add_argument("--duration", type=float, default=30, help="Seconds to run after setup.")
+    loadtest.add_argument("--ramp-up", type=float, default=0, help="Spread the users' start over this many seconds.")
+    loadtest.add_argument("--mix", default=None,
+                          help="Scenario weights, e.g. my_tasks=5,my_tasks_filtered=2,create_task=1,complete_task=1,"
+                               "leaderboard=2,login=1 (default: a read-heavy mix).")
+    loadtest.add_argument("--seed", type=int, default=None, help="Seed for a reproducible scenario sequence.")
+    loadtest.set_defaults(func=cmd_loadtest)
+
+    bench_writes = subparsers.add_parser(
+        "bench-writes", help="Compare task-completion throughput with and without write coalescing (scratch database).")
+    bench_writes.add_argument("--operations", type=int, default=2000, help="Task completions per run.")
+    bench_writes.add_argument("--threads", type=int, default=16, help="Concurrent writer threads.")
+    bench_writes.add_argument("--max-batch", type=int, default=256, help="Largest batch of the coalescer.")
+    bench_writes.set_defaults(func=cmd_bench_writes)
+
+    generate_data = subparsers.add_parser(
+        "generate-data", help="Bulk-insert synthetic users and tasks for load tests and benchmarks.")
+    generate_data.add_argument("--users", type=int, default=1000, help="Number of users to add.")
+    generate_data.add_argument("--tasks-per-user", type=int, default=100, help="Tasks per generated user.")
+    generate_data.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data.")
+    generate_data.add_argument("--password", default="password", help="Password shared by all generated users.")
+    generate_data.add_argument("--now", default=None,
+                               help="Reference time (ISO format) the history ends at (default: today 00:00 UTC).")
+    generate_data.add_argument("--database", default=None,
+                               help="Write into this SQLite file (created if needed) instead of the app database.")
+    generate_data.set_defaults(func=cmd_generate_data)
+
+    convert_storage = subparsers.add_parser(
+        "convert-task-storage",
+        help="Rewrite the task tables in the encoding COMPACT_TASK_STORAGE selects (stop the app first).")
+    convert_storage.add_argument("--database", default=None, help="Convert this SQLite file instead of the app database.")
+    convert_storage.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the file.")
+    convert_storage.set_defaults(func=cmd_convert_task_storage)
+
+    bench_storage = subparsers.add_parser(
+        "bench-storage", help="Compare size and query times of the text and compact task encodings (scratch databases).")
+    bench_storage.add_argument("--users", type=int, default=2000, help="Generated users.")
+    bench_storage.add_argument("--tasks-per-user", type=int, default=100, help="Generated tasks per user.")
+    bench_storage.add_argument("--seed", type=int, default=0, help="Random seed of the generated data.")
+    bench_storage.add_argument("--repeat", type=int, default=5, help="Runs per query; the best time is reported.")
+    bench_storage.set_defaults(func=cmd_bench_storage)
+
+    profile_token = subparsers.add_parser(
+        "profile-token", help="Print a signed header that makes requests get profiled (needs PROFILING_ENABLED).")
+    profile_token.set_defaults(func=cmd_profile_token)
+
+    return parser
+
+
+# Commands that work on one database file, which a sharded setup does not have.
+_SINGLE_DATABASE_COMMANDS = {cmd_backup, cmd_verify_backup, cmd_restore}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if shard_set is not None and args.func in _SINGLE_DATABASE_COMMANDS:
+        print("This command works on a single database file; it is not available with DATABASE_SHARDS.")
+        sys.exit(2)
+    init_db() # Make sure tables added since the last deployment exist
+    if args.func is not cmd_convert_task_storage:
+        for _, target in _databases():
+            check_task_storage(target)
+    try:
+        args.func(args)
+    except KeyboardInterrupt:
+        print("Interrupted.")
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
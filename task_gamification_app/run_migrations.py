@@ -4,17 +4,19 @@ from sqlalchemy import create_engine, inspect, Table, MetaData, Column, String
 from alembic.operations import Operations
 from alembic.migration import MigrationContext
 
+from task_gamification_app.app.data_migrations import interrupted_migrations
+
 DATABASE_URL = "sqlite:///./task_gamification.db"
 MIGRATIONS_DIR = "task_gamification_app/app/migrations/versions"
 
 def get_migration_files():
-    """Returns a sorted list of migration files."""
+    """Returns the migration files ordered by their numeric prefix (so that 10_... runs after 9_...)."""
     files = [f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".py") and f != "__init__.py"]
-    return sorted(files)
+    return sorted(files, key=lambda f: int(f.split("_", 1)[0]))
 
-def run_migrations():
-    """Runs all pending migrations."""
-    engine = create_engine(DATABASE_URL)
+def run_migrations(database_url=DATABASE_URL):
+    """Runs all pending migrations (on `database_url`; a sharded setup runs them on every shard)."""
+    engine = create_engine(database_url)
     conn = engine.connect()
     ctx = MigrationContext.configure(conn)
     op = Operations(ctx)
@@ -41,6 +43,10 @@ def run_migrations():
         result = connection.execute(text("SELECT version_num FROM alembic_version"))
         ran_migrations = {row[0] for row in result}
 
+    # Backfills that were interrupted (see app/data_migrations.py) resume where they stopped.
+    for checkpoint in interrupted_migrations(engine):
+        print(f"Data migration {checkpoint.name} was interrupted after {checkpoint.rows_done}/{checkpoint.rows_total} row(s); it will resume.")
+
     for migration_file in migration_files:
         migration_name = os.path.splitext(migration_file)[0]
         if migration_name not in ran_migrations:
@@ -11,8 +11,11 @@ import sys
 # work correctly.
 
 # The imports are now absolute, consistent with the rest of the application.
+from sqlalchemy import create_engine
+
 from task_gamification_app.webapp import app
-from task_gamification_app.app.db import init_db
+from task_gamification_app.app.db import database_urls, init_db, shard_set
+from task_gamification_app.app.compact_storage import check_task_storage
 from task_gamification_app.run_migrations import run_migrations
 
 if __name__ == '__main__':
@@ -26,8 +29,13 @@ if __name__ == '__main__':
 
     print("Running database migrations (if any)...")
     try:
-        run_migrations()
+        for database_url in database_urls(): # Every shard when DATABASE_SHARDS > 1
+            run_migrations(database_url)
         print("Database migrations check complete.")
+        if shard_set is not None:
+            shard_set.prepare() # Re-seeds the shards' id ranges if a migration rebuilt a table
+        for database_url in database_urls():
+            check_task_storage(create_engine(database_url)) # COMPACT_TASK_STORAGE must match how the task tables are stored
     except Exception as e:
         print(f"Error during database migrations: {e}")
         print("Please check your database configuration and migration scripts.")
@@ -1 +1,5 @@
 # This file makes the 'tests' directory a Python package.
+import os
+
+# Most of the suite's wall time used to go into bcrypt; hash test passwords with the cheapest profile.
+os.environ.setdefault('PASSWORD_HASH_PROFILE', 'fast')
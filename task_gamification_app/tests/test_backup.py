@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.models import Base, User, Task
+from task_gamification_app.app import backup
+
+
+class TestBackup(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'live.db')
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        Base.metadata.create_all(bind=self.engine)
+        session = sessionmaker(bind=self.engine)()
+        user = User(username="alice", email="alice@example.com", password_hash="x")
+        session.add(user)
+        session.flush()
+        session.add_all([Task(description="x" * 500, user_id=user.id) for _ in range(300)])
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def _count(self, path, table="tasks"):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_backup_in_steps_reports_progress(self):
+        """Test that a chunked backup copies everything and reports progress per step."""
+        destination = os.path.join(self.tmp.name, 'out', 'backup.db')
+        calls = []
+        summary = backup.backup_database(self.db_path, destination, pages_per_step=5, sleep=0,
+                                         progress=lambda done, total: calls.append((done, total)))
+
+        self.assertGreater(summary["steps"], 1)
+        self.assertEqual(calls[-1][0], calls[-1][1])
+        self.assertEqual(summary["path"], destination)
+        self.assertFalse(os.path.exists(destination + ".partial"))
+        self.assertEqual(self._count(destination), 300)
+        self.assertEqual(backup.verify_backup(destination)["problems"], [])
+
+    def test_backup_completes_while_source_is_written(self):
+        """Test that concurrent writes restart the copy but cannot starve it."""
+        destination = os.path.join(self.tmp.name, 'backup.db')
+        writer = sqlite3.connect(self.db_path)
+
+        def write_between_steps(done, total):
+            writer.execute("INSERT INTO tasks (description, status, creation_date, user_id) "
+                           "VALUES ('live', 'PENDING', '2024-01-01 00:00:00', 1)")
+            writer.commit()
+
+        try:
+            summary = backup.backup_database(self.db_path, destination, pages_per_step=5, sleep=0,
+                                             max_restarts=2, progress=write_between_steps)
+        finally:
+            writer.close()
+
+        self.assertGreaterEqual(summary["restarts"], 1)
+        self.assertEqual(backup.verify_backup(destination)["problems"], [])
+        self.assertGreaterEqual(self._count(destination), 300)
+
+    def test_restore_replaces_live_database(self):
+        """Test restoring a backup over a database that changed since."""
+        destination = os.path.join(self.tmp.name, 'backup.db')
+        backup.backup_database(self.db_path, destination, sleep=0)
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM tasks")
+        self.engine.dispose()
+
+        backup.restore_database(destination, self.db_path)
+        self.assertEqual(self._count(self.db_path), 300)
+
+    def test_restore_refuses_damaged_backup(self):
+        """Test that a file that is not a valid database is never restored."""
+        damaged = os.path.join(self.tmp.name, 'damaged.db')
+        with open(damaged, 'wb') as f:
+            f.write(b"not a database" * 100)
+        with self.assertRaises(backup.BackupError):
+            backup.restore_database(damaged, self.db_path)
+        self.assertEqual(self._count(self.db_path), 300)
+
+    def test_verify_compares_row_counts_with_source(self):
+        destination = os.path.join(self.tmp.name, 'backup.db')
+        backup.backup_database(self.db_path, destination, sleep=0)
+        result = backup.verify_backup(destination, source_path=self.db_path)
+        self.assertEqual(result["row_counts"], result["source_row_counts"])
+        self.assertEqual(result["row_counts"]["users"], 1)
+
+    def test_prune_keeps_newest_backups(self):
+        directory = os.path.join(self.tmp.name, 'backups')
+        os.makedirs(directory)
+        names = [f"{backup.BACKUP_FILE_PREFIX}2024010{i}-000000.db" for i in range(1, 5)]
+        for name in names:
+            open(os.path.join(directory, name), 'w').close()
+
+        removed = backup.prune_backups(directory, keep=2)
+        self.assertEqual(sorted(os.path.basename(p) for p in removed), names[:2])
+        self.assertEqual(sorted(os.listdir(directory)), names[2:])
+
+        for keep in (0, -1):
+            with self.assertRaises(ValueError):
+                backup.prune_backups(directory, keep=keep)
+        self.assertEqual(sorted(os.listdir(directory)), names[2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import datetime
+import os
+import sys
+import unittest
+
+from sqlalchemy import Column, DateTime, Enum, Integer, MetaData, Table, create_engine, select
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.compact_storage import (
+    EpochMicroseconds,
+    IntegerEnum,
+    _converted,
+    day_of,
+    seconds_between,
+    to_epoch_microseconds,
+)
+from task_gamification_app.app.models import TASK_STATUS_CODES, TaskStatus
+
+CODES = tuple(TASK_STATUS_CODES.items())
+TIMES = [
+    datetime.datetime(2026, 3, 1, 12, 30, 5, 123456),
+    datetime.datetime(2026, 3, 1, 23, 59, 59),
+    datetime.datetime(1999, 12, 31, 0, 0, 0, 1),
+]
+
+
+class TestCompactTypes(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(self.engine.dispose)
+        metadata = MetaData()
+        self.compact = Table(
+            "compact", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("status", IntegerEnum(TaskStatus, CODES)),
+            Column("created", EpochMicroseconds()),
+            Column("done", EpochMicroseconds()),
+        )
+        metadata.create_all(self.engine)
+
+    def test_round_trip(self):
+        """Test that members and datetimes read back exactly, stored as integers."""
+        with self.engine.begin() as conn:
+            conn.execute(self.compact.insert(), [
+                {"status": TaskStatus.COMPLETED, "created": TIMES[0], "done": TIMES[1]},
+                {"status": "PENDING", "created": TIMES[2], "done": None},
+            ])
+            rows = conn.execute(select(self.compact.c.status, self.compact.c.created, self.compact.c.done)
+                                .order_by(self.compact.c.id)).all()
+            raw = conn.exec_driver_sql("SELECT typeof(status), typeof(created), typeof(done) FROM compact").all()
+        self.assertEqual(rows, [(TaskStatus.COMPLETED, TIMES[0], TIMES[1]), (TaskStatus.PENDING, TIMES[2], None)])
+        self.assertEqual(raw, [("integer", "integer", "integer"), ("integer", "integer", "null")])
+
+    def test_comparisons_and_expressions(self):
+        with self.engine.begin() as conn:
+            conn.execute(self.compact.insert(), [{"status": TaskStatus.COMPLETED, "created": TIMES[0], "done": TIMES[1]}])
+            c = self.compact.c
+            found = conn.execute(select(c.id).where(c.created >= TIMES[0], c.status == TaskStatus.COMPLETED)).scalar()
+            row = conn.execute(select(seconds_between(c.done, c.created), day_of(c.done))).one()
+        self.assertEqual(found, 1)
+        self.assertAlmostEqual(row[0], (TIMES[1] - TIMES[0]).total_seconds(), places=6)
+        self.assertEqual(row[1], "2026-03-01")
+
+    def test_aware_datetimes_are_stored_as_utc(self):
+        aware = datetime.datetime(2026, 3, 1, 14, 30, 5, 123456, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+        self.assertEqual(to_epoch_microseconds(aware), to_epoch_microseconds(TIMES[0]))
+
+
+class TestConversionSql(unittest.TestCase):
+    """The INSERT ... SELECT expressions against values as the default types store them."""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(self.engine.dispose)
+
+    def convert(self, column, value):
+        with self.engine.connect() as conn:
+            return conn.exec_driver_sql(f"SELECT {_converted(column)} FROM (SELECT ? AS {column.name})", (value,)).scalar()
+
+    def test_text_to_compact(self):
+        for value in TIMES:
+            stored = value.isoformat(" ", "microseconds") if value.microsecond else value.isoformat(" ")
+            self.assertEqual(self.convert(Column("due_date", EpochMicroseconds()), stored), to_epoch_microseconds(value))
+        for member, code in CODES:
+            self.assertEqual(self.convert(Column("status", IntegerEnum(TaskStatus, CODES)), member.name), code)
+
+    def test_compact_to_text(self):
+        for value in TIMES:
+            stored = self.convert(Column("due_date", DateTime()), to_epoch_microseconds(value))
+            self.assertEqual(stored, value.isoformat(" ", "microseconds"))
+        for member, code in CODES:
+            self.assertEqual(self.convert(Column("status", Enum(TaskStatus)), code), member.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
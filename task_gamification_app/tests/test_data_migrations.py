@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, create_engine, insert, select
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.data_migrations import backfill, interrupted_migrations
+
+# A scratch table, so the framework is tested independently of the application's schema.
+items = Table(
+    "backfill_items",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("done", Boolean, nullable=False),
+)
+
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.engine = create_engine(f"sqlite:///{os.path.join(tmp.name, 'test.db')}")
+        self.addCleanup(self.engine.dispose)
+        items.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(insert(items), [{"description": f"item {i}", "done": bool(i % 2)} for i in range(95)])
+
+    def run_backfill(self, action, **kwargs):
+        kwargs.setdefault("chunk_size", 10)
+        return backfill(self.engine, "test_backfill", items, action, pause_ratio=0, progress=None, **kwargs)
+
+    def descriptions(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(items.c.description).order_by(items.c.id)).scalars().all()
+
+    def test_update_statement(self):
+        """Test that an UPDATE runs over every matching row, once, and is not repeated."""
+        checkpoint = self.run_backfill(items.update().values(description=items.c.description + " (done)"),
+                                       where=items.c.done)
+        self.assertIsNotNone(checkpoint.completed_at)
+        self.assertEqual((checkpoint.rows_done, checkpoint.rows_total), (47, 47))
+        self.assertEqual(self.descriptions()[:3], ["item 0", "item 1 (done)", "item 2"])
+
+        self.run_backfill(items.update().values(description=items.c.description + " (again)"))
+        self.assertNotIn("again", " ".join(self.descriptions()))
+
+    def test_resumes_after_last_chunk(self):
+        seen = []
+
+        def record(connection, after_key, upto_key):
+            keys = connection.execute(select(items.c.id).where(items.c.id > (after_key or 0), items.c.id <= upto_key)).scalars().all()
+            seen.extend(keys)
+            return len(keys)
+
+        checkpoint = self.run_backfill(record, max_chunks=3)
+        self.assertIsNone(checkpoint.completed_at)
+        self.assertEqual((checkpoint.rows_done, checkpoint.last_key), (len(seen), seen[-1]))
+        self.assertLess(len(seen), 95)
+        self.assertEqual([c.name for c in interrupted_migrations(self.engine)], ["test_backfill"])
+
+        checkpoint = self.run_backfill(record)
+        self.assertIsNotNone(checkpoint.completed_at)
+        self.assertEqual(checkpoint.rows_done, 95)
+        self.assertEqual(sorted(seen), sorted(set(seen)))
+        self.assertEqual(len(seen), 95)
+        self.assertEqual(interrupted_migrations(self.engine), [])
+
+    def test_failed_chunk_is_rolled_back_with_its_checkpoint(self):
+        def rename(connection, after_key, upto_key):
+            if after_key is not None and after_key >= 20:
+                raise RuntimeError("crash")
+            return connection.execute(items.update().values(description="renamed")
+                                      .where(items.c.id > (after_key or 0), items.c.id <= upto_key)).rowcount
+
+        self.assertRaises(RuntimeError, self.run_backfill, rename)
+        checkpoint = interrupted_migrations(self.engine)[0]
+        self.assertGreaterEqual(checkpoint.last_key, 20)
+        self.assertEqual(self.descriptions().count("renamed"), checkpoint.rows_done)
+        self.assertEqual(self.descriptions()[checkpoint.last_key:], [f"item {i}" for i in range(checkpoint.last_key, 95)])
+
+
+if __name__ == '__main__':
+    unittest.main()
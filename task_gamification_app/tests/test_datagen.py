@@ -0,0 +1,56 @@
+import datetime
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.datagen import generate_dataset
+from task_gamification_app.app.models import Base, Task, TaskStatus, User
+from task_gamification_app.app.services import POINTS_PER_TASK, create_user, get_user_stats, verify_user_login
+
+NOW = datetime.datetime(2026, 1, 15)
+
+
+class TestGenerateDataset(unittest.TestCase):
+    def make_session(self):
+        engine = create_engine('sqlite:///:memory:', connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        db_session = sessionmaker(bind=engine, autoflush=False)()
+        self.addCleanup(db_session.close)
+        return db_session
+
+    def test_rows_are_consistent(self):
+        db_session = self.make_session()
+        existing = create_user(db_session, "Real", "User", "real", "real@example.com", "password123")
+        summary = generate_dataset(db_session, users=30, tasks_per_user=20, seed=7, now=NOW, users_per_chunk=8)
+        db_session.commit()
+
+        self.assertEqual(summary["first_user_id"], existing.id + 1)
+        self.assertEqual(db_session.query(Task).count(), 600)
+        for user in db_session.query(User).filter(User.id != existing.id):
+            completed = [task for task in user.tasks if task.status == TaskStatus.COMPLETED]
+            self.assertEqual(user.points, len(completed) * POINTS_PER_TASK)
+            self.assertTrue(all(task.creation_date <= task.completion_date <= NOW for task in completed))
+            stats = get_user_stats(db_session, user.id)
+            self.assertEqual((stats["completed_count"], stats["pending_count"]), (len(completed), 20 - len(completed)))
+        self.assertIsNotNone(verify_user_login(db_session, "loadgen2", "password"))
+
+    def test_same_seed_same_data(self):
+        def dataset(seed):
+            db_session = self.make_session()
+            generate_dataset(db_session, users=5, tasks_per_user=10, seed=seed, now=NOW)
+            return [(t.description, t.status, t.creation_date, t.due_date, t.completion_date, t.user_id)
+                    for t in db_session.query(Task).order_by(Task.id)]
+
+        self.assertEqual(dataset(1), dataset(1))
+        self.assertNotEqual(dataset(1), dataset(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import threading
+import unittest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.events import EventBus, TaskCreated, TaskDeleted
+
+
+class TestEventBus(unittest.TestCase):
+    def setUp(self):
+        self.errors = []
+        self.bus = EventBus(max_workers=2, max_pending=2, on_error=lambda sub, event, error: self.errors.append(error))
+        self.addCleanup(self.bus.shutdown)
+
+    def test_delivers_by_type(self):
+        received = []
+        self.bus.subscribe(TaskCreated, received.append)
+        self.bus.publish(TaskCreated(task_id=1, user_id=2, due_date=None))
+        self.bus.publish(TaskDeleted(task_id=1, user_id=2, was_completed=False))
+        self.assertEqual(received, [TaskCreated(task_id=1, user_id=2, due_date=None)])
+
+    def test_failing_subscriber_is_isolated(self):
+        """Test that an exception is counted and reported without affecting other subscribers."""
+        received = []
+
+        def broken(event):
+            raise RuntimeError("boom")
+
+        self.bus.subscribe(TaskCreated, broken, name="broken")
+        self.bus.subscribe(TaskCreated, received.append, name="recorder")
+        self.bus.publish(TaskCreated(task_id=1, user_id=2, due_date=None))
+        self.assertEqual(len(received), 1)
+        self.assertEqual([str(e) for e in self.errors], ["boom"])
+        subscribers = self.bus.stats()["subscribers"]
+        self.assertEqual(subscribers["TaskCreated:broken"]["errors"], 1)
+        self.assertEqual(subscribers["TaskCreated:broken"]["last_error"], "RuntimeError: boom")
+        self.assertEqual(subscribers["TaskCreated:recorder"]["calls"], 1)
+
+    def test_background_subscribers_run_off_thread(self):
+        threads = []
+        self.bus.subscribe(TaskCreated, lambda event: threads.append(threading.current_thread()), background=True)
+        self.bus.publish(TaskCreated(task_id=1, user_id=2, due_date=None))
+        self.assertTrue(self.bus.drain(timeout=5))
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_full_queue_runs_in_publisher(self):
+        """Test that a full pool makes the publisher run the handler itself instead of dropping the event."""
+        release = threading.Event()
+        threads = []
+
+        def slow(event):
+            threads.append(threading.current_thread())
+            if threading.current_thread() is not threading.main_thread():
+                release.wait(5)
+
+        self.bus.subscribe(TaskCreated, slow, background=True)
+        for i in range(3):
+            self.bus.publish(TaskCreated(task_id=i, user_id=2, due_date=None))
+        self.assertEqual(self.bus.ran_inline, 1)
+        self.assertIn(threading.main_thread(), threads)
+        release.set()
+        self.assertTrue(self.bus.drain(timeout=5))
+        self.assertEqual(len(threads), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from flask import Flask, flash, get_flashed_messages, redirect, session
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.webapp.idempotency import (
+    IDEMPOTENCY_HEADER,
+    InMemoryIdempotencyStore,
+    SQLiteIdempotencyStore,
+    StoredOutcome,
+    idempotent,
+)
+
+
+class TestIdempotentViews(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryIdempotencyStore(max_keys=10, ttl=60)
+        self.calls = []
+        app = Flask(__name__)
+        app.config['SECRET_KEY'] = 'test-secret'
+
+        @app.route('/login/<int:user_id>')
+        def login(user_id):
+            session['user_id'] = user_id
+            return 'ok'
+
+        @app.route('/create', methods=['POST'])
+        @idempotent(self.store)
+        def create():
+            self.calls.append('create')
+            flash(f"Created #{len(self.calls)}", 'success')
+            return redirect('/tasks')
+
+        @app.route('/invalid', methods=['POST'])
+        @idempotent(self.store)
+        def invalid():
+            self.calls.append('invalid')
+            return 'form with errors', 200
+
+        @app.route('/messages')
+        def messages():
+            return '|'.join(get_flashed_messages())
+
+        self.client = app.test_client()
+        self.client.get('/login/1')
+
+    def test_repeated_key_replays_outcome(self):
+        """Test that a repeated key returns the first redirect and flashes without running the view."""
+        first = self.client.post('/create', data={'idempotency_key': 'abc'})
+        self.assertEqual(self.client.get('/messages').get_data(as_text=True), 'Created #1')
+        second = self.client.post('/create', headers={IDEMPOTENCY_HEADER: 'abc'})
+        self.assertEqual(self.calls, ['create'])
+        self.assertEqual((second.status_code, second.location), (first.status_code, first.location))
+        self.assertEqual(self.client.get('/messages').get_data(as_text=True), 'Created #1')
+
+    def test_without_key_or_with_new_key_runs_view(self):
+        self.client.post('/create')
+        self.client.post('/create')
+        self.client.post('/create', data={'idempotency_key': 'one'})
+        self.client.post('/create', data={'idempotency_key': 'two'})
+        self.assertEqual(len(self.calls), 4)
+
+    def test_keys_are_scoped_per_user(self):
+        self.client.post('/create', data={'idempotency_key': 'abc'})
+        self.client.get('/login/2')
+        self.client.post('/create', data={'idempotency_key': 'abc'})
+        self.assertEqual(len(self.calls), 2)
+
+    def test_non_redirect_is_not_recorded(self):
+        self.client.post('/invalid', data={'idempotency_key': 'abc'})
+        self.client.post('/invalid', data={'idempotency_key': 'abc'})
+        self.assertEqual(self.calls, ['invalid', 'invalid'])
+
+
+class TestIdempotencyStores(unittest.TestCase):
+    outcome = StoredOutcome(302, '/tasks', [('success', 'Done')])
+
+    def test_duplicate_waits_for_in_flight_request(self):
+        store = InMemoryIdempotencyStore()
+        self.assertEqual(store.begin('k'), ('new', None))
+        self.assertEqual(store.begin('k'), ('pending', None))
+        timer = threading.Timer(0.05, store.finish, args=('k', self.outcome))
+        timer.start()
+        self.assertEqual(store.wait('k', timeout=5), self.outcome)
+        timer.join()
+        self.assertEqual(store.begin('k'), ('done', self.outcome))
+
+    def test_sqlite_store_is_shared(self):
+        """Test that two store instances on one file (e.g. two workers) see each other's keys."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'keys.db')
+            worker_a, worker_b = SQLiteIdempotencyStore(path), SQLiteIdempotencyStore(path)
+            self.assertEqual(worker_a.begin('k'), ('new', None))
+            self.assertEqual(worker_b.begin('k'), ('pending', None))
+            worker_a.finish('k', self.outcome)
+            state, outcome = worker_b.begin('k')
+            self.assertEqual(state, 'done')
+            self.assertEqual(outcome.location, '/tasks')
+            self.assertEqual([tuple(f) for f in outcome.flashes], self.outcome.flashes)
+
+            worker_a.begin('failed')
+            worker_a.finish('failed', None) # Released without an outcome: may be retried
+            self.assertEqual(worker_b.begin('failed'), ('new', None))
+
+    def test_sqlite_store_purges_expired_keys(self):
+        """Test that begin() periodically deletes keys older than the TTL."""
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteIdempotencyStore(os.path.join(tmp, 'keys.db'), ttl=60, purge_every=3)
+            conn = store._connect()
+            conn.execute("INSERT INTO idempotency_keys (key, outcome, created_at) VALUES ('old', NULL, ?)",
+                         (time.time() - 120,))
+            store.begin('a')
+            store.begin('b')
+            self.assertEqual(conn.execute("SELECT count(*) FROM idempotency_keys").fetchone()[0], 3)
+            store.begin('c')
+            keys = [row[0] for row in conn.execute("SELECT key FROM idempotency_keys ORDER BY key")]
+            self.assertEqual(keys, ['a', 'b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
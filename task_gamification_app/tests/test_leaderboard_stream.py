@@ -0,0 +1,99 @@
+import json
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.models import Base
+from task_gamification_app.app.events import bus
+from task_gamification_app.app.services import complete_task, create_task_for_user, create_user
+from task_gamification_app.webapp.leaderboard_stream import LeaderboardBroadcaster
+
+
+class TestLeaderboardBroadcaster(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            'sqlite:///:memory:',
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.alice = create_user(self.session, "a", "a", "alice", "alice@example.com", "password123")
+        self.bob = create_user(self.session, "b", "b", "bob", "bob@example.com", "password123")
+        self.tasks = [create_task_for_user(self.session, self.bob.id, f"Task {i}") for i in range(3)]
+
+        self.broadcaster = LeaderboardBroadcaster(self.Session, top_n=10, queue_size=2, autostart=False)
+        self.broadcaster.attach(bus)
+        self.addCleanup(self.broadcaster.detach)
+
+    def tearDown(self):
+        self.session.close()
+        Base.metadata.drop_all(self.engine)
+
+    def frames(self, client):
+        frames = []
+        while not client.frames.empty():
+            frames.append(client.frames.get_nowait())
+        return frames
+
+    def test_completions_are_coalesced_into_one_delta(self):
+        """Test that several completions cost one ranking query and produce one delta for all clients."""
+        clients = [self.broadcaster.connect() for _ in range(3)]
+        self.assertEqual(self.broadcaster.computations, 1)
+        for task in self.tasks:
+            complete_task(self.session, task.id, self.bob.id)
+
+        delta = self.broadcaster.run_once()
+        self.assertEqual(self.broadcaster.computations, 2)
+        self.assertEqual([(e["username"], e["rank"], e["points"]) for e in delta["changed"]],
+                         [("bob", 1, 30), ("alice", 2, 0)])
+        for client in clients:
+            self.assertEqual([kind for kind, _ in self.frames(client)], ["snapshot", "delta"])
+
+        self.assertIsNone(self.broadcaster.run_once()) # Nothing changed since
+        self.assertEqual(self.broadcaster.computations, 2)
+
+    def test_slow_client_gets_snapshot(self):
+        """Test that a client whose queue is full is resynchronised with a snapshot."""
+        client = self.broadcaster.connect()
+        for task in self.tasks:
+            complete_task(self.session, task.id, self.bob.id)
+            self.broadcaster.run_once()
+        # The initial snapshot and the first delta filled the queue; the second delta replaced them.
+        frames = self.frames(client)
+        self.assertEqual([kind for kind, _ in frames], ["snapshot", "delta"])
+        self.assertEqual(frames[0][1]["entries"][0]["points"], 20)
+        self.assertEqual(frames[1][1]["changed"][0]["points"], 30)
+
+    def test_stream_formats_frames(self):
+        client = self.broadcaster.connect()
+        stream = self.broadcaster.stream(client, keepalive=0.01)
+        self.assertTrue(next(stream).startswith("retry:"))
+        frame = next(stream)
+        self.assertIn("event: snapshot\n", frame)
+        payload = json.loads(frame.split("data: ", 1)[1])
+        self.assertEqual(len(payload["entries"]), 2)
+        self.assertEqual(next(stream), ": keepalive\n\n")
+        stream.close()
+        self.assertEqual(self.broadcaster.client_count(), 0)
+
+    def test_stream_connects_on_first_iteration(self):
+        """Test that a stream that is never iterated leaves no client registered."""
+        stream = self.broadcaster.stream(keepalive=0.01)
+        self.assertEqual(self.broadcaster.client_count(), 0)
+        next(stream)
+        self.assertEqual(self.broadcaster.client_count(), 1)
+        stream.close()
+        self.assertEqual(self.broadcaster.client_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
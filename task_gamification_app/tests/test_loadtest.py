@@ -0,0 +1,102 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, func, inspect, select
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app import loadtest
+from task_gamification_app.app.models import Task, User
+
+
+class TestLoadTestHelpers(unittest.TestCase):
+    def test_percentile_nearest_rank(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(loadtest.percentile(values, 0.50), 50.0)
+        self.assertEqual(loadtest.percentile(values, 0.95), 95.0)
+        self.assertEqual(loadtest.percentile(values, 0.99), 99.0)
+        self.assertEqual(loadtest.percentile([3.0], 0.99), 3.0)
+        self.assertEqual(loadtest.percentile([], 0.5), 0.0)
+
+    def test_extract_csrf_token(self):
+        html = '<form><input id="csrf_token" name="csrf_token" type="hidden" value="abc.123-_x"></form>'
+        self.assertEqual(loadtest.extract_csrf_token(html), "abc.123-_x")
+        self.assertIsNone(loadtest.extract_csrf_token("<form></form>"))
+
+    def test_parse_mix(self):
+        self.assertEqual(loadtest.parse_mix("my_tasks=5, leaderboard"), {"my_tasks": 5, "leaderboard": 1})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix("nonexistent=1")
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix("my_tasks=0")
+
+    def test_route_stats_summary(self):
+        stats = loadtest.RouteStats()
+        stats.record(0.010, "200", ok=True)
+        stats.record(0.020, "200", ok=True)
+        stats.record(0.030, "500", ok=False)
+        stats.record(0.040, "ConnectionRefusedError", ok=False)
+        summary = stats.summary()
+        self.assertEqual(summary["requests"], 4)
+        self.assertEqual(summary["error_rate"], 0.5)
+        self.assertEqual(summary["statuses"], {"200": 2, "500": 1, "ConnectionRefusedError": 1})
+        self.assertEqual(summary["max"], 0.040)
+
+
+class TestSpawnedLoadTest(unittest.TestCase):
+    def setUp(self):
+        from task_gamification_app.app import db, hashing
+        from task_gamification_app.app.identity_cache import clear_user_snapshot_cache
+        from task_gamification_app.app.services import clear_leaderboard_cache
+        from task_gamification_app.webapp import routes
+
+        self.addCleanup(hashing.set_active_profile, hashing._active_profile)
+        hashing.set_active_profile("fast")
+        # spawn_server rebinds the app's sessions; point them back at the app database afterwards.
+        self.addCleanup(db.SessionLocal.configure, bind=db.SessionLocal.kw["bind"])
+        routes.login_limiter.reset()
+        self.addCleanup(routes.login_limiter.reset)
+        clear_user_snapshot_cache()
+        self.addCleanup(clear_user_snapshot_cache)
+        clear_leaderboard_cache()
+        self.addCleanup(clear_leaderboard_cache)
+        self.app_engine = db.engine
+
+    def _count_users(self, engine):
+        if not inspect(engine).has_table("users"):
+            return 0
+        with engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(User)).scalar()
+
+    def test_short_run_writes_only_to_the_scratch_database(self):
+        """Test a short run against a spawned server, whose users and tasks land in the scratch database."""
+        app_users = self._count_users(self.app_engine)
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "loadtest.db")
+            server, base_url = loadtest.spawn_server(database)
+            try:
+                results = loadtest.run_load_test(base_url, concurrency=2, duration=0.5, seed=1,
+                                                 mix={"my_tasks": 1, "create_task": 1, "complete_task": 1})
+            finally:
+                server.shutdown()
+                server.server_close()
+            scratch = create_engine(f"sqlite:///{database}")
+            with scratch.connect() as conn:
+                tasks = conn.execute(select(func.count()).select_from(Task)).scalar()
+            scratch_users = self._count_users(scratch)
+            scratch.dispose()
+
+        self.assertEqual(results["setup_failures"], 0)
+        self.assertGreater(results["requests"], 0)
+        for route, summary in results["routes"].items():
+            self.assertEqual(summary["error_rate"], 0.0, route)
+        self.assertEqual(scratch_users, 2)
+        self.assertGreater(tasks, 0)
+        self.assertEqual(self._count_users(self.app_engine), app_users)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.models import Base, User, Task, UserStats, RecurringTask, RecurrenceFrequency
+from task_gamification_app.app.services import create_recurring_task
+from task_gamification_app.app import maintenance
+
+
+class TestMaintenance(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}")
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            Base.metadata.create_all(bind=connection)
+        self.Session = sessionmaker(bind=self.engine)
+        session = self.Session()
+        user = User(username="alice", email="alice@example.com", password_hash="x")
+        session.add(user)
+        session.flush()
+        session.add_all([Task(description="x" * 500, user_id=user.id) for _ in range(200)])
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_incremental_vacuum_frees_deleted_pages(self):
+        """Test that pages freed by deletes are returned by the incremental vacuum."""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM tasks")
+        result = maintenance.incremental_vacuum(self.engine)
+        self.assertEqual(result["auto_vacuum"], "INCREMENTAL")
+        self.assertGreater(result["freed_pages"], 0)
+        self.assertEqual(result["free_pages_left"], 0)
+
+    def test_integrity_check_and_analyze(self):
+        """Test that a healthy database reports ok and ANALYZE runs."""
+        maintenance.analyze(self.engine)
+        self.assertEqual(maintenance.integrity_check(self.engine), ["ok"])
+
+    def test_service_query_plans(self):
+        """Test that the report captures a plan for every sampled service call."""
+        plans = maintenance.service_query_plans(self.engine)
+        self.assertIn("get_tasks_for_user", plans)
+        self.assertTrue(all(plan for _, plan in plans["get_tasks_for_user"]))
+
+    def test_service_query_plans_leave_no_writes(self):
+        """Test that the report's service calls, which materialise tasks and rebuild stats, are rolled back."""
+        session = self.Session()
+        create_recurring_task(session, session.query(User.id).scalar(), "Standup", RecurrenceFrequency.DAILY)
+        session.commit()
+        before = {model: session.query(model).count() for model in (Task, UserStats, RecurringTask)}
+        session.close()
+        plans = maintenance.service_query_plans(self.engine)
+        self.assertTrue(plans["get_user_stats"])
+        session = self.Session()
+        after = {model: session.query(model).count() for model in (Task, UserStats, RecurringTask)}
+        materialized_until = session.query(RecurringTask.materialized_until).scalar()
+        session.close()
+        self.assertEqual(after, before)
+        self.assertEqual(before[UserStats], 0)
+        self.assertIsNone(materialized_until)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,18 @@
+import importlib.util
+import os
 import unittest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
 from sqlalchemy import create_engine, inspect
-from task_gamification_app.app.models import Base
+from task_gamification_app.app.models import Base, Task
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', 'app', 'migrations', 'versions')
+
+def load_migration(file_name):
+    spec = importlib.util.spec_from_file_location(file_name[:-3], os.path.join(MIGRATIONS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
 
 class TestMigration(unittest.TestCase):
     def setUp(self):
@@ -26,5 +38,55 @@ class TestMigration(unittest.TestCase):
         columns = [column['name'] for column in inspector.get_columns('users')]
         self.assertIn('email', columns)
 
+class TestUniqueUserIndexesMigration(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(self.engine.dispose)
+        # The users table as databases from before migration 4 have it: no unique indexes.
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR NOT NULL, email VARCHAR,"
+                                 " password_hash VARCHAR NOT NULL, points INTEGER NOT NULL DEFAULT 0)")
+            conn.exec_driver_sql("INSERT INTO users (id, username, email, password_hash) VALUES"
+                                 " (1, 'alice', 'a@example.com', 'x'), (2, 'bob', 'a@example.com', 'x'),"
+                                 " (3, 'alice', NULL, 'x'), (4, 'carol', NULL, 'x')")
+
+    def _upgrade(self):
+        with self.engine.begin() as conn:
+            load_migration("4_add_unique_indexes_to_users.py").upgrade(Operations(MigrationContext.configure(conn)))
+
+    def test_duplicates_are_reported_before_any_change(self):
+        with self.assertRaises(RuntimeError) as ctx:
+            self._upgrade()
+        message = str(ctx.exception)
+        self.assertIn("username 'alice': user ids 1, 3", message)
+        self.assertIn("email 'a@example.com': user ids 1, 2", message)
+        self.assertNotIn("None", message) # Users without an email do not conflict
+        self.assertEqual(inspect(self.engine).get_indexes("users"), [])
+
+    def test_upgrade_after_duplicates_are_resolved(self):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE users SET username = 'alice2' WHERE id = 3")
+            conn.exec_driver_sql("UPDATE users SET email = 'b@example.com' WHERE id = 2")
+        self._upgrade()
+        self.assertEqual({(index["name"], bool(index["unique"])) for index in inspect(self.engine).get_indexes("users")},
+                         {("ix_users_username", True), ("ix_users_email", True)})
+
+class TestReminderIndexMigration(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        # The tasks table as databases before migration 5 have it.
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX ix_tasks_pending_due_date")
+            conn.exec_driver_sql("ALTER TABLE tasks DROP COLUMN reminded_for_due_date")
+
+    def test_upgrade_adds_column_and_pending_due_date_index(self):
+        with self.engine.begin() as conn:
+            load_migration("5_add_pending_due_date_index_to_tasks.py").upgrade(Operations(MigrationContext.configure(conn)))
+        self.assertIn("reminded_for_due_date", [column["name"] for column in inspect(self.engine).get_columns("tasks")])
+        self.assertEqual({index["name"] for index in inspect(self.engine).get_indexes("tasks")},
+                         {index.name for index in Task.__table__.indexes})
+
 if __name__ == '__main__':
     unittest.main()
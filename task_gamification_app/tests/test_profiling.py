@@ -0,0 +1,109 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from flask import Flask
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.webapp.profiling import PROFILE_HEADER, init_profiling, make_profile_token
+
+
+def busy_function():
+    return sum(i * i for i in range(20000))
+
+
+class TestRequestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_app(self, **config):
+        app = Flask(__name__)
+        app.config.update(
+            SECRET_KEY='test-secret',
+            PROFILING_ENABLED=True,
+            PROFILING_SAMPLE_RATE=0.0,
+            PROFILING_DIR=self.tmp.name,
+            PROFILING_MAX_BYTES=10 * 1024 * 1024,
+            PROFILING_TOKEN_MAX_AGE=3600,
+        )
+        app.config.update(config)
+
+        @app.route('/slow')
+        def slow():
+            busy_function()
+            return 'ok'
+
+        @app.route('/wait')
+        def wait():
+            self.waiting.set()
+            self.release.wait(5)
+            return 'ok'
+
+        store = init_profiling(app)
+        return app, store
+
+    def test_disabled_by_default(self):
+        app, store = self.make_app(PROFILING_ENABLED=False)
+        self.assertIsNone(store)
+        app.test_client().get('/slow', headers={PROFILE_HEADER: make_profile_token('test-secret')})
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_signed_header_triggers_profile(self):
+        """Test that only requests with a valid token are profiled, with route metadata."""
+        app, store = self.make_app()
+        client = app.test_client()
+        client.get('/slow')
+        client.get('/slow', headers={PROFILE_HEADER: make_profile_token('other-secret')})
+        self.assertEqual(store.recent(), [])
+
+        client.get('/slow?x=1', headers={PROFILE_HEADER: make_profile_token('test-secret')})
+        profiles = store.recent()
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['endpoint'], 'slow')
+        self.assertEqual(profiles[0]['path'], '/slow?x=1')
+        self.assertEqual(profiles[0]['status'], 200)
+        self.assertEqual(profiles[0]['trigger'], 'header')
+
+        functions = [row['function'] for row in store.top_functions([profiles[0]['pstats_path']])]
+        self.assertTrue(any('busy_function' in name for name in functions))
+
+    def test_sampling(self):
+        app, store = self.make_app(PROFILING_SAMPLE_RATE=1.0)
+        app.test_client().get('/slow')
+        self.assertEqual([p['trigger'] for p in store.recent()], ['sample'])
+
+    def test_overlapping_requests_are_profiled_one_at_a_time(self):
+        """Test that a request arriving while another is profiled runs unprofiled instead of failing."""
+        app, store = self.make_app(PROFILING_SAMPLE_RATE=1.0)
+        self.waiting, self.release = threading.Event(), threading.Event()
+        responses = {}
+        first = threading.Thread(target=lambda: responses.update(wait=app.test_client().get('/wait').status_code))
+        first.start()
+        self.assertTrue(self.waiting.wait(5))
+        responses['slow'] = app.test_client().get('/slow').status_code
+        self.release.set()
+        first.join(5)
+        self.assertEqual(responses, {'wait': 200, 'slow': 200})
+        self.assertEqual([p['endpoint'] for p in store.recent()], ['wait'])
+        app.test_client().get('/slow') # The lock was released
+        self.assertEqual(len(store.recent()), 2)
+
+    def test_directory_is_capped(self):
+        """Test that the oldest profiles are removed once the directory exceeds its size cap."""
+        app, store = self.make_app(PROFILING_SAMPLE_RATE=1.0)
+        client = app.test_client()
+        client.get('/slow')
+        one_profile = sum(os.path.getsize(os.path.join(self.tmp.name, name)) for name in os.listdir(self.tmp.name))
+        store.max_bytes = int(one_profile * 2.5)
+        for _ in range(5):
+            client.get('/slow')
+        self.assertEqual(len(store.recent(limit=100)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import contextlib
+import datetime
+import os
+import sys
+import unittest
+import unittest.mock
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app import hashing
+from task_gamification_app.app.archive import archive_completed_tasks
+from task_gamification_app.app.datagen import generate_dataset
+from task_gamification_app.app.identity_cache import clear_user_snapshot_cache
+from task_gamification_app.app.maintenance import _sample_service_calls, capture_statements, explain, full_scans, rolled_back_session
+from task_gamification_app.app.models import Base, RecurrenceFrequency, Task, User
+from task_gamification_app.app.services import clear_activity_cache, clear_leaderboard_cache, create_recurring_task
+from task_gamification_app.webapp import app, routes
+
+NOW = datetime.datetime(2026, 1, 15)
+
+# Most SQL statements each call may issue. Raise a budget only together with the change that needs it.
+SERVICE_BUDGETS = {
+    "get_tasks_for_user": 5, # Recurring tasks, materializing their due instances (3 writes), then the tasks
+    "get_tasks_for_user(completion_date)": 2,
+    "get_tasks_page": 1,
+    "count_tasks_by_status": 1,
+    "get_tasks_due_between": 1,
+    "get_leaderboard_users_paginated": 2, # The page and the user count
+    "get_recent_activity": 1,
+    "get_user_stats": 2,
+}
+ROUTE_BUDGETS = {
+    "/index": 2,
+    "/my_tasks": 4,
+    "/my_tasks?status=Completed&completion_date=2026-01-10": 6, # Page and counts each read the archive horizon
+    "/my_tasks/page?format=json": 2,
+    "/leaderboard": 2,
+    "/leaderboard?page=3": 2,
+    "/activity": 1,
+}
+
+
+class QueryBudgetTestCase(unittest.TestCase):
+    """A populated in-memory database and assertions on the SQL that code issues."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.addClassCleanup(hashing.set_active_profile, hashing._active_profile)
+        hashing.set_active_profile("fast")
+        cls.engine = create_engine('sqlite:///:memory:', connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        cls.addClassCleanup(cls.engine.dispose)
+        Base.metadata.create_all(cls.engine)
+        cls.Session = sessionmaker(bind=cls.engine, autoflush=False)
+        db_session = cls.Session()
+        generate_dataset(db_session, users=40, tasks_per_user=30, seed=3, now=NOW)
+        db_session.commit()
+        for user_id in db_session.execute(select(User.id).limit(5)).scalars():
+            create_recurring_task(db_session, user_id, "Water the plants", RecurrenceFrequency.WEEKLY, NOW)
+        archive_completed_tasks(db_session, older_than=datetime.timedelta(days=10), now=NOW)
+        db_session.close()
+
+    def setUp(self):
+        self.db_session = self.Session()
+        self.addCleanup(self.db_session.close)
+        clear_activity_cache()
+        clear_leaderboard_cache()
+        clear_user_snapshot_cache()
+
+    @contextlib.contextmanager
+    def assertQueryBudget(self, max_statements: int):
+        """
+        Fails if the block runs more than `max_statements` SQL statements, or a SELECT
+        whose plan scans a task table without an index.
+        """
+        with capture_statements(self.engine) as statements:
+            yield statements
+        # rolled_back_session's SAVEPOINTs are not the code's own statements.
+        statements[:] = [(statement, parameters) for statement, parameters in statements
+                         if not statement.startswith(("SAVEPOINT ", "RELEASE SAVEPOINT ", "ROLLBACK TO SAVEPOINT "))]
+        self.assertLessEqual(len(statements), max_statements,
+                             "\n".join(" ".join(statement.split())[:200] for statement, _ in statements))
+        for statement, parameters in statements:
+            if statement.lstrip().upper().startswith("SELECT"):
+                plan = explain(self.db_session, statement, parameters)
+                self.assertEqual(full_scans(plan), [], f"{' '.join(statement.split())}\n{plan}")
+
+
+class TestServiceQueries(QueryBudgetTestCase):
+    def test_service_budgets_and_plans(self):
+        with rolled_back_session(self.engine) as db_session:
+            self.db_session = db_session # Explain the statements inside the same transaction
+            calls = _sample_service_calls(db_session)
+            self.assertEqual(set(calls), set(SERVICE_BUDGETS))
+            for name, call in calls.items():
+                with self.subTest(name):
+                    with self.assertQueryBudget(SERVICE_BUDGETS[name]) as statements:
+                        call()
+                    self.assertTrue(statements)
+
+    def test_full_scan_is_detected(self):
+        """Test that the check fails on the kind of filter that cannot use an index."""
+        statement = select(Task.id, Task.description).where(func.date(Task.due_date) == NOW.date())
+        with capture_statements(self.engine) as statements:
+            self.db_session.execute(statement).all()
+        plan = explain(self.db_session, *statements[0])
+        self.assertEqual(full_scans(plan), ["SCAN tasks"])
+        self.assertEqual(full_scans(["SCAN TABLE tasks", "SCAN tasks USING INDEX ix_tasks_user_status_due",
+                                     "SEARCH tasks USING INDEX ix_tasks_user_status_due (user_id=?)", "SCAN users"]),
+                         ["SCAN TABLE tasks"])
+
+
+class TestRouteQueries(QueryBudgetTestCase):
+    """Statements per page view, including any the templates trigger (N+1 lazy loads)."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = unittest.mock.patch.object(routes, "SessionLocal", self.Session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+        user = self.db_session.execute(select(User).order_by(User.points.desc()).limit(1)).scalar_one()
+        with self.client.session_transaction() as session:
+            session['user_id'] = user.id
+            session['username'] = user.username
+        self.db_session.close()
+
+    def test_route_budgets(self):
+        for path, budget in ROUTE_BUDGETS.items():
+            with self.subTest(path):
+                clear_activity_cache()
+                clear_leaderboard_cache()
+                with self.assertQueryBudget(budget):
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
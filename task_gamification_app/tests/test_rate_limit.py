@@ -0,0 +1,155 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.rate_limit import (
+    RateLimiter,
+    InMemoryBucketStore,
+    SQLiteBucketStore,
+    RateLimitExceededError,
+    rate_limited,
+    get_rate_limit_counters,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter('test', capacity=3, refill_rate=1.0, clock=self.clock)
+
+    def test_burst_then_reject(self):
+        """Test that the bucket allows `capacity` requests and then rejects."""
+        for _ in range(3):
+            self.limiter.check("ip:1.2.3.4")
+        with self.assertRaises(RateLimitExceededError) as ctx:
+            self.limiter.check("ip:1.2.3.4")
+        self.assertGreater(ctx.exception.retry_after, 0)
+        self.assertEqual(self.limiter.counters()["rejected"], 1)
+        self.assertEqual(self.limiter.counters()["rejected_by_scope"], {"ip": 1})
+
+    def test_refill_over_time(self):
+        """Test that tokens come back at `refill_rate` per second."""
+        for _ in range(3):
+            self.limiter.check("user:alice")
+        self.clock.now += 1.0
+        self.limiter.check("user:alice")
+        with self.assertRaises(RateLimitExceededError):
+            self.limiter.check("user:alice")
+
+    def test_keys_are_independent(self):
+        """Test that exhausting one key does not affect another."""
+        for _ in range(3):
+            self.limiter.check("user:alice")
+        self.limiter.check("user:bob")
+
+    def test_rejected_check_takes_no_tokens(self):
+        """Test that a locked-out IP does not drain the bucket of the account it targets."""
+        for _ in range(3):
+            self.limiter.check("ip:1.2.3.4")
+        for _ in range(5):
+            with self.assertRaises(RateLimitExceededError):
+                self.limiter.check("ip:1.2.3.4", "user:alice")
+        for _ in range(3):
+            self.limiter.check("ip:5.6.7.8", "user:alice")
+
+    def test_store_evicts_least_recently_used_keys(self):
+        """Test that the in-memory store stays bounded."""
+        store = InMemoryBucketStore(max_keys=2)
+        for key in ("a", "b", "c"):
+            store.consume(key, 1, 1.0, now=0.0)
+        self.assertEqual(list(store._buckets), ["b", "c"])
+
+    def test_decorator_skips_wrapped_function_when_limited(self):
+        """Test that the wrapped (expensive) function is not called once the budget is spent."""
+        expensive = Mock(return_value="ok")
+        limited = rate_limited(self.limiter, lambda name: [f"user:{name}"])(expensive)
+        for _ in range(3):
+            self.assertEqual(limited("alice", client_ip="10.0.0.1"), "ok")
+        with self.assertRaises(RateLimitExceededError):
+            limited("alice", client_ip="10.0.0.1")
+        self.assertEqual(expensive.call_count, 3)
+        expensive.assert_called_with("alice")
+
+    def test_counters_are_exported_by_name(self):
+        """Test that get_rate_limit_counters includes every limiter."""
+        self.assertIn('test', get_rate_limit_counters())
+
+
+class TestSQLiteBucketStore(unittest.TestCase):
+    def test_shared_between_store_instances(self):
+        """Test that two stores on the same file (e.g. two workers) share one budget."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'buckets.db')
+            clock = FakeClock()
+            first = RateLimiter('shared_a', capacity=2, refill_rate=0.1, store=SQLiteBucketStore(path), clock=clock)
+            second = RateLimiter('shared_b', capacity=2, refill_rate=0.1, store=SQLiteBucketStore(path), clock=clock)
+            first.check("ip:1.2.3.4")
+            second.check("ip:1.2.3.4")
+            with self.assertRaises(RateLimitExceededError):
+                first.check("ip:1.2.3.4")
+
+    def test_keys_are_charged_together_or_not_at_all(self):
+        """Test that a check refused by one bucket leaves the other keys' buckets untouched."""
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteBucketStore(os.path.join(tmp, 'buckets.db'))
+            store.consume("user:alice", capacity=1, refill_rate=0.1, now=1000.0)
+            waits = store.consume_all(["ip:1.2.3.4", "user:alice"], capacity=1, refill_rate=0.1, now=1000.0)
+            self.assertEqual(waits[0], 0.0)
+            self.assertGreater(waits[1], 0.0)
+            self.assertEqual(store.consume("ip:1.2.3.4", capacity=1, refill_rate=0.1, now=1000.0), 0.0)
+
+    def test_idle_buckets_are_purged(self):
+        """Test that consume() periodically deletes buckets that have refilled completely."""
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteBucketStore(os.path.join(tmp, 'buckets.db'), idle_after=60, purge_every=3)
+            store.consume("ip:old", capacity=2, refill_rate=1.0, now=1000.0)
+            store.consume("ip:recent", capacity=2, refill_rate=1.0, now=1100.0)
+            store.consume("ip:new", capacity=2, refill_rate=1.0, now=1100.0)
+            keys = [row[0] for row in store._connect().execute("SELECT key FROM rate_limit_buckets ORDER BY key")]
+            self.assertEqual(keys, ["ip:new", "ip:recent"])
+
+
+class TestMetricsEndpoints(unittest.TestCase):
+    PATHS = ('/metrics/rate_limits', '/metrics/idempotency', '/metrics/sql_cache',
+             '/metrics/leaderboard_cache', '/metrics/events')
+
+    def setUp(self):
+        from task_gamification_app.webapp import app
+        patcher = patch.dict(app.config, {'ADMIN_USERNAMES': {'admin'}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+
+    def _log_in(self, username):
+        with self.client.session_transaction() as session:
+            session['user_id'] = 1
+            session['username'] = username
+
+    def test_only_admins_see_the_counters(self):
+        """Test that the /metrics endpoints are hidden from users not listed in ADMIN_USERNAMES."""
+        for path in self.PATHS:
+            with self.subTest(path):
+                self.assertEqual(self.client.get(path).status_code, 302) # To the login page
+                self._log_in('alice')
+                self.assertEqual(self.client.get(path).status_code, 404)
+                self._log_in('admin')
+                self.assertEqual(self.client.get(path).status_code, 200)
+                with self.client.session_transaction() as session:
+                    session.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import datetime
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.models import Base, User, Task, TaskStatus, RecurringTask, RecurrenceFrequency
+from task_gamification_app.app.identity_cache import clear_user_snapshot_cache
+from task_gamification_app.app.reminders import ReminderScanner
+from task_gamification_app.app.services import get_tasks_due_between
+
+
+class TestReminderScanner(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            'sqlite:///:memory:',
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        clear_user_snapshot_cache()
+
+        self.now = datetime.datetime(2024, 6, 1, 12, 0)
+        session = self.Session()
+        alice = User(username="alice", email="alice@example.com", password_hash="x")
+        bob = User(username="bob", email="bob@example.com", password_hash="x")
+        session.add_all([alice, bob])
+        session.flush()
+        session.add_all([
+            Task(description="overdue", user_id=alice.id, due_date=self.now - datetime.timedelta(hours=2)),
+            Task(description="soon", user_id=alice.id, due_date=self.now + datetime.timedelta(hours=3)),
+            Task(description="done", user_id=alice.id, due_date=self.now + datetime.timedelta(hours=3),
+                 status=TaskStatus.COMPLETED),
+            Task(description="next week", user_id=bob.id, due_date=self.now + datetime.timedelta(days=7)),
+            Task(description="no due date", user_id=bob.id),
+        ])
+        session.commit()
+        session.close()
+
+        self.sent = []
+        self.scanner = ReminderScanner(self.Session, notifier=self._record)
+
+    def tearDown(self):
+        Base.metadata.drop_all(self.engine)
+
+    def _record(self, user, due_soon, overdue):
+        self.sent.append((user.username, sorted(t.description for t in due_soon), sorted(t.description for t in overdue)))
+
+    def test_batches_reminders_per_user(self):
+        """Test that each user gets one batch with their due-soon and overdue tasks."""
+        summary = self.scanner.run_once(now=self.now)
+        self.assertEqual(summary["tasks"], 2)
+        self.assertEqual(self.sent, [("alice", ["soon"], ["overdue"])])
+
+    def test_watermark_prevents_duplicate_reminders(self):
+        """Test that a second run skips tasks already reminded about their due date."""
+        self.scanner.run_once(now=self.now)
+        self.sent.clear()
+        self.scanner.run_once(now=self.now + datetime.timedelta(hours=1))
+        self.assertEqual(self.sent, [])
+        self.scanner.run_once(now=self.now + datetime.timedelta(days=6, hours=13))
+        self.assertEqual(self.sent, [("bob", ["next week"], [])])
+
+    def test_task_created_after_scan_inside_scanned_window_is_reminded(self):
+        """Test that a task added after a scan, due inside the window it covered, is reminded by the next run."""
+        self.scanner.run_once(now=self.now)
+        session = self.Session()
+        bob = session.query(User).filter(User.username == "bob").one()
+        session.add(Task(description="late addition", user_id=bob.id, due_date=self.now + datetime.timedelta(hours=2)))
+        session.commit()
+        session.close()
+        self.sent.clear()
+        self.scanner.run_once(now=self.now + datetime.timedelta(hours=1))
+        self.assertEqual(self.sent, [("bob", ["late addition"], [])])
+
+    def test_redated_task_is_reminded_again(self):
+        """Test that moving a reminded task to a new due date reminds about the new date."""
+        self.scanner.run_once(now=self.now)
+        session = self.Session()
+        task = session.query(Task).filter(Task.description == "soon").one()
+        task.due_date = self.now + datetime.timedelta(hours=5)
+        session.commit()
+        session.close()
+        self.sent.clear()
+        self.scanner.run_once(now=self.now + datetime.timedelta(hours=1))
+        self.assertEqual(self.sent, [("alice", ["soon"], [])])
+
+    def test_materialises_recurring_tasks_in_window(self):
+        """Test that recurring tasks due within the scan window get instances and are reminded of."""
+        session = self.Session()
+        bob = session.query(User).filter(User.username == "bob").one()
+        session.add(RecurringTask(user_id=bob.id, description="standup", frequency=RecurrenceFrequency.DAILY,
+                                  start_date=self.now.date()))
+        session.commit()
+        session.close()
+        self.scanner.run_once(now=self.now)
+        self.assertIn(("bob", ["standup"], ["standup"]), self.sent)
+        session = self.Session()
+        self.assertEqual(session.query(Task).filter(Task.recurring_task_id.isnot(None)).count(), 2)
+        session.close()
+
+    def _capture_scan(self, run):
+        """
+        Calls `run` and returns the reminder scan's SELECT, its parameters and the number of
+        SQLite virtual machine steps spent executing it and fetching its rows.
+        """
+        statements = []
+        steps = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            driver_connection = conn.connection.driver_connection
+            if "ORDER BY tasks.due_date ASC, tasks.id ASC" in statement:
+                statements.append((statement, parameters))
+                driver_connection.set_progress_handler(lambda: steps.append(1), 1)
+            else: # The rows were fetched before the next statement.
+                driver_connection.set_progress_handler(None, 1)
+
+        event.listen(self.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            run()
+        finally:
+            event.remove(self.engine, "before_cursor_execute", before_cursor_execute)
+            self.engine.raw_connection().driver_connection.set_progress_handler(None, 1)
+        statement, parameters = statements[0]
+        return statement, parameters, len(steps)
+
+    def test_due_query_uses_partial_index(self):
+        """Test that get_tasks_due_between is served by the pending due-date index."""
+        session = self.Session()
+        statement, parameters, _ = self._capture_scan(
+            lambda: get_tasks_due_between(session, self.now, self.now + datetime.timedelta(days=1)))
+        plan = session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        session.close()
+        self.assertIn("ix_tasks_pending_due_date", " ".join(str(row[-1]) for row in plan))
+
+    def test_scan_only_reads_pending_tasks_in_its_window(self):
+        """Test that completed tasks and tasks due after the window are not read by the scan."""
+        session = self.Session()
+        alice = session.query(User).filter(User.username == "alice").one()
+        session.add_all([Task(description=f"done {i}", user_id=alice.id, status=TaskStatus.COMPLETED,
+                              due_date=self.now + datetime.timedelta(minutes=i)) for i in range(300)])
+        session.add_all([Task(description=f"later {i}", user_id=alice.id,
+                              due_date=self.now + datetime.timedelta(days=30, minutes=i)) for i in range(300)])
+        session.commit()
+        session.close()
+
+        statement, parameters, steps = self._capture_scan(lambda: self.scanner.run_once(now=self.now))
+        self.assertEqual(self.sent, [("alice", ["soon"], ["overdue"])])
+        session = self.Session()
+        plan = session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        session.close()
+        self.assertEqual([row[-1] for row in plan],
+                         ["SEARCH tasks USING INDEX ix_tasks_pending_due_date (due_date>? AND due_date<?)"])
+        # Reading the two tasks in the window takes a few dozen steps; visiting the other 600 would take thousands.
+        self.assertLess(steps, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import unittest.mock
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -10,7 +11,7 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
 import datetime
-from task_gamification_app.app.models import Base, User, Task, TaskStatus
+from task_gamification_app.app.models import Base, User, Task, TaskStatus, RecurrenceFrequency
 from task_gamification_app.app.services import (
     create_user,
     verify_user_login,
@@ -18,8 +19,31 @@ from task_gamification_app.app.services import (
     UserCreationError,
     create_task_for_user,
     get_tasks_for_user,
-    complete_task
+    complete_task,
+    update_user,
+    get_user_stats,
+    delete_task_for_user,
+    get_leaderboard_users_paginated,
+    get_tasks_page,
+    count_tasks_by_status,
+    InvalidCursorError,
+    create_recurring_task,
+    get_recurring_tasks_for_user,
+    stop_recurring_task,
+    get_recent_activity,
+    clear_activity_cache,
+    clear_leaderboard_cache,
+    TaskNotFoundError
 )
+from task_gamification_app.app.stats import rebuild_user_stats
+from task_gamification_app.app.archive import archive_completed_tasks
+from task_gamification_app.app.recurrence import materialize_recurring_tasks
+from task_gamification_app.app import events, recurrence
+from task_gamification_app.app import identity_cache
+from task_gamification_app.app.identity_cache import clear_user_snapshot_cache, get_user_snapshot
+from task_gamification_app.app import hashing
+from task_gamification_app.app.statement_cache import statement_cache_stats
+from task_gamification_app.app.maintenance import capture_statements, explain
 
 class BaseServiceTest(unittest.TestCase):
     """
@@ -50,6 +74,9 @@ class BaseServiceTest(unittest.TestCase):
         self.connection = self.engine.connect()
         self.trans = self.connection.begin()
         self.session = self.Session(bind=self.connection)
+        # Rolled-back users reuse ids between tests, so start from empty identity and leaderboard caches.
+        clear_user_snapshot_cache()
+        clear_leaderboard_cache()
 
     def tearDown(self):
         """
@@ -88,6 +115,105 @@ class TestUserServices(BaseServiceTest):
             create_user(self.session, "test_first", "test_last", "testuser2", "test@example.com", "anotherpassword")
 
 
+    def test_update_user_duplicate_email(self):
+        """Test that update_user maps the unique index violation on email to UserCreationError."""
+        create_user(self.session, "test_first", "test_last", "testuser1", "test1@example.com", "password123")
+        user2 = create_user(self.session, "test_first", "test_last", "testuser2", "test2@example.com", "password123")
+        with self.assertRaises(UserCreationError):
+            update_user(self.session, user2.id, email="test1@example.com")
+
+
+class TestPasswordHashing(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(hashing.set_active_profile, hashing._active_profile)
+        hashing.set_active_profile("fast")
+        self.user = create_user(self.session, "test_first", "test_last", "testuser", "test@example.com", "password123")
+
+    def test_new_hashes_use_active_profile(self):
+        """Test that the active profile's cost ends up in the stored hash."""
+        self.assertTrue(self.user.password_hash.startswith("$2b$04$"))
+        self.assertFalse(self.user.password_needs_rehash())
+
+    def test_login_rehashes_stale_hash(self):
+        """Test that a successful login moves the hash to the active profile."""
+        hashing.set_active_profile("scrypt")
+        self.assertTrue(self.user.password_needs_rehash())
+
+        self.assertIsNotNone(verify_user_login(self.session, "testuser", "password123"))
+        self.assertTrue(self.user.password_hash.startswith("$scrypt$"))
+        self.assertFalse(self.user.password_needs_rehash())
+        # Both the new hash and, after switching back, the old scheme still verify.
+        self.assertIsNotNone(verify_user_login(self.session, "testuser", "password123"))
+        hashing.set_active_profile("fast")
+        self.assertIsNotNone(verify_user_login(self.session, "test@example.com", "password123"))
+        self.assertTrue(self.user.password_hash.startswith("$2b$04$"))
+
+    def test_failed_login_does_not_rehash(self):
+        hashing.set_active_profile("scrypt")
+        old_hash = self.user.password_hash
+        self.assertIsNone(verify_user_login(self.session, "testuser", "wrong"))
+        self.assertEqual(self.user.password_hash, old_hash)
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaises(hashing.UnknownHashProfileError):
+            hashing.set_active_profile("nonexistent")
+
+    def test_incomplete_hasher_cannot_be_registered(self):
+        class HashOnly(hashing.PasswordHasher):
+            def hash(self, password):
+                return password
+
+        with self.assertRaises(TypeError):
+            hashing.register_profile("hash_only", HashOnly())
+
+
+class TestUserSnapshotCache(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(self.session, "test_first", "test_last", "testuser", "test@example.com", "password123")
+
+    def test_snapshot_is_served_from_cache(self):
+        """Test that repeated snapshot lookups do not hit the database."""
+        snapshot = get_user_snapshot(self.session, self.user.id)
+        self.assertEqual(snapshot.username, "testuser")
+        # A fresh session (i.e. a new request) still finds it in the process-wide cache.
+        other_session = self.Session(bind=self.connection)
+        with unittest.mock.patch.object(other_session, 'query', side_effect=AssertionError("DB was queried")):
+            self.assertEqual(get_user_snapshot(other_session, self.user.id), snapshot)
+        other_session.close()
+
+    def test_update_user_invalidates_snapshot(self):
+        """Test that update_user drops the stale snapshot."""
+        get_user_snapshot(self.session, self.user.id)
+        update_user(self.session, self.user.id, first_name="Renamed")
+        self.assertEqual(get_user_snapshot(self.session, self.user.id).first_name, "Renamed")
+
+    def test_complete_task_invalidates_snapshot(self):
+        """Test that the points shown after completing a task are fresh."""
+        task = create_task_for_user(self.session, self.user.id, "Task")
+        self.assertEqual(get_user_snapshot(self.session, self.user.id).points, 0)
+        complete_task(self.session, task.id, self.user.id)
+        self.assertEqual(get_user_snapshot(self.session, self.user.id).points, 10)
+
+    def test_lookup_during_update_does_not_cache_the_old_row(self):
+        """Test that a lookup which read the row before a concurrent update committed leaves it out of the cache."""
+        reader = self.Session(bind=self.connection)
+        make_snapshot = identity_cache.UserSnapshot
+
+        def update_then_snapshot(*row):
+            # The reader has fetched the row; another request renames the user before it fills the cache.
+            update_user(self.session, self.user.id, first_name="Renamed")
+            return make_snapshot(*row)
+
+        with unittest.mock.patch.object(identity_cache, 'UserSnapshot', side_effect=update_then_snapshot):
+            self.assertEqual(get_user_snapshot(reader, self.user.id).first_name, "test_first")
+        reader.close()
+        next_request = self.Session(bind=self.connection)
+        self.assertEqual(get_user_snapshot(next_request, self.user.id).first_name, "Renamed")
+        next_request.close()
+
+
 class TestTaskServices(BaseServiceTest):
     def setUp(self):
         """
@@ -128,5 +254,375 @@ class TestTaskServices(BaseServiceTest):
         self.assertEqual(tasks[0].id, task2.id)
 
 
+class TestStatementCache(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(self.session, "test_first", "test_last", "testuser", "test@example.com", "password123")
+        self.task = create_task_for_user(self.session, self.user.id, "Write report", datetime.date.today())
+
+    def test_repeated_filter_shape_is_not_recompiled(self):
+        """Test that a second call with the same filter shape reuses the statement and its compiled SQL."""
+        get_tasks_for_user(self.session, self.user.id, status=TaskStatus.PENDING, description="report", sort_by="due_date")
+        before = statement_cache_stats()
+        tasks = get_tasks_for_user(self.session, self.user.id, status=TaskStatus.PENDING, description="REPORT", sort_by="due_date")
+        after = statement_cache_stats()
+
+        self.assertEqual([t.id for t in tasks], [self.task.id])
+        self.assertEqual(after["statements"]["hits"], before["statements"]["hits"] + 1)
+        self.assertEqual(after["statements"]["misses"], before["statements"]["misses"])
+        self.assertEqual(after["compiled"]["misses"], before["compiled"]["misses"])
+
+    def test_each_filter_shape_gets_its_own_statement(self):
+        today = datetime.date.today()
+        self.assertEqual(len(get_tasks_for_user(self.session, self.user.id, due_date=today)), 1)
+        self.assertEqual(len(get_tasks_for_user(self.session, self.user.id, due_date=today, creation_date=today)), 1)
+        self.assertEqual(len(get_tasks_for_user(self.session, self.user.id, status=TaskStatus.COMPLETED)), 0)
+        complete_task(self.session, self.task.id, self.user.id)
+        self.assertEqual(len(get_tasks_for_user(self.session, self.user.id, completion_date=today, status=TaskStatus.COMPLETED)), 1)
+
+    def test_leaderboard_pages_share_one_statement(self):
+        for i in range(3):
+            create_user(self.session, "f", "l", f"other{i}", f"other{i}@example.com", "password123")
+        first, total = get_leaderboard_users_paginated(self.session, page=1, per_page=2)
+        before = statement_cache_stats()
+        second, _ = get_leaderboard_users_paginated(self.session, page=2, per_page=2)
+        after = statement_cache_stats()
+
+        self.assertEqual(total, 4)
+        self.assertEqual(len(first) + len(second), 4)
+        self.assertEqual(after["compiled"]["misses"], before["compiled"]["misses"])
+
+
+class TestTaskPagination(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(self.session, "test_first", "test_last", "testuser", "test@example.com", "password123")
+        today = datetime.date.today()
+        # Repeated and missing due dates exercise the id tie-breaker and the NULLS LAST boundary.
+        due_dates = [today, None, today + datetime.timedelta(days=2), today, None, today - datetime.timedelta(days=1), today]
+        self.tasks = [create_task_for_user(self.session, self.user.id, f"Task {i}", due) for i, due in enumerate(due_dates)]
+        complete_task(self.session, self.tasks[0].id, self.user.id)
+
+    def collect_pages(self, limit, **kwargs):
+        pages, cursor = [], None
+        while True:
+            tasks, cursor = get_tasks_page(self.session, self.user.id, cursor=cursor, limit=limit, **kwargs)
+            pages.append([task.id for task in tasks])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_all_tasks_in_order(self):
+        """Test that walking the cursors yields every task once, in sort order, for both sort orders."""
+        for sort_by in ("due_date", "creation_date"):
+            pages = self.collect_pages(3, sort_by=sort_by)
+            ids = [task_id for page in pages for task_id in page]
+            self.assertEqual(len(ids), 7, sort_by)
+            self.assertEqual(len(set(ids)), 7, sort_by)
+            self.assertEqual([len(page) for page in pages], [3, 3, 1], sort_by)
+
+        due_ordered = [t.id for t in sorted(self.tasks, key=lambda t: (t.due_date is None, t.due_date or datetime.datetime.min, -t.id))]
+        self.assertEqual([i for page in self.collect_pages(2, sort_by="due_date") for i in page], due_ordered)
+
+    def test_list_and_pages_break_ties_the_same_way(self):
+        """Test that get_tasks_for_user orders tasks exactly like the pages, ties included."""
+        same_time = datetime.datetime(2026, 1, 10, 12, 0)
+        for task in self.tasks:
+            task.creation_date = same_time
+        self.session.commit()
+        for sort_by in ("due_date", "creation_date"):
+            listed = [task.id for task in get_tasks_for_user(self.session, self.user.id, sort_by=sort_by)]
+            self.assertEqual(listed, [i for page in self.collect_pages(3, sort_by=sort_by) for i in page], sort_by)
+
+    def test_pages_respect_filters(self):
+        pages = self.collect_pages(2, status=TaskStatus.PENDING, sort_by="due_date")
+        self.assertNotIn(self.tasks[0].id, [i for page in pages for i in page])
+        self.assertEqual(sum(len(page) for page in pages), 6)
+
+    def test_last_page_has_no_cursor(self):
+        tasks, cursor = get_tasks_page(self.session, self.user.id, limit=7)
+        self.assertEqual(len(tasks), 7)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursorError):
+            get_tasks_page(self.session, self.user.id, cursor="not-a-cursor")
+        _, cursor = get_tasks_page(self.session, self.user.id, limit=2, sort_by="creation_date")
+        with self.assertRaises(InvalidCursorError): # A cursor only fits the sort order it was made for
+            get_tasks_page(self.session, self.user.id, cursor=cursor, sort_by="due_date")
+
+    def test_count_tasks_by_status(self):
+        self.assertEqual(count_tasks_by_status(self.session, self.user.id), {"pending": 6, "completed": 1, "total": 7})
+        self.assertEqual(count_tasks_by_status(self.session, self.user.id, due_date=datetime.date.today()),
+                         {"pending": 2, "completed": 1, "total": 3})
+
+
+class TestUserStats(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(self.session, "test_first", "test_last", "testuser", "test@example.com", "password123")
+
+    def test_stats_follow_task_changes(self):
+        """Test that user_stats is kept up to date by create, complete and delete."""
+        yesterday = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        task1 = create_task_for_user(self.session, self.user.id, "Task 1", due_date=yesterday)
+        task2 = create_task_for_user(self.session, self.user.id, "Task 2")
+        task3 = create_task_for_user(self.session, self.user.id, "Task 3")
+        complete_task(self.session, task2.id, self.user.id)
+        delete_task_for_user(self.session, task3.id, self.user.id)
+
+        stats = get_user_stats(self.session, self.user.id)
+        self.assertEqual(stats["pending_count"], 1)
+        self.assertEqual(stats["completed_count"], 1)
+        self.assertEqual(stats["overdue_count"], 1)
+        self.assertEqual(stats["current_streak"], 1)
+        self.assertIsNotNone(stats["average_completion_seconds"])
+
+        complete_task(self.session, task1.id, self.user.id)
+        stats = get_user_stats(self.session, self.user.id)
+        self.assertEqual(stats["pending_count"], 0)
+        self.assertEqual(stats["completed_count"], 2)
+        self.assertEqual(stats["overdue_count"], 0)
+
+    def test_rebuild_matches_incremental_stats(self):
+        """Test that the set-based rebuild agrees with the incrementally maintained row."""
+        for i in range(3):
+            task = create_task_for_user(self.session, self.user.id, f"Task {i}")
+            if i:
+                complete_task(self.session, task.id, self.user.id)
+        incremental = get_user_stats(self.session, self.user.id)
+        rebuild_user_stats(self.session)
+        self.session.commit()
+        rebuilt = get_user_stats(self.session, self.user.id)
+        # julianday() arithmetic is only millisecond-precise.
+        self.assertAlmostEqual(rebuilt.pop("average_completion_seconds"), incremental.pop("average_completion_seconds"), places=2)
+        self.assertEqual(rebuilt, incremental)
+
+    def test_rebuild_computes_streak(self):
+        """Test that the rebuild counts consecutive completion days ending today."""
+        today = datetime.datetime.utcnow()
+        for days_ago in (0, 1, 2, 4):
+            task = Task(description=f"Done {days_ago}", user_id=self.user.id, status=TaskStatus.COMPLETED,
+                        creation_date=today - datetime.timedelta(days=days_ago + 1),
+                        completion_date=today - datetime.timedelta(days=days_ago))
+            self.session.add(task)
+        self.session.commit()
+        rebuild_user_stats(self.session)
+        self.session.commit()
+        stats = get_user_stats(self.session, self.user.id)
+        self.assertEqual(stats["current_streak"], 3)
+        self.assertEqual(stats["completed_count"], 4)
+        self.assertAlmostEqual(stats["average_completion_seconds"], 86400, delta=1)
+
+
+class TestTaskArchive(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(self.session, "test_first", "test_last", "testuser", "test@example.com", "password123")
+        self.old_day = datetime.datetime(2020, 1, 15, 9, 0)
+        for i in range(5):
+            self.session.add(Task(description=f"Old {i}", user_id=self.user.id, status=TaskStatus.COMPLETED,
+                                  creation_date=self.old_day - datetime.timedelta(days=1), completion_date=self.old_day))
+        self.recent = create_task_for_user(self.session, self.user.id, "Recent")
+        complete_task(self.session, self.recent.id, self.user.id)
+        self.pending = create_task_for_user(self.session, self.user.id, "Pending")
+
+    def test_archive_moves_only_old_completed_tasks(self):
+        """Test that archiving is chunked and hot reads no longer see archived tasks."""
+        batches = []
+        moved = archive_completed_tasks(self.session, batch_size=2, progress=lambda n, total: batches.append(n))
+        self.assertEqual(moved, 5)
+        self.assertEqual(batches, [2, 2, 1])
+        hot = get_tasks_for_user(self.session, self.user.id)
+        self.assertEqual(sorted(t.description for t in hot), ["Pending", "Recent"])
+        self.assertEqual(len(get_tasks_for_user(self.session, self.user.id, include_archived=True)), 7)
+
+    def test_new_tasks_do_not_reuse_archived_ids(self):
+        """Test that archiving the newest task does not hand its id to the next task."""
+        complete_task(self.session, self.pending.id, self.user.id)
+        newest_id = self.pending.id
+        archived = archive_completed_tasks(self.session, older_than=datetime.timedelta(0),
+                                           now=datetime.datetime.utcnow() + datetime.timedelta(seconds=1))
+        self.assertEqual(archived, 7)
+        task = create_task_for_user(self.session, self.user.id, "After archiving")
+        self.assertGreater(task.id, newest_id)
+        complete_task(self.session, task.id, self.user.id)
+        self.assertEqual(archive_completed_tasks(self.session, older_than=datetime.timedelta(0),
+                                                 now=datetime.datetime.utcnow() + datetime.timedelta(seconds=1)), 1)
+
+    def test_archive_is_resumable(self):
+        """Test that an interrupted run can be continued by running again."""
+        self.assertEqual(archive_completed_tasks(self.session, batch_size=2, max_batches=1), 2)
+        self.assertEqual(archive_completed_tasks(self.session, batch_size=2), 3)
+        self.assertEqual(archive_completed_tasks(self.session, batch_size=2), 0)
+
+    def test_completion_date_filter_unions_archive(self):
+        """Test that filtering by an archived completion date still finds the tasks."""
+        archive_completed_tasks(self.session)
+        tasks = get_tasks_for_user(self.session, self.user.id, completion_date=self.old_day.date())
+        self.assertEqual(len(tasks), 5)
+        self.assertTrue(all(task.is_archived for task in tasks))
+
+    def test_leaderboard_and_stats_count_archived_tasks(self):
+        """Test that archiving does not change completed-task counts."""
+        archive_completed_tasks(self.session)
+        entries, _ = get_leaderboard_users_paginated(self.session)
+        self.assertEqual(entries[0]["completed_tasks_count"], 6)
+        rebuild_user_stats(self.session)
+        self.session.commit()
+        self.assertEqual(get_user_stats(self.session, self.user.id)["completed_count"], 6)
+
+
+class TestRecurringTasks(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(self.session, "test_first", "test_last", "testuser", "test@example.com", "password123")
+        self.today = datetime.datetime.utcnow().date()
+
+    def occurrences(self):
+        return sorted(t.occurrence_date for t in self.session.query(Task).filter(Task.recurring_task_id.isnot(None)))
+
+    def test_listing_materialises_only_the_window(self):
+        """Test that listing tasks creates the occurrences of the next week, and only those."""
+        create_recurring_task(self.session, self.user.id, "Water plants", RecurrenceFrequency.DAILY,
+                              start_date=self.today - datetime.timedelta(days=2))
+        tasks = get_tasks_for_user(self.session, self.user.id)
+        self.assertEqual(len(tasks), 10) # Two days back, today, and seven days ahead
+        self.assertEqual(self.occurrences()[-1], self.today + datetime.timedelta(days=7))
+        self.assertEqual(get_user_stats(self.session, self.user.id)["pending_count"], 10)
+
+    def test_materialisation_is_idempotent(self):
+        template = create_recurring_task(self.session, self.user.id, "Review", RecurrenceFrequency.WEEKLY,
+                                         start_date=self.today, interval=2)
+        until = self.today + datetime.timedelta(days=30)
+        self.assertEqual(materialize_recurring_tasks(self.session, until), 3)
+        self.assertEqual(materialize_recurring_tasks(self.session, until), 0)
+        # Even with the watermark reset, the unique index keeps duplicates out.
+        template.materialized_until = None
+        self.session.commit()
+        self.assertEqual(materialize_recurring_tasks(self.session, until), 0)
+        self.assertEqual(self.occurrences(), [self.today + datetime.timedelta(days=d) for d in (0, 14, 28)])
+
+    def test_deleted_occurrence_stays_deleted(self):
+        create_recurring_task(self.session, self.user.id, "Stretch", RecurrenceFrequency.DAILY, start_date=self.today)
+        first = get_tasks_for_user(self.session, self.user.id, sort_by="due_date")[0]
+        delete_task_for_user(self.session, first.id, self.user.id)
+        self.session.info.clear()
+        self.assertEqual(len(get_tasks_for_user(self.session, self.user.id)), 7)
+
+    def test_due_date_filter_extends_window(self):
+        create_recurring_task(self.session, self.user.id, "Report", RecurrenceFrequency.WEEKLY, start_date=self.today)
+        target = self.today + datetime.timedelta(days=28)
+        self.assertEqual(len(get_tasks_for_user(self.session, self.user.id, due_date=target)), 1)
+
+    def test_old_start_date_only_backfills_recent_occurrences(self):
+        """Test that a template started years ago does not create every occurrence since then."""
+        create_recurring_task(self.session, self.user.id, "Journal", RecurrenceFrequency.DAILY,
+                              start_date=datetime.date(2000, 1, 1))
+        created = materialize_recurring_tasks(self.session, self.today + datetime.timedelta(days=7))
+        self.assertEqual(created, recurrence.MAX_BACKFILL.days + 8) # The backfill, today, and a week ahead
+        self.assertEqual(self.occurrences()[0], self.today - recurrence.MAX_BACKFILL)
+
+    def test_stop_recurring_task(self):
+        template = create_recurring_task(self.session, self.user.id, "Gym", RecurrenceFrequency.DAILY, start_date=self.today)
+        self.assertEqual(len(get_recurring_tasks_for_user(self.session, self.user.id)), 1)
+        stop_recurring_task(self.session, template.id, self.user.id)
+        self.assertEqual(get_recurring_tasks_for_user(self.session, self.user.id), [])
+        self.assertEqual(materialize_recurring_tasks(self.session, self.today + datetime.timedelta(days=7)), 0)
+        with self.assertRaises(TaskNotFoundError):
+            stop_recurring_task(self.session, template.id + 1, self.user.id)
+
+
+class TestActivityFeed(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        clear_activity_cache()
+        self.addCleanup(clear_activity_cache)
+        alice = create_user(self.session, "Alice", "A", "alice", "alice@example.com", "password123")
+        bob = create_user(self.session, "Bob", "B", "bob", "bob@example.com", "password123")
+        base = datetime.datetime(2026, 3, 1, 12, 0)
+        self.completed = []
+        for i in range(5):
+            for user in (alice, bob):
+                task = complete_task(self.session, create_task_for_user(self.session, user.id, f"{user.username} {i}").id, user.id)
+                # Pairs share a completion time, which exercises the id tie-breaker.
+                task.completion_date = base + datetime.timedelta(hours=i)
+                self.completed.append(task)
+        create_task_for_user(self.session, alice.id, "Still pending")
+        self.session.commit()
+        self.expected = [t.id for t in sorted(self.completed, key=lambda t: (t.completion_date, t.id), reverse=True)]
+
+    def test_pages_cover_feed_newest_first(self):
+        ids, cursor = [], None
+        while True:
+            entries, cursor = get_recent_activity(self.session, cursor=cursor, limit=3)
+            ids.extend(entry["task_id"] for entry in entries)
+            if cursor is None:
+                break
+        self.assertEqual(ids, self.expected)
+        entries, _ = get_recent_activity(self.session, limit=1)
+        self.assertEqual((entries[0]["username"], entries[0]["points"]), ("bob", 10))
+        with self.assertRaises(InvalidCursorError):
+            get_recent_activity(self.session, cursor="not-a-cursor")
+
+    def test_first_page_is_cached(self):
+        first, _ = get_recent_activity(self.session, limit=3)
+        newest = self.completed[0]
+        newest.completion_date = datetime.datetime(2026, 4, 1)
+        self.session.commit()
+        self.assertEqual(get_recent_activity(self.session, limit=3)[0], first)
+        clear_activity_cache()
+        self.assertEqual(get_recent_activity(self.session, limit=3)[0][0]["task_id"], newest.id)
+
+    def test_served_from_partial_index(self):
+        for cursor in (None, get_recent_activity(self.session, limit=3)[1]):
+            clear_activity_cache()
+            with capture_statements(self.engine) as statements:
+                get_recent_activity(self.session, cursor=cursor, limit=3)
+            plan = explain(self.session, *statements[0])
+            self.assertIn("ix_tasks_completed_recent", plan[0])
+            self.assertFalse(any("TEMP B-TREE" in line for line in plan), plan)
+
+
+class TestDomainEvents(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(self.session, "test_first", "test_last", "testuser", "test@example.com", "password123")
+        self.received = []
+        for event_type in (events.TaskCreated, events.TaskCompleted, events.TaskDeleted, events.UserUpdated):
+            events.subscribe(event_type, self.received.append)
+            self.addCleanup(events.bus.unsubscribe, event_type, self.received.append)
+
+    def test_task_lifecycle_events(self):
+        """Test that services publish one event per committed change, and none for a no-op."""
+        task = create_task_for_user(self.session, self.user.id, "Task")
+        complete_task(self.session, task.id, self.user.id)
+        complete_task(self.session, task.id, self.user.id) # Already completed
+        delete_task_for_user(self.session, task.id, self.user.id)
+        self.assertEqual([type(e) for e in self.received], [events.TaskCreated, events.TaskCompleted, events.TaskDeleted])
+        self.assertEqual(self.received[1].points_awarded, 10)
+        self.assertTrue(self.received[2].was_completed)
+
+    def test_user_updated_lists_changed_fields(self):
+        update_user(self.session, self.user.id, first_name="New", username="testuser")
+        self.assertEqual(self.received, [events.UserUpdated(user_id=self.user.id, changed_fields=("first_name",))])
+
+    def test_renaming_frees_cached_username_and_email(self):
+        """Test that a committed rename evicts the old username and email from the registration pre-check cache."""
+        from task_gamification_app.webapp import forms
+        self.addCleanup(forms._taken_cache.clear)
+        forms.remember_taken('username', 'testuser')
+        forms.remember_taken('email', 'test@example.com')
+        update_user(self.session, self.user.id, username="renamed", email="renamed@example.com")
+        self.assertEqual(self.received[-1].released, (("username", "testuser"), ("email", "test@example.com")))
+        self.assertIsNone(forms._taken_cache.get(('username', 'testuser')))
+        self.assertIsNone(forms._taken_cache.get(('email', 'test@example.com')))
+
+    def test_no_event_when_commit_fails(self):
+        create_user(self.session, "other", "user", "other", "other@example.com", "password123")
+        with self.assertRaises(UsernameExistsError):
+            update_user(self.session, self.user.id, username="other")
+        self.assertEqual(self.received, [])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+import os
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app import hashing
+from task_gamification_app.app.models import Base, Task, User
+from task_gamification_app.app.services import (
+    UserCreationError,
+    UsernameExistsError,
+    clear_activity_cache,
+    clear_leaderboard_cache,
+    complete_task,
+    create_task_for_user,
+    create_user,
+    get_leaderboard_users_paginated,
+    get_recent_activity,
+    get_tasks_for_user,
+    update_user,
+)
+from task_gamification_app.app.sharding import SHARD_KEY_BITS, ShardSet
+
+
+def populate(db_session):
+    """Eight users with 1..8 tasks, of which user i completes i // 2 (ties in points included)."""
+    for i in range(8):
+        user = create_user(db_session, "Shard", "User", f"user{i}", f"user{i}@example.com", "password123")
+        tasks = [create_task_for_user(db_session, user.id, f"Task {i}.{j}") for j in range(i + 1)]
+        for task in tasks[:i // 2]:
+            complete_task(db_session, task.id, user.id)
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(hashing.set_active_profile, hashing._active_profile)
+        hashing.set_active_profile("fast")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.shard_set = ShardSet.for_files(os.path.join(tmp.name, "test"), 3)
+        self.addCleanup(self.shard_set.dispose)
+        self.shard_set.create_all()
+        self.db_session = self.shard_set.sessionmaker(autoflush=False)()
+        self.addCleanup(self.db_session.close)
+        clear_activity_cache()
+        clear_leaderboard_cache()
+
+    def count_statements(self):
+        counts = Counter()
+        for shard_id, engine in self.shard_set.engines.items():
+            def count(*args, shard_id=shard_id):
+                counts[shard_id] += 1
+            event.listen(engine, "before_cursor_execute", count)
+            self.addCleanup(event.remove, engine, "before_cursor_execute", count)
+        return counts
+
+    def test_user_rows_stay_on_their_shard(self):
+        populate(self.db_session)
+        users = self.db_session.query(User).all()
+        self.assertEqual(len(users), 8)
+        self.assertEqual(len({self.shard_set.shard_for_user(user.id) for user in users}), 3)
+        for user in users:
+            shard_id = self.shard_set.shard_for_user(user.id)
+            self.assertTrue(all(self.shard_set.shard_for_key(task.id) == shard_id for task in user.tasks))
+
+        user = users[5]
+        counts = self.count_statements()
+        tasks = get_tasks_for_user(self.db_session, user.id)
+        complete_task(self.db_session, tasks[-1].id, user.id)
+        self.assertEqual(set(counts), {self.shard_set.shard_for_user(user.id)})
+        self.assertEqual(self.db_session.get(Task, tasks[-1].id).user_id, user.id) # Found from the id alone
+
+    def test_directory_enforces_uniqueness_across_shards(self):
+        first = create_user(self.db_session, "A", "A", "alice", "alice@example.com", "password123")
+        second = create_user(self.db_session, "B", "B", "bob", "bob@example.com", "password123")
+        self.assertNotEqual(first.id, second.id)
+        self.assertRaises(UsernameExistsError, create_user, self.db_session, "C", "C", "alice", "c@example.com", "password123")
+        self.assertRaises(UserCreationError, create_user, self.db_session, "C", "C", "carol", "bob@example.com", "password123")
+        self.assertRaises(UsernameExistsError, update_user, self.db_session, second.id, username="alice")
+
+        # Failed attempts released nothing that was taken and reserved nothing.
+        update_user(self.db_session, first.id, username="alicia")
+        self.assertEqual(create_user(self.db_session, "C", "C", "alice", "carol@example.com", "password123").username, "alice")
+
+    def test_merged_orderings_match_a_single_database(self):
+        populate(self.db_session)
+        engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        single = sessionmaker(bind=engine, autoflush=False)()
+        self.addCleanup(single.close)
+        populate(single)
+
+        for page in (1, 2, 3):
+            self.assertEqual(get_leaderboard_users_paginated(self.db_session, page, 3),
+                             get_leaderboard_users_paginated(single, page, 3))
+
+        def feed(db_session):
+            entries, cursor = get_recent_activity(db_session, limit=5)
+            while cursor:
+                page, cursor = get_recent_activity(db_session, cursor=cursor, limit=5)
+                entries += page
+            return [(entry["username"], entry["description"]) for entry in entries]
+
+        sharded = feed(self.db_session)
+        self.assertEqual(len(sharded), sum(i // 2 for i in range(8)))
+        self.assertEqual(sorted(sharded), sorted(feed(single)))
+        dates = [entry["completion_date"] for entry in get_recent_activity(self.db_session, limit=20)[0]]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_shard_count_is_fixed(self):
+        urls = [str(engine.url) for engine in self.shard_set.engines.values()]
+        other = ShardSet(urls[:2], str(self.shard_set.directory.url))
+        self.addCleanup(other.dispose)
+        self.assertRaises(RuntimeError, other.prepare)
+        self.assertEqual(self.shard_set.shard_for_key(2 << SHARD_KEY_BITS | 5), "shard2")
+
+
+if __name__ == '__main__':
+    unittest.main()
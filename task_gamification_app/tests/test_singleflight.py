@@ -0,0 +1,220 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app import hashing, services
+from task_gamification_app.app.models import Base
+from task_gamification_app.app.services import (
+    clear_leaderboard_cache,
+    complete_task,
+    create_task_for_user,
+    create_user,
+    get_leaderboard_users_paginated,
+)
+from task_gamification_app.app.singleflight import SingleFlight, StaleWhileRevalidateCache
+
+WAIT = 5 # Seconds before a test gives up on another thread
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + WAIT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for other threads")
+        time.sleep(0.001)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_computation(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            release.wait(WAIT)
+            return {"value": 42}
+
+        def call():
+            results.append(flights.do("key", compute))
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: flights.stats()["shared"] == 5) # Every other thread is waiting on the first
+        release.set()
+        for thread in threads:
+            thread.join(WAIT)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flights.stats(), {"in_flight": 0, "computed": 1, "shared": 5})
+        self.assertEqual(flights.do("key", lambda: "again"), "again") # Nothing is remembered
+
+    def test_exception_is_shared(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            release.wait(WAIT)
+            raise RuntimeError("boom")
+
+        def call():
+            try:
+                flights.do("key", fail)
+            except RuntimeError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(WAIT)
+        follower = threading.Thread(target=call)
+        follower.start()
+        wait_until(lambda: flights.stats()["shared"] == 1)
+        release.set()
+        leader.join(WAIT)
+        follower.join(WAIT)
+        self.assertEqual([str(e) for e in errors], ["boom", "boom"])
+        self.assertFalse(flights.in_flight("key"))
+
+
+class TestStaleWhileRevalidateCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = StaleWhileRevalidateCache(fresh_ttl=2, stale_ttl=10, clock=lambda: self.now)
+        self.version = 0
+
+    def compute(self):
+        self.version += 1
+        return self.version
+
+    def test_fresh_then_stale_then_expired(self):
+        self.assertEqual(self.cache.get_or_compute("k", self.compute), 1)
+        self.assertEqual(self.cache.get_or_compute("k", self.compute), 1)
+        self.now = 3 # Stale, and nobody is refreshing it: this caller does
+        self.assertEqual(self.cache.get_or_compute("k", self.compute), 2)
+        self.cache.mark_stale()
+        self.assertEqual(self.cache.get_or_compute("k", self.compute), 3)
+        self.now = 20
+        self.assertEqual(self.cache.get_or_compute("k", self.compute), 4)
+        self.assertEqual(self.cache.stats()["fresh_hits"], 1)
+
+    def test_stale_value_is_served_during_refresh(self):
+        self.cache.get_or_compute("k", self.compute)
+        self.cache.mark_stale()
+        entered, release = threading.Event(), threading.Event()
+        refreshed = []
+
+        def slow_compute():
+            entered.set()
+            release.wait(WAIT)
+            return "new"
+
+        refresher = threading.Thread(target=lambda: refreshed.append(self.cache.get_or_compute("k", slow_compute)))
+        refresher.start()
+        entered.wait(WAIT)
+        self.assertEqual(self.cache.get_or_compute("k", self.compute), 1) # Without waiting, and without computing
+        release.set()
+        refresher.join(WAIT)
+        self.assertEqual(refreshed, ["new"])
+        self.assertEqual(self.cache.get_or_compute("k", self.compute), "new")
+        self.assertEqual((self.version, self.cache.stats()["stale_hits"]), (1, 1))
+
+    def test_mark_stale_during_computation_keeps_result_stale(self):
+        def compute_and_write():
+            self.cache.mark_stale() # A write commits while the page is being computed
+            return self.compute()
+
+        self.assertEqual(self.cache.get_or_compute("k", compute_and_write), 1)
+        self.assertEqual(self.cache.get_or_compute("k", self.compute), 2)
+
+
+class TestLeaderboardStampede(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(hashing.set_active_profile, hashing._active_profile)
+        hashing.set_active_profile("fast")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.engine = create_engine(f"sqlite:///{os.path.join(tmp.name, 'test.db')}",
+                                    connect_args={"check_same_thread": False})
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine, autoflush=False)
+        self.db_session = self.Session()
+        self.addCleanup(self.db_session.close)
+        self.user = create_user(self.db_session, "L", "B", "leader", "leader@example.com", "password123")
+        self.task = create_task_for_user(self.db_session, self.user.id, "Task")
+        clear_leaderboard_cache()
+        self.addCleanup(clear_leaderboard_cache)
+
+        self.computations = 0
+        compute = services._leaderboard_page
+
+        def counted(db_session, page, per_page):
+            self.computations += 1
+            self.in_compute.set()
+            self.release.wait(WAIT)
+            return compute(db_session, page, per_page)
+
+        patcher = unittest.mock.patch.object(services, "_leaderboard_page", counted)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.in_compute, self.release = threading.Event(), threading.Event()
+
+    def view(self, results):
+        db_session = self.Session()
+        try:
+            results.append(get_leaderboard_users_paginated(db_session, page=1, per_page=10))
+        finally:
+            db_session.close()
+
+    def test_concurrent_viewers_share_one_query(self):
+        results = []
+        threads = [threading.Thread(target=self.view, args=(results,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: services.leaderboard_cache_stats()["shared"] == 7)
+        self.release.set()
+        for thread in threads:
+            thread.join(WAIT)
+        self.assertEqual(self.computations, 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_completion_is_revalidated_once_while_others_see_the_previous_page(self):
+        self.release.set()
+        before, _ = get_leaderboard_users_paginated(self.db_session)
+        self.assertEqual(before[0]["points"], 0)
+
+        complete_task(self.db_session, self.task.id, self.user.id) # Marks the cached pages stale
+        self.release.clear()
+        self.in_compute.clear()
+        refreshed = []
+        refresher = threading.Thread(target=self.view, args=(refreshed,))
+        refresher.start()
+        self.in_compute.wait(WAIT)
+        served, _ = get_leaderboard_users_paginated(self.db_session)
+        self.assertIs(served, before)
+        self.release.set()
+        refresher.join(WAIT)
+
+        self.assertEqual(self.computations, 2)
+        self.assertEqual(refreshed[0][0][0]["points"], services.POINTS_PER_TASK)
+        self.assertEqual(get_leaderboard_users_paginated(self.db_session)[0][0]["points"], services.POINTS_PER_TASK)
+
+
+if __name__ == '__main__':
+    unittest.main()
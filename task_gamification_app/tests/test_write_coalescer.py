@@ -0,0 +1,105 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from task_gamification_app.app.events import TaskCompleted, after_commit, bus
+from task_gamification_app.app.models import Base, Task, TaskStatus
+from task_gamification_app.app.services import (
+    TaskNotFoundError,
+    complete_task,
+    create_task_for_user,
+    create_user,
+)
+from task_gamification_app.app.stats import get_stats_row
+from task_gamification_app.app.write_coalescer import WriteCoalescer
+
+
+class TestWriteCoalescer(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.engine = create_engine(f"sqlite:///{os.path.join(tmp.name, 'test.db')}", connect_args={"timeout": 30})
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine, autoflush=False)
+        db_session = self.Session()
+        self.user_id = create_user(db_session, "Test", "User", "writer", "writer@example.com", "password123").id
+        self.task_ids = [create_task_for_user(db_session, self.user_id, f"Task {i}").id for i in range(20)]
+        db_session.close()
+        # A long linger, so everything submitted below lands in one batch.
+        self.coalescer = WriteCoalescer(self.engine, linger=0.5)
+        self.addCleanup(self.coalescer.stop)
+
+    def test_concurrent_writes_share_a_batch(self):
+        results = []
+
+        def worker(task_id):
+            results.append(self.coalescer.call(complete_task, task_id=task_id, user_id=self.user_id, timeout=10))
+
+        threads = [threading.Thread(target=worker, args=(task_id,)) for task_id in self.task_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(task.status == TaskStatus.COMPLETED for task in results)) # Detached but loaded
+        self.assertEqual(self.coalescer.stats()["batches"], 1)
+        db_session = self.Session()
+        stats = get_stats_row(db_session, self.user_id)
+        self.assertEqual((stats.pending_count, stats.completed_count), (0, 20))
+        db_session.close()
+
+    def test_failing_call_is_isolated(self):
+        """Test that a failing call gets its own exception while the rest of the batch commits."""
+        good = self.coalescer.submit(complete_task, task_id=self.task_ids[0], user_id=self.user_id)
+        bad = self.coalescer.submit(complete_task, task_id=999999, user_id=self.user_id)
+        other = self.coalescer.submit(complete_task, task_id=self.task_ids[1], user_id=self.user_id)
+        self.assertEqual(good.result(10).status, TaskStatus.COMPLETED)
+        self.assertRaises(TaskNotFoundError, bad.result, 10)
+        self.assertEqual(other.result(10).status, TaskStatus.COMPLETED)
+        self.assertEqual(self.coalescer.stats()["batches"], 1)
+
+        db_session = self.Session()
+        completed = db_session.query(Task).filter(Task.status == TaskStatus.COMPLETED).count()
+        db_session.close()
+        self.assertEqual(completed, 2)
+
+    def test_events_are_published_after_commit(self):
+        """Test that subscribers only see a batched write once it is visible to other sessions."""
+        seen = []
+
+        def check(event):
+            db_session = self.Session()
+            seen.append(db_session.get(Task, event.task_id).status)
+            db_session.close()
+
+        bus.subscribe(TaskCompleted, check, name="test_write_coalescer")
+        self.addCleanup(bus.unsubscribe, TaskCompleted, check)
+        self.coalescer.call(complete_task, task_id=self.task_ids[0], user_id=self.user_id, timeout=10)
+        self.assertEqual(seen, [TaskStatus.COMPLETED])
+
+    def test_failing_callback_is_logged_and_counted(self):
+        """Test that an after-commit callback that raises is logged and leaves the call's result alone."""
+        def complete_with_failing_callback(db_session, task_id, user_id):
+            task = complete_task(db_session, task_id=task_id, user_id=user_id)
+            after_commit(db_session, lambda: 1 / 0)
+            return task
+
+        with self.assertLogs("task_gamification_app.app.write_coalescer", "ERROR") as logs:
+            task = self.coalescer.call(complete_with_failing_callback, task_id=self.task_ids[0], user_id=self.user_id, timeout=10)
+        self.assertEqual(task.status, TaskStatus.COMPLETED)
+        self.assertIn("ZeroDivisionError", logs.output[0])
+        self.assertEqual(self.coalescer.stats()["failed_callbacks"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
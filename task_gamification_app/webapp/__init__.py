@@ -10,6 +10,60 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'a_very_secret_default_key_for_dev')
 app.config['SECURITY_PASSWORD_SALT'] = os.environ.get('FLASK_SECURITY_PASSWORD_SALT', 'a_very_secret_salt_for_dev')
 
+# When enabled, the registration and add-email forms look up taken usernames/emails before
+# submitting. The unique indexes enforce uniqueness either way, so this only changes feedback.
+app.config['REGISTRATION_PRECHECKS'] = os.environ.get('REGISTRATION_PRECHECKS', 'false').lower() == 'true'
+
+# Rate limits for /login and /forgot_password (burst size and sustained requests per minute, per key).
+# Set RATE_LIMIT_STORAGE_PATH to a SQLite file to share the buckets between worker processes.
+app.config['RATE_LIMIT_STORAGE_PATH'] = os.environ.get('RATE_LIMIT_STORAGE_PATH')
+app.config['LOGIN_RATE_LIMIT_BURST'] = int(os.environ.get('LOGIN_RATE_LIMIT_BURST', 10))
+app.config['LOGIN_RATE_LIMIT_PER_MINUTE'] = int(os.environ.get('LOGIN_RATE_LIMIT_PER_MINUTE', 10))
+app.config['PASSWORD_RESET_RATE_LIMIT_BURST'] = int(os.environ.get('PASSWORD_RESET_RATE_LIMIT_BURST', 3))
+app.config['PASSWORD_RESET_RATE_LIMIT_PER_MINUTE'] = int(os.environ.get('PASSWORD_RESET_RATE_LIMIT_PER_MINUTE', 2))
+
+# Tasks per "page" of /my_tasks; further pages are loaded with /my_tasks/page.
+app.config['TASKS_PAGE_SIZE'] = int(os.environ.get('TASKS_PAGE_SIZE', 20))
+# Entries per page of the global /activity feed.
+app.config['ACTIVITY_PAGE_SIZE'] = int(os.environ.get('ACTIVITY_PAGE_SIZE', 20))
+
+# Cost profile for new password hashes ('fast' is for tests only; see app/hashing.py).
+# Stored hashes made with another profile are rehashed on the user's next successful login.
+app.config['PASSWORD_HASH_PROFILE'] = os.environ.get('PASSWORD_HASH_PROFILE', 'default')
+from task_gamification_app.app.hashing import set_active_profile
+set_active_profile(app.config['PASSWORD_HASH_PROFILE'])
+
+# Opt-in request profiling (see webapp/profiling.py). Requests are profiled when they carry a
+# signed X-Profile-Token header (manage.py profile-token) or, at PROFILING_SAMPLE_RATE, at random.
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+app.config['PROFILING_DIR'] = os.environ.get('PROFILING_DIR', 'profiles')
+app.config['PROFILING_MAX_BYTES'] = int(os.environ.get('PROFILING_MAX_BYTES', 50 * 1024 * 1024))
+app.config['PROFILING_TOKEN_MAX_AGE'] = int(os.environ.get('PROFILING_TOKEN_MAX_AGE', 24 * 3600))
+
+# Idempotency keys for task mutation POSTs (see webapp/idempotency.py): how long an outcome is
+# replayed and how many are kept. Set IDEMPOTENCY_STORAGE_PATH to share them between workers.
+app.config['IDEMPOTENCY_STORAGE_PATH'] = os.environ.get('IDEMPOTENCY_STORAGE_PATH')
+app.config['IDEMPOTENCY_TTL'] = float(os.environ.get('IDEMPOTENCY_TTL', 600))
+app.config['IDEMPOTENCY_MAX_KEYS'] = int(os.environ.get('IDEMPOTENCY_MAX_KEYS', 10000))
+
+# Group commit (see app/write_coalescer.py): task create/complete/delete calls from all request
+# threads are run by one writer thread, in batches of up to MAX_BATCH per transaction.
+app.config['WRITE_COALESCING'] = os.environ.get('WRITE_COALESCING', 'false').lower() == 'true'
+app.config['WRITE_COALESCING_MAX_BATCH'] = int(os.environ.get('WRITE_COALESCING_MAX_BATCH', 256))
+app.config['WRITE_COALESCING_LINGER_MS'] = float(os.environ.get('WRITE_COALESCING_LINGER_MS', 2))
+app.config['WRITE_COALESCING_TIMEOUT'] = float(os.environ.get('WRITE_COALESCING_TIMEOUT', 30))
+
+# Live leaderboard (/leaderboard/stream, see webapp/leaderboard_stream.py): at most one update
+# frame per interval, covering the top N entries; each client buffers up to QUEUE_SIZE frames.
+app.config['LEADERBOARD_STREAM_INTERVAL'] = float(os.environ.get('LEADERBOARD_STREAM_INTERVAL', 1.0))
+app.config['LEADERBOARD_STREAM_TOP_N'] = int(os.environ.get('LEADERBOARD_STREAM_TOP_N', 100))
+app.config['LEADERBOARD_STREAM_QUEUE_SIZE'] = int(os.environ.get('LEADERBOARD_STREAM_QUEUE_SIZE', 16))
+app.config['LEADERBOARD_STREAM_KEEPALIVE'] = float(os.environ.get('LEADERBOARD_STREAM_KEEPALIVE', 15))
+
+# Usernames allowed to see the /admin pages (comma-separated).
+app.config['ADMIN_USERNAMES'] = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()}
+
 # Initialize Bootstrap-Flask
 # Bootstrap-Flask typically uses Bootstrap 4 by default with Bootstrap4 class,
 # or Bootstrap5 with Bootstrap5 class. We are using Bootstrap 4.
@@ -20,6 +74,14 @@ bootstrap = Bootstrap4(app)
 # Import routes after app initialization to avoid circular imports
 from . import routes # Assuming routes.py will be in the same directory
 
+from .profiling import init_profiling
+init_profiling(app)
+
+from .leaderboard_stream import init_leaderboard_stream
+from ..app.db import SessionLocal
+from ..app.events import bus
+init_leaderboard_stream(app, SessionLocal, bus)
+
 # You might also initialize database connections or other extensions here if needed globally
 # For example, if using Flask-SQLAlchemy (though we are using standalone SQLAlchemy for now):
 # from ..app.db import SessionLocal, engine # Example path
@@ -6,8 +6,48 @@ from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationE
 # from ..app.models import User
 # from ..app.db import SessionLocal
 
+from flask import current_app
 from ..app.models import User
 from ..app.db import SessionLocal
+from ..app.cache import LRUCache
+from ..app.events import UserUpdated, subscribe
+
+# Optional pre-checks for "username/email already taken".
+# The unique indexes on users.username/users.email are the source of truth (create_user and
+# update_user map violations to service errors), so these checks are off by default and only
+# give earlier feedback. Positive results are cached: a taken name rarely becomes free again,
+# and when update_user frees one its commit evicts it (see _forget_released).
+_taken_cache = LRUCache(maxsize=4096, ttl=300)
+
+def remember_taken(field: str, value: str):
+    """Records that `value` is in use for `field` ('username' or 'email')."""
+    if value:
+        _taken_cache.set((field, value), True)
+
+def _forget_released(event: UserUpdated):
+    """Evicts the username/email a committed update_user freed, so they can be registered again."""
+    for field, value in event.released:
+        _taken_cache.delete((field, value))
+
+subscribe(UserUpdated, _forget_released, name="taken_precheck_cache")
+
+def is_taken_precheck(field: str, value: str) -> bool:
+    """
+    Returns True if `value` is known to be taken for `field`.
+    Returns False without touching the database unless REGISTRATION_PRECHECKS is enabled.
+    """
+    if _taken_cache.get((field, value)):
+        return True
+    if not current_app.config.get('REGISTRATION_PRECHECKS'):
+        return False
+    db_session = SessionLocal()
+    try:
+        taken = db_session.query(User.id).filter(getattr(User, field) == value).first() is not None
+    finally:
+        db_session.close()
+    if taken:
+        remember_taken(field, value)
+    return taken
 
 class RegistrationForm(FlaskForm):
     first_name = StringField('First Name', validators=[DataRequired(), Length(min=2, max=50)])
@@ -22,17 +62,11 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Sign Up')
 
     def validate_username(self, username):
-        db_session = SessionLocal()
-        user = db_session.query(User).filter_by(username=username.data).first()
-        db_session.close()
-        if user:
+        if is_taken_precheck('username', username.data):
             raise ValidationError('That username is taken. Please choose a different one.')
 
     def validate_email(self, email):
-        db_session = SessionLocal()
-        user = db_session.query(User).filter_by(email=email.data).first() # Assuming User model has email
-        db_session.close()
-        if user:
+        if is_taken_precheck('email', email.data):
             raise ValidationError('That email is taken. Please choose a different one.')
 
 class ForgotPasswordForm(FlaskForm):
@@ -53,7 +87,8 @@ class LoginForm(FlaskForm):
     submit = SubmitField('Login')
 
 # Forms for Task Management
-from wtforms import TextAreaField, DateField
+from wtforms import TextAreaField, DateField, SelectField, HiddenField
+from .idempotency import new_idempotency_key
 from wtforms.validators import Optional
 
 class TaskForm(FlaskForm):
@@ -69,6 +104,10 @@ class CreateTaskForm(TaskForm):
     submit = None # Unset the inherited submit field
     delete = None
     complete = None
+    repeat = SelectField('Repeat', choices=[('', 'Does not repeat'), ('daily', 'Every day'), ('weekly', 'Every week')],
+                         validators=[Optional()], default='')
+    # A fresh key per rendered form; a resubmission of the same form replays the first result.
+    idempotency_key = HiddenField(default=new_idempotency_key)
     create_submit = SubmitField('Create Task')
 
 class UpdateTaskForm(TaskForm):
@@ -94,10 +133,7 @@ class AddEmailForm(FlaskForm):
     submit = SubmitField('Add Email')
 
     def validate_email(self, email):
-        db_session = SessionLocal()
-        user = db_session.query(User).filter_by(email=email.data).first()
-        db_session.close()
-        if user:
+        if is_taken_precheck('email', email.data):
             raise ValidationError('That email is taken. Please choose a different one.')
 
 from wtforms import SelectField
@@ -108,4 +144,5 @@ class FilterTasksForm(FlaskForm):
     creation_date = DateField('Creation date', validators=[Optional()], format='%Y-%m-%d')
     due_date = DateField('Due date', validators=[Optional()], format='%Y-%m-%d')
     completion_date = DateField('Completion date', validators=[Optional()], format='%Y-%m-%d')
+    sort_by = SelectField('Sort by', choices=[('due_date', 'Due date'), ('creation_date', 'Newest first')], default='due_date', validators=[Optional()])
     submit = SubmitField('Filter')
@@ -0,0 +1,238 @@
+"""
+Idempotency keys for the task mutation POSTs.
+
+A double-clicked "Complete" button or a retried task creation sends the same POST
+twice. Each form carries a hidden `idempotency_key` (API clients may send an
+`Idempotency-Key` header instead). The first request with a key runs the view and
+its outcome -- the redirect and the flashed messages -- is recorded. Repeats of
+the key by the same user and endpoint get that outcome replayed without running the
+view, so they cost no database work and cannot create a second task. A repeat that
+arrives while the first request is still running waits for its outcome.
+
+Only redirects are recorded. A view that re-renders a form (validation failed) or
+raises leaves no record, so the same key can be retried.
+
+Two stores are provided, like the rate limiter's:
+- `InMemoryIdempotencyStore`: per-process LRU with a TTL (the default).
+- `SQLiteIdempotencyStore`: a SQLite file shared by several worker processes.
+"""
+import itertools
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from functools import wraps
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from flask import abort, flash, make_response, redirect, request, session
+
+from ..app.cache import LRUCache
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_FIELD = "idempotency_key"
+MAX_KEY_LENGTH = 128
+
+
+class StoredOutcome(NamedTuple):
+    status: int
+    location: str
+    flashes: List[Tuple[str, str]] # (category, message)
+
+
+def new_idempotency_key() -> str:
+    return uuid.uuid4().hex
+
+
+class InMemoryIdempotencyStore:
+    """Outcomes in a bounded LRU with a TTL; in-flight keys as events that duplicates wait on."""
+
+    def __init__(self, max_keys: int = 10_000, ttl: float = 600):
+        self._outcomes = LRUCache(maxsize=max_keys, ttl=ttl)
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: str) -> Tuple[str, Optional[StoredOutcome]]:
+        """Returns ("done", outcome), ("pending", None) if another request holds the key, or ("new", None) after claiming it."""
+        with self._lock:
+            outcome = self._outcomes.get(key)
+            if outcome is not None:
+                return "done", outcome
+            if key in self._in_flight:
+                return "pending", None
+            self._in_flight[key] = threading.Event()
+            return "new", None
+
+    def finish(self, key: str, outcome: Optional[StoredOutcome]):
+        """Records `outcome` (or, with None, releases the key unrecorded) and wakes any waiting duplicates."""
+        with self._lock:
+            if outcome is not None:
+                self._outcomes.set(key, outcome)
+            done = self._in_flight.pop(key, None)
+        if done is not None:
+            done.set()
+
+    def wait(self, key: str, timeout: float) -> Optional[StoredOutcome]:
+        with self._lock:
+            done = self._in_flight.get(key)
+        if done is not None:
+            done.wait(timeout)
+        return self._outcomes.get(key)
+
+    def reset(self):
+        with self._lock:
+            self._outcomes.clear()
+            self._in_flight.clear()
+
+
+class SQLiteIdempotencyStore:
+    """
+    Keeps outcomes in a SQLite file so that all workers on a host share them.
+    A key is claimed with a `BEGIN IMMEDIATE` transaction; duplicates poll for the outcome.
+    A claim older than `pending_timeout` (a worker died mid-request) can be taken over.
+    Every `purge_every`-th begin() also deletes the keys that have outlived `ttl`.
+    """
+
+    def __init__(self, path: str, ttl: float = 600, pending_timeout: float = 30, timeout: float = 5.0,
+                 purge_every: int = 1000):
+        self.path = path
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self.timeout = timeout
+        self.purge_every = purge_every
+        self._begins = itertools.count(1)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+                " key TEXT PRIMARY KEY,"
+                " outcome TEXT," # NULL while the first request is running
+                " created_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _outcome(self, conn: sqlite3.Connection, key: str, now: float):
+        row = conn.execute(
+            "SELECT outcome, created_at FROM idempotency_keys WHERE key = ? AND created_at >= ?",
+            (key, now - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None, None
+        outcome = StoredOutcome(*json.loads(row[0])) if row[0] else None
+        return outcome, row[1]
+
+    def begin(self, key: str) -> Tuple[str, Optional[StoredOutcome]]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            outcome, created_at = self._outcome(conn, key, now)
+            if outcome is not None:
+                state = "done"
+            elif created_at is not None and created_at >= now - self.pending_timeout:
+                state = "pending"
+            else:
+                conn.execute("INSERT OR REPLACE INTO idempotency_keys (key, outcome, created_at) VALUES (?, NULL, ?)", (key, now))
+                state = "new"
+            if next(self._begins) % self.purge_every == 0:
+                conn.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (now - self.ttl,))
+            conn.execute("COMMIT")
+            return state, outcome
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def finish(self, key: str, outcome: Optional[StoredOutcome]):
+        conn = self._connect()
+        if outcome is None:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND outcome IS NULL", (key,))
+        else:
+            conn.execute("UPDATE idempotency_keys SET outcome = ? WHERE key = ?", (json.dumps(list(outcome)), key))
+
+    def wait(self, key: str, timeout: float, poll_interval: float = 0.05) -> Optional[StoredOutcome]:
+        deadline = time.monotonic() + timeout
+        while True:
+            outcome, created_at = self._outcome(self._connect(), key, time.time())
+            if outcome is not None or created_at is None or time.monotonic() >= deadline:
+                return outcome
+            time.sleep(poll_interval)
+
+    def purge(self, older_than: float):
+        """Deletes keys created before `older_than` (a time.time() value)."""
+        self._connect().execute("DELETE FROM idempotency_keys WHERE created_at < ?", (older_than,))
+
+    def reset(self):
+        self._connect().execute("DELETE FROM idempotency_keys")
+
+
+_counters = {"new": 0, "replayed": 0, "waited": 0, "conflicts": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def get_idempotency_counters() -> dict:
+    with _counters_lock:
+        return dict(_counters)
+
+
+def _request_key() -> Optional[str]:
+    key = request.headers.get(IDEMPOTENCY_HEADER) or request.form.get(IDEMPOTENCY_FIELD)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None
+    # Scoped by user and endpoint, so a key can never replay another user's (or view's) outcome.
+    return f"{session.get('user_id')}:{request.endpoint}:{json.dumps(request.view_args, sort_keys=True)}:{key}"
+
+
+def _replay(outcome: StoredOutcome):
+    for category, message in outcome.flashes:
+        flash(message, category)
+    return redirect(outcome.location, code=outcome.status)
+
+
+def idempotent(store, wait_timeout: float = 5.0):
+    """
+    View decorator for POSTs that carry an idempotency key (see module docstring).
+    Requests without a key, and non-POST requests, run the view as usual.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = _request_key() if request.method == "POST" else None
+            if key is None:
+                return view(*args, **kwargs)
+
+            state, outcome = store.begin(key)
+            if state == "pending":
+                outcome = store.wait(key, wait_timeout)
+                if outcome is None:
+                    _count("conflicts")
+                    abort(409) # Still running (or it failed); the client may retry
+                _count("waited")
+            if outcome is not None:
+                _count("replayed")
+                return _replay(outcome)
+
+            _count("new")
+            flashes_before = len(session.get("_flashes", []))
+            outcome = None
+            try:
+                response = make_response(view(*args, **kwargs))
+                if 300 <= response.status_code < 400 and response.location:
+                    outcome = StoredOutcome(response.status_code, response.location,
+                                            [tuple(f) for f in session.get("_flashes", [])[flashes_before:]])
+                return response
+            finally:
+                store.finish(key, outcome)
+        return wrapper
+    return decorator
@@ -0,0 +1,224 @@
+"""
+Live leaderboard updates over Server-Sent Events.
+
+Instead of every open /leaderboard page polling the ranking query, one producer
+thread owns the computation. Task events (see app/events.py) only mark the
+leaderboard dirty; the producer recomputes the top LEADERBOARD_STREAM_TOP_N entries
+at most once per LEADERBOARD_STREAM_INTERVAL seconds, diffs them against the
+previous result and fans the changed entries out to every connected client. However
+many viewers are connected, the database sees one ranking query per interval with
+changes, and none while nothing changes.
+
+Each client has a small bounded queue. A client that falls so far behind that its
+queue fills up loses the queued deltas and is sent a full snapshot instead, so a
+slow connection can neither block the producer nor grow memory.
+
+Frames:
+    event: snapshot   data: {"version": n, "entries": [...]}
+    event: delta      data: {"version": n, "changed": [...], "removed": [user_id, ...]}
+"""
+import json
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from flask import Flask
+
+from ..app.events import EventBus, TaskCompleted, TaskDeleted, UserUpdated
+from ..app.services import get_leaderboard_users_paginated
+
+
+class StreamClient:
+    """One connected viewer: a bounded queue of frames."""
+
+    def __init__(self, queue_size: int):
+        self.frames: "queue.Queue[tuple]" = queue.Queue(maxsize=queue_size)
+        self.needs_snapshot = False
+
+    def offer(self, frame: tuple) -> bool:
+        try:
+            self.frames.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+
+class LeaderboardBroadcaster:
+    """Single producer of leaderboard frames for any number of StreamClients."""
+
+    def __init__(self, session_factory: Callable, interval: float = 1.0, top_n: int = 100, queue_size: int = 16,
+                 autostart: bool = True):
+        self.session_factory = session_factory
+        self.autostart = autostart # False leaves calling run_once() to the caller (tests)
+        self.interval = interval
+        self.top_n = top_n
+        self.queue_size = queue_size
+        self.version = 0
+        self.computations = 0
+        self._entries: Optional[Dict[int, dict]] = None
+        self._dirty = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock() # Guards _entries, version and the client set
+        self._clients: List[StreamClient] = []
+        self._thread: Optional[threading.Thread] = None
+        self._last_run = 0.0
+        self._subscriptions = []
+
+    # Event bus wiring
+
+    def notify(self, event=None):
+        """Marks the leaderboard as changed. Cheap enough to run synchronously in the publisher."""
+        if isinstance(event, TaskDeleted) and not event.was_completed:
+            return # Deleting a pending task changes no score
+        if isinstance(event, UserUpdated) and "username" not in event.changed_fields:
+            return
+        self._dirty.set()
+
+    def attach(self, bus: EventBus):
+        for event_type in (TaskCompleted, TaskDeleted, UserUpdated):
+            bus.subscribe(event_type, self.notify, name="leaderboard_stream")
+            self._subscriptions.append((bus, event_type))
+
+    def detach(self):
+        for bus, event_type in self._subscriptions:
+            bus.unsubscribe(event_type, self.notify)
+        self._subscriptions.clear()
+
+    # Computation
+
+    def _compute(self) -> Dict[int, dict]:
+        db_session = self.session_factory()
+        try:
+            entries, _ = get_leaderboard_users_paginated(db_session, page=1, per_page=self.top_n, cached=False)
+        finally:
+            db_session.close()
+        self.computations += 1
+        return {entry["user_id"]: entry for entry in entries}
+
+    def snapshot(self) -> dict:
+        """The current top entries (computed if nothing is cached yet or a change is pending)."""
+        with self._lock:
+            return self._snapshot_locked()
+
+    def _snapshot_locked(self) -> dict:
+        if self._entries is None or (self._dirty.is_set() and not self._clients):
+            # With clients connected the producer owns pending changes, and they will get a delta.
+            self._dirty.clear()
+            self._entries = self._compute()
+            self.version += 1
+        return {"version": self.version, "entries": self._ordered(self._entries)}
+
+    @staticmethod
+    def _ordered(entries: Dict[int, dict]) -> List[dict]:
+        return sorted(entries.values(), key=lambda entry: (entry["rank"], entry["user_id"]))
+
+    def run_once(self) -> Optional[dict]:
+        """Recomputes the leaderboard if it is dirty and pushes the delta. Returns the delta frame (or None)."""
+        if not self._dirty.is_set():
+            return None
+        self._dirty.clear()
+        with self._lock:
+            if not self._clients:
+                self._dirty.set() # Nobody is listening; the next snapshot() recomputes
+                return None
+            previous = self._entries or {}
+            current = self._compute()
+            changed = [entry for user_id, entry in current.items() if previous.get(user_id) != entry]
+            removed = [user_id for user_id in previous if user_id not in current]
+            self._entries = current
+            if not changed and not removed:
+                return None
+            self.version += 1
+            delta = {"version": self.version, "changed": self._ordered({e["user_id"]: e for e in changed}), "removed": removed}
+            snapshot = None
+            for client in self._clients:
+                if client.needs_snapshot or not client.offer(("delta", delta)):
+                    # The client fell behind: replace whatever it had queued with a full snapshot.
+                    snapshot = snapshot or {"version": self.version, "entries": self._ordered(current)}
+                    self._resync(client, snapshot)
+            return delta
+
+    @staticmethod
+    def _resync(client: StreamClient, snapshot: dict):
+        while True:
+            try:
+                client.frames.get_nowait()
+            except queue.Empty:
+                break
+        client.needs_snapshot = not client.offer(("snapshot", snapshot))
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if not self._dirty.wait(timeout=1.0):
+                continue
+            # Coalesce: everything that happens within one interval goes into one frame.
+            wait = self._last_run + self.interval - time.monotonic()
+            if wait > 0 and self._stopping.wait(wait):
+                break
+            self._last_run = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e: # Keep the producer alive; the next change retries
+                print(f"Leaderboard stream update failed: {e!r}")
+                self._dirty.set()
+
+    # Clients
+
+    def connect(self) -> StreamClient:
+        client = StreamClient(self.queue_size)
+        with self._lock:
+            # Under the lock, so no delta can fall between the snapshot and the registration.
+            client.offer(("snapshot", self._snapshot_locked()))
+            self._clients.append(client)
+            if self.autostart and (self._thread is None or not self._thread.is_alive()):
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="leaderboard-stream", daemon=True)
+                self._thread.start()
+        return client
+
+    def disconnect(self, client: StreamClient):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stream(self, client: Optional[StreamClient] = None, keepalive: float = 15.0) -> Iterator[str]:
+        """
+        Yields SSE-formatted frames for `client` until the connection goes away.
+        Without a client, connects one when iteration starts, so a response that is never
+        iterated registers nothing.
+        """
+        if client is None:
+            client = self.connect()
+        try:
+            yield f"retry: {int(max(self.interval, 1) * 1000)}\n\n"
+            while True:
+                try:
+                    kind, payload = client.frames.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n" # Also how a closed connection is noticed
+                    continue
+                yield f"id: {payload['version']}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            self.disconnect(client)
+
+
+def init_leaderboard_stream(app: Flask, session_factory: Callable, bus: EventBus) -> LeaderboardBroadcaster:
+    """Creates the app's broadcaster and subscribes it to the task events."""
+    broadcaster = LeaderboardBroadcaster(
+        session_factory,
+        interval=app.config["LEADERBOARD_STREAM_INTERVAL"],
+        top_n=app.config["LEADERBOARD_STREAM_TOP_N"],
+        queue_size=app.config["LEADERBOARD_STREAM_QUEUE_SIZE"],
+    )
+    broadcaster.attach(bus)
+    app.extensions["leaderboard_broadcaster"] = broadcaster
+    return broadcaster
@@ -0,0 +1,184 @@
+"""
+Opt-in per-request profiling with cProfile.
+
+Nothing happens unless PROFILING_ENABLED is set. A request is then profiled when it
+carries a valid signed X-Profile-Token header (see `make_profile_token` and
+`manage.py profile-token`), or at random with probability PROFILING_SAMPLE_RATE.
+
+Each profile is written to PROFILING_DIR as a .pstats file, next to a .json file
+with the route, status and timing. The directory is trimmed to PROFILING_MAX_BYTES,
+oldest profiles first. /admin/profiles lists recent profiles and the functions with
+the highest cumulative time across them.
+
+Only one request per process is profiled at a time: since Python 3.12 a second
+profiler cannot be enabled while one is active, so a request that would be profiled
+meanwhile just runs unprofiled.
+"""
+import cProfile
+import datetime
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+from flask import Flask, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+PROFILE_HEADER = "X-Profile-Token"
+_TOKEN_SALT = "request-profiling"
+
+# Held while a request is being profiled (see the module docstring).
+_profiling_lock = threading.Lock()
+
+
+def make_profile_token(secret_key: str) -> str:
+    """Returns a header value that makes requests to this app get profiled (until it expires)."""
+    return URLSafeTimedSerializer(secret_key, salt=_TOKEN_SALT).dumps("profile")
+
+
+def is_valid_profile_token(secret_key: str, token: str, max_age: int) -> bool:
+    try:
+        return URLSafeTimedSerializer(secret_key, salt=_TOKEN_SALT).loads(token, max_age=max_age) == "profile"
+    except BadSignature: # Includes expired signatures
+        return False
+
+
+class ProfileStore:
+    """A directory of .pstats files and their .json metadata, trimmed to `max_bytes`."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def save(self, profiler: cProfile.Profile, metadata: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        now = datetime.datetime.utcnow()
+        name = f"{now:%Y%m%d-%H%M%S-%f}-{metadata.get('endpoint') or 'unknown'}-{uuid.uuid4().hex[:6]}"
+        base = os.path.join(self.directory, name)
+        profiler.dump_stats(base + ".pstats")
+        metadata = dict(metadata, created_at=now.isoformat(timespec="seconds"), file=name + ".pstats")
+        with open(base + ".json", "w") as f:
+            json.dump(metadata, f)
+        self._enforce_cap()
+        return base + ".pstats"
+
+    def _profiles(self) -> List[str]:
+        """Paths of the stored .pstats files, oldest first (names start with a UTC timestamp)."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".pstats"))
+
+    def _enforce_cap(self):
+        with self._lock:
+            profiles = self._profiles()
+            sizes = {}
+            for path in profiles:
+                sidecar = path[:-len(".pstats")] + ".json"
+                sizes[path] = sum(os.path.getsize(p) for p in (path, sidecar) if os.path.exists(p))
+            total = sum(sizes.values())
+            for path in profiles:
+                if total <= self.max_bytes:
+                    break
+                for p in (path, path[:-len(".pstats")] + ".json"):
+                    if os.path.exists(p):
+                        os.remove(p)
+                total -= sizes[path]
+
+    def recent(self, limit: int = 20, endpoint: Optional[str] = None) -> List[dict]:
+        """Metadata of the newest profiles, newest first, optionally only for one endpoint."""
+        entries = []
+        for path in reversed(self._profiles()):
+            try:
+                with open(path[:-len(".pstats")] + ".json") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue # Trimmed or half-written meanwhile
+            if endpoint and metadata.get("endpoint") != endpoint:
+                continue
+            metadata["pstats_path"] = path
+            entries.append(metadata)
+            if len(entries) >= limit:
+                break
+        return entries
+
+    @staticmethod
+    def top_functions(paths: List[str], limit: int = 25) -> List[dict]:
+        """Merges the given profiles and returns the functions with the highest cumulative time."""
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return []
+        stats = pstats.Stats(*paths)
+        rows = []
+        for (filename, line, function), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            short_name = os.sep.join(filename.split(os.sep)[-2:]) if filename != "~" else ""
+            rows.append({
+                "function": f"{short_name}:{line}({function})" if short_name else function,
+                "ncalls": ncalls,
+                "tottime": tottime,
+                "cumtime": cumtime,
+            })
+        rows.sort(key=lambda row: row["cumtime"], reverse=True)
+        return rows[:limit]
+
+
+def _should_profile(app: Flask) -> Optional[str]:
+    """Returns why this request is to be profiled ("header" or "sample"), or None."""
+    token = request.headers.get(PROFILE_HEADER)
+    if token and is_valid_profile_token(app.config["SECRET_KEY"], token, app.config["PROFILING_TOKEN_MAX_AGE"]):
+        return "header"
+    rate = app.config["PROFILING_SAMPLE_RATE"]
+    if rate > 0 and random.random() < rate:
+        return "sample"
+    return None
+
+
+def init_profiling(app: Flask) -> Optional[ProfileStore]:
+    """Installs the profiling hooks on `app` if PROFILING_ENABLED; returns the store (or None)."""
+    if not app.config.get("PROFILING_ENABLED"):
+        return None
+    store = ProfileStore(app.config["PROFILING_DIR"], app.config["PROFILING_MAX_BYTES"])
+    app.extensions["profile_store"] = store
+
+    @app.before_request
+    def start_profiler():
+        trigger = _should_profile(app)
+        if not trigger or not _profiling_lock.acquire(blocking=False):
+            return # Not to be profiled, or another request is being profiled
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError: # Another profiling tool (e.g. a debugger) is active in this process
+            _profiling_lock.release()
+            return
+        g._profiler = (profiler, time.perf_counter(), trigger)
+
+    def finish(status: int):
+        profiler, started, trigger = g.pop("_profiler")
+        profiler.disable()
+        _profiling_lock.release()
+        store.save(profiler, {
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "trigger": trigger,
+        })
+
+    @app.after_request
+    def stop_profiler(response):
+        if "_profiler" in g:
+            finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def stop_profiler_on_error(error):
+        if "_profiler" in g: # after_request is skipped when the view raised
+            finish(500)
+
+    return store
@@ -1,6 +1,6 @@
-from flask import render_template, url_for, flash, redirect, request, session
+from flask import render_template, url_for, flash, redirect, request, session, jsonify, abort, Response, stream_with_context
 from . import app  # Import the app instance from webapp/__init__.py
-from .forms import RegistrationForm, LoginForm, EditUserForm, AddEmailForm, AddNameForm, ForgotPasswordForm, ResetPasswordForm
+from .forms import RegistrationForm, LoginForm, EditUserForm, AddEmailForm, AddNameForm, ForgotPasswordForm, ResetPasswordForm, remember_taken
 
 # Adjust path to import service functions and custom exceptions
 # This assumes webapp is a sibling to app, or sys.path is managed correctly
@@ -9,30 +9,121 @@ from .forms import RegistrationForm, LoginForm, EditUserForm, AddEmailForm, AddN
 # python -m task_gamification_app.run_web
 from task_gamification_app.app.services import (
     create_user as create_user_service,
-    verify_user_login as verify_user_login_service,
-    get_user_by_id as get_user_by_id_service,
+    verify_user_login,
     update_user as update_user_service,
-    send_password_reset_email as send_password_reset_email_service,
+    send_password_reset_email,
     verify_password_reset_token as verify_password_reset_token_service,
     reset_password as reset_password_service,
     # get_leaderboard_users, # Old one, replaced by paginated version
     get_leaderboard_users_paginated, # New paginated version
+    leaderboard_cache_stats,
+    get_recent_activity as get_recent_activity_service,
     UsernameExistsError,
     UserCreationError,
     # Task related services and exceptions
     create_task_for_user as create_task_service,
-    get_tasks_for_user as get_tasks_service,
+    get_tasks_page as get_tasks_page_service,
+    count_tasks_by_status as count_tasks_by_status_service,
+    create_recurring_task as create_recurring_task_service,
+    get_recurring_tasks_for_user as get_recurring_tasks_service,
+    stop_recurring_task as stop_recurring_task_service,
+    InvalidCursorError,
     complete_task as complete_task_service,
     update_task_details as update_task_service,
     delete_task_for_user as delete_task_service,
+    get_user_stats as get_user_stats_service,
     TaskNotFoundError,
     ServiceError as TaskServiceError # Alias to avoid confusion if other ServiceErrors exist
 )
-from task_gamification_app.app.models import TaskStatus # For filtering
-from task_gamification_app.app.db import SessionLocal # For getting a db session
+from task_gamification_app.app.rate_limit import (
+    RateLimiter,
+    InMemoryBucketStore,
+    SQLiteBucketStore,
+    RateLimitExceededError,
+    rate_limited,
+    normalize_identity,
+    get_rate_limit_counters,
+)
+from task_gamification_app.app.statement_cache import statement_cache_stats
+from task_gamification_app.app.identity_cache import get_user_snapshot
+from task_gamification_app.app.events import event_bus_stats
+from .idempotency import (
+    InMemoryIdempotencyStore,
+    SQLiteIdempotencyStore,
+    idempotent,
+    new_idempotency_key,
+    get_idempotency_counters,
+)
+from task_gamification_app.app.models import User, Task, TaskStatus, RecurrenceFrequency # For filtering
+from task_gamification_app.app.db import SessionLocal, engine, shard_set # For getting a db session
+from task_gamification_app.app.write_coalescer import WriteCoalescer
 from .forms import CreateTaskForm, UpdateTaskForm, FilterTasksForm # Task forms
 from functools import wraps # For login_required decorator
 
+# --- Rate limiting for the CPU-heavy auth endpoints ---
+def _make_bucket_store():
+    path = app.config.get('RATE_LIMIT_STORAGE_PATH')
+    return SQLiteBucketStore(path) if path else InMemoryBucketStore()
+
+login_limiter = RateLimiter(
+    'login',
+    capacity=app.config['LOGIN_RATE_LIMIT_BURST'],
+    refill_rate=app.config['LOGIN_RATE_LIMIT_PER_MINUTE'] / 60.0,
+    store=_make_bucket_store(),
+)
+password_reset_limiter = RateLimiter(
+    'password_reset',
+    capacity=app.config['PASSWORD_RESET_RATE_LIMIT_BURST'],
+    refill_rate=app.config['PASSWORD_RESET_RATE_LIMIT_PER_MINUTE'] / 60.0,
+    store=_make_bucket_store(),
+)
+
+# --- Idempotency keys for the task mutation POSTs ---
+def _make_idempotency_store():
+    path = app.config.get('IDEMPOTENCY_STORAGE_PATH')
+    if path:
+        return SQLiteIdempotencyStore(path, ttl=app.config['IDEMPOTENCY_TTL'])
+    return InMemoryIdempotencyStore(max_keys=app.config['IDEMPOTENCY_MAX_KEYS'], ttl=app.config['IDEMPOTENCY_TTL'])
+
+idempotency_store = _make_idempotency_store()
+app.jinja_env.globals['new_idempotency_key'] = new_idempotency_key
+
+# --- Optional group commit for the task mutations (see app/write_coalescer.py) ---
+if app.config['WRITE_COALESCING'] and shard_set is not None:
+    # The writer thread commits to one database; sharding already spreads the writes.
+    raise RuntimeError("WRITE_COALESCING cannot be combined with DATABASE_SHARDS.")
+write_coalescer = WriteCoalescer(
+    engine,
+    max_batch=app.config['WRITE_COALESCING_MAX_BATCH'],
+    linger=app.config['WRITE_COALESCING_LINGER_MS'] / 1000.0,
+) if app.config['WRITE_COALESCING'] else None
+
+def _write(service, db_session, **kwargs):
+    """Runs a task mutation in the request's session, or through the group-commit writer if WRITE_COALESCING is on."""
+    if write_coalescer is None:
+        return service(db_session=db_session, **kwargs)
+    return write_coalescer.call(service, timeout=app.config['WRITE_COALESCING_TIMEOUT'], **kwargs)
+
+def _account_key(username_or_email):
+    """Bucket key of the account a login or password reset targets."""
+    return f"user:{normalize_identity(username_or_email)}"
+
+# The limiter is checked before the wrapped service runs, i.e. before any bcrypt or token work.
+verify_user_login_service = rate_limited(
+    login_limiter,
+    lambda db_session, username_or_email, password: [_account_key(username_or_email)]
+)(verify_user_login)
+send_password_reset_email_service = rate_limited(
+    password_reset_limiter,
+    lambda user: [_account_key(user.email)]
+)(send_password_reset_email)
+
+def _rate_limited_response(template, error, **context):
+    """Renders `template` with a 429 status and a Retry-After header."""
+    flash(str(error), 'danger')
+    headers = {'Retry-After': str(int(error.retry_after) + 1)}
+    return render_template(template, **context), 429, headers
+
 # Decorator for routes that require login
 def login_required(f):
     @wraps(f)
@@ -43,11 +134,30 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    """Like login_required, and the user must be listed in ADMIN_USERNAMES."""
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        if session.get('username') not in app.config['ADMIN_USERNAMES']:
+            abort(404) # Do not reveal that the page exists
+        return f(*args, **kwargs)
+    return decorated_function
+
 @app.route('/')
 @app.route('/index')
 def index():
     username = session.get('username')
-    return render_template('index.html', title='Home', username=username)
+    user_stats = None
+    if session.get('user_id'):
+        db_session = SessionLocal()
+        try:
+            user_stats = get_user_stats_service(db_session, session['user_id'])
+        except Exception as e:
+            flash(f'Could not load your stats: {e}', 'warning')
+        finally:
+            db_session.close()
+    return render_template('index.html', title='Home', username=username, user_stats=user_stats)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -67,9 +177,12 @@ def register():
                 email=form.email.data,
                 password=form.password.data
             )
+            remember_taken('username', form.username.data)
+            remember_taken('email', form.email.data)
             flash(f'Account created for {form.username.data}! You can now log in.', 'success')
             return redirect(url_for('login'))
         except UsernameExistsError:
+            remember_taken('username', form.username.data)
             flash('That username is already taken. Please choose a different one.', 'danger')
         except UserCreationError as e:
             flash(f'Account creation failed: {e}', 'danger')
@@ -93,7 +206,8 @@ def login():
             user = verify_user_login_service(
                 db_session=db_session,
                 username_or_email=form.username_or_email.data,
-                password=form.password.data
+                password=form.password.data,
+                client_ip=request.remote_addr
             )
             if user:
                 if not user.first_name or not user.last_name:
@@ -111,6 +225,8 @@ def login():
                 return redirect(next_page) if next_page else redirect(url_for('index'))
             else:
                 flash('Login Unsuccessful. Please check username and password', 'danger')
+        except RateLimitExceededError as e:
+            return _rate_limited_response('login.html', e, title='Login', form=form)
         except Exception as e:
             flash(f'An unexpected error occurred during login: {e}', 'danger')
         finally:
@@ -128,14 +244,14 @@ def add_name():
         db_session = SessionLocal()
         try:
             user_id = session['user_id_temp']
-            update_user_service(
+            # update_user returns the refreshed user, so there is no need to look it up again.
+            user = update_user_service(
                 db_session=db_session,
                 user_id=user_id,
                 first_name=form.first_name.data,
                 last_name=form.last_name.data
             )
             flash('Thank you for providing your name.', 'success')
-            user = get_user_by_id_service(db_session, user_id)
             session.pop('user_id_temp', None)
             session['user_id'] = user.id
             session['username'] = user.username
@@ -161,9 +277,15 @@ def forgot_password():
         try:
             user = db_session.query(User).filter_by(email=form.email.data).first()
             if user:
-                send_password_reset_email_service(user)
+                send_password_reset_email_service(user, client_ip=request.remote_addr)
+            else:
+                # Unknown addresses are charged the same keys, so the response (429 included)
+                # never reveals which addresses have an account.
+                password_reset_limiter.check(f"ip:{request.remote_addr}", _account_key(form.email.data))
             flash('A password reset link has been sent to your email.', 'info')
             return redirect(url_for('login'))
+        except RateLimitExceededError as e:
+            return _rate_limited_response('forgot_password.html', e, title='Forgot Password', form=form)
         except Exception as e:
             flash(f'An unexpected error occurred: {e}', 'danger')
         finally:
@@ -194,6 +316,7 @@ def reset_password(token):
 # --- My Tasks Page ---
 @app.route('/my_tasks', methods=['GET', 'POST'])
 @login_required
+@idempotent(idempotency_store)
 def my_tasks():
     user_id = session['user_id']
     db_session = SessionLocal()
@@ -201,18 +324,29 @@ def my_tasks():
     create_form = CreateTaskForm()
     filter_form = FilterTasksForm(request.args, meta={'csrf': False})
 
-    tasks = []
-
     # Handle task creation POST request
     if create_form.validate_on_submit() and 'create_submit' in request.form:
         try:
-            create_task_service(
-                db_session=db_session,
-                user_id=user_id,
-                description=create_form.description.data,
-                due_date=create_form.due_date.data
-            )
-            flash('Task created successfully!', 'success')
+            if create_form.repeat.data:
+                # The first due date starts the series; instances appear as the window reaches them.
+                create_recurring_task_service(
+                    db_session=db_session,
+                    user_id=user_id,
+                    description=create_form.description.data,
+                    frequency=RecurrenceFrequency(create_form.repeat.data),
+                    start_date=create_form.due_date.data
+                )
+                flash('Recurring task created successfully!', 'success')
+            else:
+                _write(
+                    create_task_service,
+                    db_session,
+                    user_id=user_id,
+                    description=create_form.description.data,
+                    due_date=create_form.due_date.data
+                )
+                flash('Task created successfully!', 'success')
+            db_session.close()
             # Preserve filters in redirect
             return redirect(url_for('my_tasks', **request.args))
         except TaskServiceError as e:
@@ -220,33 +354,19 @@ def my_tasks():
         except Exception as e:
             flash(f'An unexpected error occurred: {e}', 'danger')
 
-    # Filtering logic for GET request
-    filters = {
-        'description': filter_form.description.data,
-        'status': filter_form.status.data,
-        'creation_date': filter_form.creation_date.data,
-        'due_date': filter_form.due_date.data,
-        'completion_date': filter_form.completion_date.data
-    }
-
-    # Convert status from form string to TaskStatus enum if necessary
-    status_filter = None
-    if filters['status'] == 'Pending':
-        status_filter = TaskStatus.PENDING
-    elif filters['status'] == 'Completed':
-        status_filter = TaskStatus.COMPLETED
-
-    # Update filters dict with the enum value
-    filters['status'] = status_filter
-
-
+    filters = _task_filters(filter_form)
+    tasks, next_cursor, recurring_tasks = [], None, []
+    task_counts = {'pending': 0, 'completed': 0, 'total': 0}
     try:
-        tasks = get_tasks_service(
+        tasks, next_cursor = get_tasks_page_service(
             db_session=db_session,
             user_id=user_id,
-            sort_by="due_date",
+            limit=app.config['TASKS_PAGE_SIZE'],
+            sort_by=filter_form.sort_by.data,
             **filters
         )
+        task_counts = count_tasks_by_status_service(db_session=db_session, user_id=user_id, **filters)
+        recurring_tasks = get_recurring_tasks_service(db_session=db_session, user_id=user_id)
     except Exception as e:
         flash(f'Error fetching tasks: {e}', 'danger')
 
@@ -256,9 +376,75 @@ def my_tasks():
                            title='My Tasks',
                            create_form=create_form,
                            filter_form=filter_form,
+                           filter_args={k: v for k, v in request.args.items() if k != 'cursor'},
                            tasks=tasks,
+                           next_cursor=next_cursor,
+                           task_counts=task_counts,
+                           recurring_tasks=recurring_tasks,
                            TaskStatus=TaskStatus)
 
+@app.route('/my_tasks/page')
+@login_required
+def my_tasks_page():
+    """
+    The next chunk of /my_tasks for "load more", after ?cursor=. Takes the same filter arguments.
+    Returns an HTML fragment of <li> items with the next cursor in the X-Next-Cursor header
+    (absent on the last page), or JSON with ?format=json.
+    """
+    filter_form = FilterTasksForm(request.args, meta={'csrf': False})
+    db_session = SessionLocal()
+    try:
+        tasks, next_cursor = get_tasks_page_service(
+            db_session=db_session,
+            user_id=session['user_id'],
+            cursor=request.args.get('cursor'),
+            limit=min(request.args.get('limit', app.config['TASKS_PAGE_SIZE'], type=int), 100),
+            sort_by=filter_form.sort_by.data,
+            **_task_filters(filter_form)
+        )
+        if request.args.get('format') == 'json':
+            return jsonify({
+                'tasks': [_task_json(task) for task in tasks],
+                'next_cursor': next_cursor,
+            })
+        response = app.make_response(render_template('_task_items.html', tasks=tasks, TaskStatus=TaskStatus))
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        db_session.close()
+
+def _task_filters(filter_form) -> dict:
+    """The get_tasks_for_user filter arguments of a FilterTasksForm."""
+    # Convert status from form string to TaskStatus enum if necessary
+    status_filter = None
+    if filter_form.status.data == 'Pending':
+        status_filter = TaskStatus.PENDING
+    elif filter_form.status.data == 'Completed':
+        status_filter = TaskStatus.COMPLETED
+    return {
+        'description': filter_form.description.data,
+        'status': status_filter,
+        'creation_date': filter_form.creation_date.data,
+        'due_date': filter_form.due_date.data,
+        'completion_date': filter_form.completion_date.data
+    }
+
+def _task_json(task) -> dict:
+    def iso(value):
+        return value.isoformat() if value else None
+    return {
+        'id': task.id,
+        'description': task.description,
+        'status': task.status.value,
+        'creation_date': iso(task.creation_date),
+        'due_date': iso(task.due_date),
+        'completion_date': iso(task.completion_date),
+        'archived': task.is_archived,
+    }
+
 @app.route('/task/<int:task_id>/update', methods=['GET', 'POST'])
 @login_required
 def update_task(task_id):
@@ -303,11 +489,12 @@ def update_task(task_id):
 
 @app.route('/task/<int:task_id>/complete', methods=['POST'])
 @login_required
+@idempotent(idempotency_store)
 def complete_task_route(task_id):
     db_session = SessionLocal()
     user_id = session['user_id']
     try:
-        complete_task_service(db_session=db_session, task_id=task_id, user_id=user_id)
+        _write(complete_task_service, db_session, task_id=task_id, user_id=user_id)
         flash('Task marked as complete!', 'success')
     except TaskNotFoundError:
         flash('Task not found or you do not have permission to complete it.', 'danger')
@@ -319,13 +506,30 @@ def complete_task_route(task_id):
         if db_session: db_session.close()
     return redirect(request.referrer or url_for('my_tasks'))
 
+@app.route('/recurring/<int:recurring_task_id>/stop', methods=['POST'])
+@login_required
+def stop_recurring_task_route(recurring_task_id):
+    db_session = SessionLocal()
+    user_id = session['user_id']
+    try:
+        stop_recurring_task_service(db_session=db_session, recurring_task_id=recurring_task_id, user_id=user_id)
+        flash('Recurring task stopped. Existing tasks were kept.', 'success')
+    except TaskNotFoundError:
+        flash('Recurring task not found or you do not have permission to stop it.', 'danger')
+    except TaskServiceError as e:
+        flash(f'Error stopping recurring task: {e}', 'danger')
+    finally:
+        db_session.close()
+    return redirect(request.referrer or url_for('my_tasks'))
+
 @app.route('/task/<int:task_id>/delete', methods=['POST'])
 @login_required
+@idempotent(idempotency_store)
 def delete_task_route(task_id):
     db_session = SessionLocal()
     user_id = session['user_id']
     try:
-        delete_task_service(db_session=db_session, task_id=task_id, user_id=user_id)
+        _write(delete_task_service, db_session, task_id=task_id, user_id=user_id)
         flash('Task deleted successfully!', 'success')
     except TaskNotFoundError:
         flash('Task not found or you do not have permission to delete it.', 'danger')
@@ -358,7 +562,9 @@ def leaderboard():
                                users=leaderboard_entries,
                                current_page=page,
                                total_pages=total_pages,
-                               per_page=per_page) # Pass per_page for rank calculation if needed from base 0
+                               per_page=per_page, # Pass per_page for rank calculation if needed from base 0
+                               # Pages within the streamed top entries update live over /leaderboard/stream.
+                               live_updates=page * per_page <= app.config['LEADERBOARD_STREAM_TOP_N'])
     except Exception as e:
         flash(f'Could not load leaderboard: {e}', 'danger')
         # Render the leaderboard page with an error message or redirect
@@ -368,6 +574,86 @@ def leaderboard():
         if db_session:
             db_session.close()
 
+@app.route('/activity')
+@login_required
+def activity():
+    """Recent task completions of all users, newest first; older pages follow ?cursor=. JSON with ?format=json."""
+    cursor = request.args.get('cursor')
+    db_session = SessionLocal()
+    try:
+        entries, next_cursor = get_recent_activity_service(
+            db_session=db_session,
+            cursor=cursor,
+            limit=min(request.args.get('limit', app.config['ACTIVITY_PAGE_SIZE'], type=int), 100),
+        )
+    except InvalidCursorError as e:
+        if request.args.get('format') == 'json':
+            return jsonify({'error': str(e)}), 400
+        flash('That page of the activity feed no longer exists.', 'warning')
+        return redirect(url_for('activity'))
+    finally:
+        db_session.close()
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'entries': [dict(entry, completion_date=entry['completion_date'].isoformat()) for entry in entries],
+            'next_cursor': next_cursor,
+        })
+    return render_template('activity.html', title='Recent Activity', entries=entries,
+                           next_cursor=next_cursor, is_first_page=cursor is None)
+
+@app.route('/leaderboard/stream')
+@login_required
+def leaderboard_stream():
+    """Server-Sent Events: a snapshot of the top entries, then deltas as scores change."""
+    broadcaster = app.extensions['leaderboard_broadcaster']
+    keepalive = app.config['LEADERBOARD_STREAM_KEEPALIVE']
+    # The stream connects its client on first iteration, so an abandoned response leaks nothing.
+    return Response(stream_with_context(broadcaster.stream(keepalive=keepalive)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics/rate_limits')
+@admin_required
+def rate_limit_metrics():
+    """Exports the allowed/rejected counters of every rate limiter as JSON."""
+    return jsonify(get_rate_limit_counters())
+
+@app.route('/metrics/idempotency')
+@admin_required
+def idempotency_metrics():
+    """Exports how many keyed POSTs ran, were replayed, waited for a duplicate, or conflicted."""
+    return jsonify(get_idempotency_counters())
+
+@app.route('/metrics/sql_cache')
+@admin_required
+def sql_cache_metrics():
+    """Exports the statement cache and SQLAlchemy compiled-cache hit counters as JSON."""
+    return jsonify(statement_cache_stats())
+
+@app.route('/metrics/leaderboard_cache')
+@admin_required
+def leaderboard_cache_metrics():
+    """Exports leaderboard page cache hits (fresh and stale), computations and coalesced waits as JSON."""
+    return jsonify(leaderboard_cache_stats())
+
+@app.route('/metrics/events')
+@admin_required
+def event_bus_metrics():
+    """Exports the event bus counters and per-subscriber timings as JSON."""
+    return jsonify(event_bus_stats())
+
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """Recent request profiles and the top cumulative functions across them."""
+    store = app.extensions.get('profile_store')
+    endpoint = request.args.get('endpoint') or None
+    limit = request.args.get('limit', 20, type=int)
+    profiles = store.recent(limit=limit, endpoint=endpoint) if store else []
+    functions = store.top_functions([p['pstats_path'] for p in profiles]) if store else []
+    return render_template('admin_profiles.html', title='Request Profiles', enabled=store is not None,
+                           profiles=profiles, functions=functions, endpoint=endpoint, limit=limit)
+
 @app.route('/about')
 def about():
     return render_template('about.html', title='About')
@@ -377,7 +663,7 @@ def about():
 def edit_user():
     user_id = session['user_id']
     db_session = SessionLocal()
-    user = get_user_by_id_service(db_session, user_id)
+    user = get_user_snapshot(db_session, user_id)
     form = EditUserForm(obj=user)
 
     if form.validate_on_submit():
@@ -410,7 +696,7 @@ def add_email(user_id):
     if form.validate_on_submit():
         db_session = SessionLocal()
         try:
-            user = get_user_by_id_service(db_session, user_id)
+            user = get_user_snapshot(db_session, user_id)
             if user:
                 update_user_service(db_session, user_id, email=form.email.data)
                 flash('Email address added successfully.', 'success')